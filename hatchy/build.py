@@ -1,9 +1,24 @@
 import os
+import sqlite3
 import subprocess
 import sys
-import time
 
-from .common import get_workspace_dir, get_package, clr, supports_ansi, _DIM
+from .common import (get_workspace_dir, get_package, get_stderr_memory_lines, parse_cmake_settings,
+                     remove_duplicates, clr, supports_ansi, _fmt_duration, _DIM, _YELLOW)
+from .cgroup import CgroupEnvelope
+from .changes import select_changed_packages
+from .eta import load_eta_model
+from .events import EventChannel, REPLACED_EVENT_HANDLERS, handler_available
+from .fingerprint import FingerprintCache
+from .graph import resolve_packages
+from .history import RunRecorder, connect, fastest_durations
+from .config import _ci_choice
+from .jobserver import (Jobserver, PressureMonitor, cpu_count, initial_workers,
+                        jobserver_unsupported_reason)
+from .ninja_log import snapshot_offsets
+from .priority import IO_CLASSES, PriorityManager, wait_with_priority
+from .time_trace import refresh_time_traces
+from .trace import write_trace
 
 
 def register(subparsers):
@@ -21,6 +36,14 @@ def register(subparsers):
     packages_group.add_argument(
         "--no-deps", action="store_true",
         help="Only build specified packages, not their dependencies.")
+    packages_group.add_argument(
+        "--changed", action="store_true",
+        help="Build the packages changed in the git repositories under src, and the packages "
+             "depending on them.")
+    packages_group.add_argument(
+        "--since", metavar="REF",
+        help="Base ref for --changed, compared from where HEAD branched off it. "
+             "(default: each branch's upstream)")
     config_group = parser.add_argument_group('Config', "Parameters for the underlying build system.")
     config_group.add_argument(
         "--colcon-build-args", metavar='ARG', dest='colcon_build_args',
@@ -28,20 +51,53 @@ def register(subparsers):
         help="Additional arguments for colcon")
     config_group.add_argument(
         "--nice", "-n", type=int, help="CPU niceness for build commands. (default: 0)")
+    config_group.add_argument(
+        "--io-class", choices=IO_CLASSES, metavar='CLASS', type=_ci_choice(IO_CLASSES),
+        help=f"I/O scheduling class for build commands: {', '.join(IO_CLASSES)}.")
+    config_group.add_argument(
+        "--no-jobserver", action="store_true",
+        help="Let each package build pick its own -j instead of sharing one jobserver.")
+    config_group.add_argument(
+        "--adaptive-jobs", action="store_true",
+        help="Share one make/ninja jobserver across packages and shrink it under memory or CPU pressure.")
+    config_group.add_argument(
+        "--skip-unchanged", action="store_true",
+        help="Only build packages whose sources, build arguments or dependencies changed since "
+             "their last successful build.")
+    config_group.add_argument(
+        "--trace", metavar='FILE',
+        help="Write a Chrome/Perfetto trace of the build (packages, phases, ninja steps) to FILE.")
     parser.set_defaults(func=build_command)
 
 
-def _list_packages(workspace, packages, no_deps):
-    """Return the list of package names colcon will build, or None on failure."""
-    cmd = ["colcon", "list", "-n"]
-    if packages:
-        cmd += ["--packages-select" if no_deps else "--packages-up-to"] + packages
+def _stop_jobserver(jobserver, monitor):
+    if monitor is not None:
+        monitor.stop()
+    if jobserver is not None:
+        jobserver.close()
+
+
+def _write_trace(path, records, build_dir, ninja_offsets):
+    try:
+        count = write_trace(path, records, build_dir, ninja_offsets)
+    except OSError as e:
+        print(f"Error: Could not write trace '{path}': {e}")
+        return
+    print(clr(f"Wrote {count} trace events to {path} (open in https://ui.perfetto.dev)", _DIM))
+
+
+def _summarize_time_traces(workspace, build_dir):
     try:
-        result = subprocess.run(cmd, cwd=workspace, capture_output=True, text=True)
-        names = [l.strip() for l in result.stdout.splitlines() if l.strip()]
-        return names if names else None
-    except Exception:
-        return None
+        conn = connect(workspace)
+        try:
+            with conn:
+                parsed = refresh_time_traces(conn, build_dir)
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return
+    if parsed:
+        print(clr(f"Summarized {parsed} clang time traces; see 'hatchy build-report --time-trace'.", _DIM))
 
 
 def build_command(args):
@@ -93,68 +149,162 @@ def build_command(args):
     if args.nice is not None:
         nice = args.nice
 
+    io_class = config_content.get("io_class", None)
+    if args.io_class is not None:
+        io_class = args.io_class
+    priority = PriorityManager(nice, io_class)
+
     colcon_cmd += colcon_build_args
 
+    # One jobserver shared by every package's make/ninja bounds the total
+    # number of compile jobs to the CPU count, whatever colcon's worker count.
+    # It is only created right before colcon starts, as its fifo outlives
+    # every exit in between otherwise.
+    use_jobserver = config_content.get("jobserver", "on") not in ("off", False) and not args.no_jobserver
+    if use_jobserver or args.adaptive_jobs:
+        reason = jobserver_unsupported_reason(os.environ)
+        if reason and args.adaptive_jobs:
+            print(clr(f"Warning: adaptive jobs disabled: {reason}.", _YELLOW))
+        elif reason:
+            print(clr(f"Shared jobserver disabled: {reason}.", _DIM))
+        use_jobserver = not reason
+        if use_jobserver and args.adaptive_jobs:
+            if not any('--parallel-workers' in arg for arg in colcon_build_args):
+                colcon_cmd += ['--parallel-workers', str(initial_workers())]
+
     packages = args.pkgs
     if args.this:
         current_package = get_package(args.workspace)
         if current_package:
             packages.append(current_package)
 
+    if args.changed or args.since:
+        changed = select_changed_packages(workspace, args.since)
+        if not changed and not packages:
+            sys.exit(0)
+        packages = remove_duplicates(packages + changed)
+
+    no_deps = args.no_deps
+    fingerprints = None
+    if args.skip_unchanged or config_content.get("skip_unchanged") in ("on", True):
+        fingerprints = FingerprintCache(
+            workspace, os.path.join(workspace, install_space),
+            [colcon_build_args, build_space, install_space, config_content.get("extend_path") or ""])
+        candidates = fingerprints.candidates(packages, no_deps)
+        stale = fingerprints.stale(candidates)
+        skipped = [name for name in candidates if name not in stale]
+        if skipped:
+            durations = fastest_durations(workspace, 'build')
+            saved = sum(durations.get(name, 0.0) for name in skipped)
+            print(clr(f"Skipping {len(skipped)} of {len(candidates)} unchanged packages "
+                      f"(saves ~{_fmt_duration(saved)}).", _DIM))
+        if not stale:
+            print("All packages are up to date.")
+            sys.exit(0)
+        packages, no_deps = stale, True
+
     if packages:
-        if args.no_deps:
+        if no_deps:
             colcon_cmd += ['--packages-select'] + packages
         else:
             colcon_cmd += ['--packages-up-to'] + packages
 
-    use_status_display = supports_ansi()
-
-    if use_status_display:
-        colcon_cmd += ['--event-handlers', 'status-', 'parallel_status-']
-
-    colcon_shell_cmd = ' '.join(colcon_cmd)
-
+    shell_prefix = ''
     extend_path = config_content.get("extend_path", None)
     if extend_path:
         extend_script = os.path.join(extend_path, "setup.bash")
         if not os.path.exists(extend_script):
             print(f"Error: '{extend_script}' does not exist.")
             sys.exit(1)
-        colcon_shell_cmd = f'source {extend_script} && ' + colcon_shell_cmd
+        shell_prefix = f'source {extend_script} && '
 
-    print(clr(f"Running: {colcon_shell_cmd}", _DIM))
+    use_status_display = supports_ansi()
 
+    events = None
     if use_status_display:
-        from .status_display import run_build_with_status
-        pkg_names = _list_packages(workspace, packages, args.no_deps)
-        total = len(pkg_names) if pkg_names else None
-        env = {**os.environ, 'PYTHONUNBUFFERED': '1', 'VERBOSE': '1'}
-        process = subprocess.Popen(
-            colcon_shell_cmd,
-            cwd=workspace,
-            shell=True,
-            executable="/bin/bash",
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            env=env,
-        )
-        returncode = run_build_with_status(process, workspace, nice, total=total, pkg_names=pkg_names)
-        sys.exit(returncode)
-    else:
-        process = subprocess.Popen(
-            colcon_shell_cmd,
-            cwd=workspace,
-            shell=True,
-            executable="/bin/bash",
-            stdout=sys.stdout,
-            stderr=sys.stderr,
-        )
-        while process.poll() is None:
-            subprocess.run(
-                f"renice -n {nice} -p $(pgrep -g $(ps -o pgid= -p {process.pid}))",
+        event_handlers = ['status-', 'parallel_status-']
+        if handler_available(workspace, shell_prefix):
+            events = EventChannel()
+            event_handlers += list(REPLACED_EVENT_HANDLERS) + ['hatchy+']
+        colcon_cmd += ['--event-handlers'] + event_handlers
+
+    colcon_shell_cmd = shell_prefix + ' '.join(colcon_cmd)
+
+
+    print(clr(f"Running: {colcon_shell_cmd}", _DIM))
+
+    envelope = CgroupEnvelope.from_config(config_content)
+    if envelope.limits and not envelope.prepare():
+        print(clr(f"Warning: {envelope.failure}; resource limits ignored.", _YELLOW))
+    elif envelope.active:
+        if envelope.dropped:
+            print(clr(f"Warning: resource limits dropped: {envelope.describe_dropped()}", _YELLOW))
+        print(clr(f"Resource limits: {envelope.describe()} ({envelope.method})", _DIM))
+    colcon_shell_cmd = envelope.wrap(colcon_shell_cmd)
+    jobserver = Jobserver(cpu_count()) if use_jobserver else None
+    monitor = PressureMonitor(jobserver) if jobserver and args.adaptive_jobs else None
+    try:
+        history = RunRecorder(workspace, 'build', colcon_build_args)
+        ninja_offsets = snapshot_offsets(os.path.join(workspace, build_space)) if args.trace else None
+
+        if use_status_display:
+            from .status_display import run_build_with_status
+            pkg_names = resolve_packages(workspace, packages, 'select' if no_deps else 'up-to')
+            total = len(pkg_names) if pkg_names else None
+            eta = load_eta_model(workspace, 'build', colcon_cmd)
+            if eta and pkg_names:
+                history.predicted = eta.remaining({}, pkg_names)
+            env = {**os.environ, 'PYTHONUNBUFFERED': '1', 'VERBOSE': '1'}
+            if jobserver:
+                env = jobserver.env(env)
+            popen_kwargs = events.popen_kwargs(env) if events else {'env': env}
+            popen_kwargs.update(envelope.popen_kwargs(priority.popen_kwargs()))
+            process = subprocess.Popen(
+                colcon_shell_cmd,
+                cwd=workspace,
+                shell=True,
+                executable="/bin/bash",
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                **popen_kwargs,
+            )
+            envelope.attach(process.pid)
+            if monitor:
+                monitor.start()
+            if events:
+                events.close_write_end()
+            status_fns = [envelope.usage] + ([jobserver.status] if monitor else [])
+            returncode = run_build_with_status(process, workspace, priority, total=total, pkg_names=pkg_names,
+                                               events=events,
+                                               stderr_memory_lines=get_stderr_memory_lines(config_content),
+                                               status_fns=status_fns, history=history, eta=eta)
+        else:
+            process = subprocess.Popen(
+                colcon_shell_cmd,
+                cwd=workspace,
                 shell=True,
                 executable="/bin/bash",
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL)
-            time.sleep(1)
-        sys.exit(process.returncode)
+                stdout=sys.stdout,
+                stderr=sys.stderr,
+                env=jobserver.env(os.environ) if jobserver else None,
+                **envelope.popen_kwargs(priority.popen_kwargs()),
+            )
+            envelope.attach(process.pid)
+            if monitor:
+                monitor.start()
+            returncode = wait_with_priority(process, priority)
+            history.add_from_event_log('latest_build')
+    finally:
+        if events:
+            events.close()
+        _stop_jobserver(jobserver, monitor)
+        envelope.cleanup()
+    build_dir = os.path.join(workspace, build_space)
+    history.finish(returncode, build_dir=build_dir)
+    if fingerprints:
+        fingerprints.update([p['name'] for p in history.packages if p.get('ok')], history.started)
+    if parse_cmake_settings(colcon_build_args)['time_trace'] == 'on':
+        _summarize_time_traces(workspace, build_dir)
+    if args.trace:
+        _write_trace(args.trace, history.packages, build_dir, ninja_offsets)
+    sys.exit(returncode)
@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import sys
+
+import yaml
+
+from .common import get_workspace_dir, clr, _fmt_duration, _strip_ansi, _BRIGHT_MAGENTA, _CYAN, _DIM, _GREEN, _RED
+from .history import RECENT_RUNS, connect, ingest_ninja_logs, percentile
+from .ninja_log import source_path
+from .time_trace import refresh_time_traces, top_entries, trace_totals
+
+# Smallest change of a step's time against its earlier median shown as a trend.
+_MIN_CHANGE = 0.10
+# Steps faster than this (ms) are too noisy to report as trends.
+_MIN_TREND_MS = 1000
+
+
+def register(subparsers):
+    parser = subparsers.add_parser(
+        "build-report", help="Shows compile and link costs from the ninja logs of a workspace.")
+    parser.add_argument("--workspace", "-w", default=".",
+                        help="The path to the colcon workspace (default: \".\")")
+    parser.add_argument(
+        "pkgs", metavar="PKGNAME", nargs='*', type=str,
+        help="Only report on these packages.")
+    parser.add_argument("--time-trace", action="store_true",
+                        help="Report header, template and codegen costs from clang -ftime-trace profiles instead.")
+    parser.add_argument("--limit", "-n", type=int, default=10,
+                        help="Number of entries to list per section. (default: 10)")
+    parser.set_defaults(func=build_report_command)
+
+
+def _latest_steps(conn, pkgs):
+    """(package, output, kind, seconds) of the latest run of every step."""
+    rows = conn.execute(
+        "SELECT package, output, kind, duration_ms FROM ninja_steps WHERE id IN "
+        "(SELECT MAX(id) FROM ninja_steps GROUP BY package, output)").fetchall()
+    return [(pkg, output, kind, ms / 1000) for pkg, output, kind, ms in rows
+            if not pkgs or pkg in pkgs]
+
+
+def _pad(cell, width):
+    return cell + ' ' * (width - len(_strip_ansi(cell)))
+
+
+def _print_table(title, headers, rows):
+    widths = [max([len(h)] + [len(_strip_ansi(row[i])) for row in rows]) for i, h in enumerate(headers)]
+    sep = clr("-" * max(sum(widths) + 2 * (len(widths) - 1), len(title)), _BRIGHT_MAGENTA)
+    print(sep)
+    print(clr(title, _CYAN))
+    print(sep)
+    print('  '.join(_pad(clr(h, _DIM), w) for h, w in zip(headers, widths)).rstrip())
+    for row in rows:
+        print('  '.join(_pad(cell, w) for cell, w in zip(row, widths)).rstrip())
+    print(sep)
+
+
+def _print_slowest(steps, kind, title, limit):
+    ranked = sorted((s for s in steps if s[2] == kind), key=lambda s: s[3], reverse=True)[:limit]
+    if ranked:
+        _print_table(title, ['time', 'package', 'file'],
+                     [[_fmt_duration(secs), pkg, source_path(output)] for pkg, output, _, secs in ranked])
+
+
+def _print_totals(steps, title, key_fn, label, limit):
+    totals = {}
+    for step in steps:
+        if step[2] == 'compile':
+            total = totals.setdefault(key_fn(step), [0.0, 0])
+            total[0] += step[3]
+            total[1] += 1
+    ranked = sorted(totals.items(), key=lambda kv: kv[1][0], reverse=True)[:limit]
+    if ranked:
+        _print_table(title, ['compile', 'TUs', label],
+                     [[_fmt_duration(secs), str(count), key] for key, (secs, count) in ranked])
+
+
+def _print_trends(conn, steps, limit):
+    """Steps whose latest time moved against the median of their earlier runs.
+
+    Only the newest runs of each of ``steps`` are read, through the
+    ``ninja_steps_output`` index, however many builds the history holds.
+    """
+    changes = []
+    for pkg, output, kind, _ in steps:
+        if kind == 'other':
+            continue
+        runs = [ms for ms, in conn.execute(
+            "SELECT duration_ms FROM ninja_steps WHERE package = ? AND output = ? "
+            "ORDER BY id DESC LIMIT ?", (pkg, output, RECENT_RUNS + 1))]
+        if len(runs) < 2:
+            continue
+        latest, before = runs[0], percentile(runs[1:], 50)
+        if max(latest, before) >= _MIN_TREND_MS and before > 0 and abs(latest - before) / before >= _MIN_CHANGE:
+            changes.append((pkg, output, before / 1000, latest / 1000))
+    if not changes:
+        return
+    changes.sort(key=lambda c: abs(c[3] - c[2]), reverse=True)
+    rows = []
+    for pkg, output, before, after in changes[:limit]:
+        pct = 100 * (after - before) / before
+        rows.append([f"{_fmt_duration(before)} -> {_fmt_duration(after)}",
+                     clr(f"{pct:+.0f}%", _RED if pct > 0 else _GREEN), pkg, source_path(output)])
+    _print_table("Changes against earlier builds", ['time', 'change', 'package', 'file'], rows)
+
+
+def _display_path(path, workspace):
+    """Headers in the workspace relative to it, others (system, underlays) as is."""
+    if path.startswith(workspace + os.sep):
+        return os.path.relpath(path, workspace)
+    return path
+
+
+def _print_time_traces(conn, workspace, build_dir, pkgs, limit):
+    with conn:
+        refresh_time_traces(conn, build_dir)
+    tus, frontend, backend = trace_totals(conn, pkgs)
+    if not tus:
+        print("No clang time traces found. Enable them with 'hatchy config --time-trace on' and rebuild.")
+        return
+    print(clr(f"{tus} translation units: {_fmt_duration(frontend)} frontend, "
+              f"{_fmt_duration(backend)} backend", _DIM))
+    sections = (
+        ('header', "Most expensive headers", 'header'),
+        ('template', "Most expensive template instantiations", 'template'),
+        ('codegen', "Code generation hot spots", 'function'),
+    )
+    for kind, title, label in sections:
+        rows = top_entries(conn, kind, limit, pkgs)
+        if rows:
+            _print_table(title, ['total', 'TUs', 'count', 'avg', label],
+                         [[_fmt_duration(secs), str(n_tus), str(count), _fmt_duration(secs / count),
+                           _display_path(name, workspace) if kind == 'header' else name]
+                          for name, secs, n_tus, count in rows])
+
+
+def build_report_command(args):
+    workspace = os.path.abspath(args.workspace)
+
+    if not os.path.exists(workspace):
+        print(f"Error: The specified workspace directory '{workspace}' does not exist.")
+        sys.exit(1)
+
+    workspace = get_workspace_dir(workspace)
+    if workspace is None:
+        print(f"Error: Parent colcon workspace directory does not exist.")
+        sys.exit(1)
+
+    config_file = os.path.join(workspace, ".hatch", "config.yaml")
+    config_content = {"build_space": "build"}
+    if os.path.exists(config_file):
+        with open(config_file, "r") as f:
+            config_content.update(yaml.safe_load(f))
+    build_dir = os.path.join(workspace, config_content.get("build_space", "build") or "build")
+
+    try:
+        conn = connect(workspace)
+    except sqlite3.Error as e:
+        print(f"Error: Could not open build history: {e}")
+        sys.exit(1)
+    try:
+        if args.time_trace:
+            _print_time_traces(conn, workspace, build_dir, set(args.pkgs), args.limit)
+            sys.exit(0)
+        with conn:
+            ingest_ninja_logs(conn, build_dir)
+        steps = _latest_steps(conn, set(args.pkgs))
+        if not steps:
+            print("No ninja build logs found. Build with 'hatchy config --generator ninja' to collect them.")
+            sys.exit(0)
+
+        compiles = sum(1 for s in steps if s[2] == 'compile')
+        links = sum(1 for s in steps if s[2] == 'link')
+        packages = len({s[0] for s in steps})
+        print(clr(f"{compiles} translation units and {links} links in {packages} packages", _DIM))
+        _print_slowest(steps, 'compile', "Slowest translation units", args.limit)
+        _print_slowest(steps, 'link', "Slowest links", args.limit)
+        _print_totals(steps, "Compile time by package", lambda s: s[0], 'package', args.limit)
+        _print_totals(steps, "Compile time by directory",
+                      lambda s: os.path.join(s[0], os.path.dirname(source_path(s[1]))).rstrip('/'),
+                      'directory', args.limit)
+        _print_trends(conn, steps, args.limit)
+    finally:
+        conn.close()
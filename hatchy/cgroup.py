@@ -0,0 +1,313 @@
+"""cgroup v2 resource envelope for the colcon process tree.
+
+When any of ``cpu_weight``, ``memory_high``, ``memory_max`` or ``io_weight``
+is configured, colcon runs inside its own cgroup with those limits applied:
+
+- through a transient ``systemd-run --user --scope`` unit when a systemd user
+  manager is reachable, otherwise
+- in a child cgroup created under hatchy's own cgroup, when that cgroup has
+  been delegated to the user (writable) and hatchy is the only process in
+  it, as in a container or a batch job's delegated cgroup.  hatchy moves
+  itself into a sibling leaf first, as a cgroup can only enable controllers
+  for its children once it holds no processes itself; a shell or other
+  process sharing the cgroup prevents that, unless the needed controllers
+  are already enabled for children.
+
+If neither is possible the limits are skipped with a warning and the build
+runs unconfined; limits whose controller or control file is unavailable are
+dropped with a warning naming them.  While running, `CgroupEnvelope.usage`
+reports the group's memory and CPU use for the status overlay.
+"""
+
+import os
+import re
+import shlex
+import shutil
+import time
+from typing import Dict, List, Optional
+
+from .common import _fmt_bytes
+
+_CGROUP_ROOT = '/sys/fs/cgroup'
+
+# config.yaml key -> (cgroup control file, systemd unit property)
+LIMITS = {
+    'cpu_weight': ('cpu.weight', 'CPUWeight'),
+    'memory_high': ('memory.high', 'MemoryHigh'),
+    'memory_max': ('memory.max', 'MemoryMax'),
+    'io_weight': ('io.weight', 'IOWeight'),
+}
+
+_SIZE_RE = re.compile(r'^(\d+)([KMGT]?)$', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+# cgroup controller each limit needs.
+_CONTROLLERS = {
+    'cpu_weight': 'cpu',
+    'memory_high': 'memory',
+    'memory_max': 'memory',
+    'io_weight': 'io',
+}
+
+# Minimum interval between reads of the group's usage counters.
+_USAGE_INTERVAL_S = 1.0
+
+
+def parse_size(value: str) -> Optional[int]:
+    """Parse a byte size such as '8G' or '512M'; None if malformed."""
+    m = _SIZE_RE.match(value.strip())
+    if not m:
+        return None
+    return int(m.group(1)) * _SIZE_UNITS[m.group(2).upper()]
+
+
+def parse_weight(value: str) -> Optional[int]:
+    """Parse a cpu/io weight (1-10000); None if out of range or malformed."""
+    try:
+        weight = int(value)
+    except ValueError:
+        return None
+    return weight if 1 <= weight <= 10000 else None
+
+
+def _own_cgroup() -> Optional[str]:
+    """Absolute path of the cgroup v2 directory containing this process."""
+    try:
+        with open('/proc/self/cgroup') as f:
+            for line in f:
+                if line.startswith('0::'):
+                    return os.path.join(_CGROUP_ROOT, line[3:].strip().lstrip('/'))
+    except OSError:
+        pass
+    return None
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return ''
+
+
+def _write(path: str, value: str) -> Optional[str]:
+    """Write a cgroup file; the error, or None if it was accepted."""
+    try:
+        with open(path, 'w') as f:
+            f.write(value)
+    except OSError as e:
+        return e.strerror or str(e)
+    return None
+
+
+def _systemd_user_available() -> bool:
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    return bool(shutil.which('systemd-run')
+                and os.path.isdir('/run/systemd/system')
+                and runtime and os.path.exists(os.path.join(runtime, 'systemd', 'private')))
+
+
+class CgroupEnvelope:
+    """Confines a colcon process tree to a cgroup with configured limits."""
+
+    def __init__(self, limits: dict):
+        self.limits = {k: str(v) for k, v in limits.items() if v not in (None, '')}
+        self.method: Optional[str] = None
+        self.path: Optional[str] = None
+        self._pid: Optional[int] = None
+        self._usage_time = 0.0
+        self._usage_cpu_usec: Optional[int] = None
+        self._usage_str: Optional[str] = None
+        # Set by `prepare`: limits that couldn't be applied, and why nothing could be.
+        self.dropped: Dict[str, str] = {}
+        self.failure: Optional[str] = None
+        self._self_path: Optional[str] = None
+        self._enabled: List[str] = []
+        if not self.limits:
+            return
+        if _systemd_user_available():
+            self.method = 'systemd-run'
+        else:
+            parent = _own_cgroup()
+            # cgroup.controllers only exists on a cgroup v2 hierarchy; a v1 or
+            # hybrid mount at the same path must not be written to.
+            if (parent and os.path.exists(os.path.join(parent, 'cgroup.controllers'))
+                    and os.access(parent, os.W_OK)):
+                self.method = 'cgroup'
+                self.path = os.path.join(parent, f'hatchy-{os.getpid()}')
+                self._self_path = f'{self.path}-self'
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'CgroupEnvelope':
+        return cls({key: config.get(key) for key in LIMITS})
+
+    @property
+    def active(self) -> bool:
+        return self.method is not None
+
+    def describe(self) -> str:
+        return ', '.join(f"{LIMITS[k][1]}={v}" for k, v in self.limits.items())
+
+    def wrap(self, shell_cmd: str) -> str:
+        """Wrap a shell command so it starts inside the envelope."""
+        if self.method != 'systemd-run':
+            return shell_cmd
+        props = ' '.join(f'-p {LIMITS[k][1]}={shlex.quote(v)}' for k, v in self.limits.items())
+        return (f'exec systemd-run --user --scope --quiet --collect {props} '
+                f'-- /bin/bash -c {shlex.quote(shell_cmd)}')
+
+    def prepare(self) -> bool:
+        """Set up the envelope.  False if no limit can be applied (see `failure`).
+
+        With the cgroup method, limits that can't be applied are removed
+        from `limits` and recorded with the reason in `dropped`.
+        """
+        if self.method != 'cgroup':
+            if not self.active:
+                self.failure = "no delegated cgroup v2 or systemd user manager available"
+            return self.active
+        parent = os.path.dirname(self.path)
+        # A cgroup that hands controllers to its children can't hold
+        # processes itself, so hatchy first moves into a leaf of its own.
+        # That only empties the parent if nothing else (such as the shell
+        # hatchy was started from) is in it.
+        enabled = _read(os.path.join(parent, 'cgroup.subtree_control')).split()
+        others = set(_read(os.path.join(parent, 'cgroup.procs')).split()) - {str(os.getpid())}
+        if others and not all(_CONTROLLERS[key] in enabled for key in self.limits):
+            return self._fail(f"parent cgroup {parent} not empty ({len(others)} other processes)")
+        try:
+            os.makedirs(self._self_path, exist_ok=True)
+        except OSError as e:
+            return self._fail(f"can't create {self._self_path}: {e.strerror}")
+        error = _write(os.path.join(self._self_path, 'cgroup.procs'), '0')
+        if error:
+            self.cleanup()
+            return self._fail(f"can't move hatchy out of {parent}: {error}")
+
+        available = _read(os.path.join(parent, 'cgroup.controllers')).split()
+        for controller in sorted({_CONTROLLERS[key] for key in self.limits}):
+            if controller in enabled:
+                continue
+            if controller not in available:
+                reason = f"{controller} controller not delegated"
+            else:
+                error = _write(os.path.join(parent, 'cgroup.subtree_control'), f'+{controller}')
+                if not error:
+                    self._enabled.append(controller)
+                    continue
+                reason = f"can't enable {controller} controller: {error}"
+            for key in [k for k in self.limits if _CONTROLLERS[k] == controller]:
+                self.dropped[key] = reason
+                del self.limits[key]
+
+        try:
+            os.makedirs(self.path, exist_ok=True)
+        except OSError as e:
+            self.cleanup()
+            return self._fail(f"can't create {self.path}: {e.strerror}")
+        for key, value in list(self.limits.items()):
+            control = os.path.join(self.path, LIMITS[key][0])
+            if LIMITS[key][0] == 'io.weight':
+                value = f'default {value}'
+            if not os.path.exists(control):
+                error = f"no {LIMITS[key][0]} in {self.path}"
+            else:
+                error = _write(control, value)
+            if error:
+                self.dropped[key] = error
+                del self.limits[key]
+        if not self.limits:
+            self.cleanup()
+            return self._fail(f"could not apply {self.describe_dropped()}")
+        return True
+
+    def _fail(self, reason: str) -> bool:
+        self.method = None
+        self.failure = reason
+        return False
+
+    def describe_dropped(self) -> str:
+        return ', '.join(f"{LIMITS[k][1]} ({reason})" for k, reason in self.dropped.items())
+
+    def popen_kwargs(self, base: dict) -> dict:
+        """Extend ``Popen`` kwargs so the child joins the cgroup before exec."""
+        if self.method != 'cgroup':
+            return base
+        procs = os.path.join(self.path, 'cgroup.procs')
+        inner = base.get('preexec_fn')
+
+        def _join():
+            if inner is not None:
+                inner()
+            try:
+                with open(procs, 'w') as f:
+                    f.write('0')
+            except OSError:
+                pass
+
+        return {**base, 'preexec_fn': _join}
+
+    def attach(self, pid: int) -> None:
+        """Record the colcon process; its scope cgroup is looked up lazily by `usage`."""
+        self._pid = pid
+
+    def _resolve_path(self) -> Optional[str]:
+        if self.path is None and self._pid is not None:
+            try:
+                with open(f'/proc/{self._pid}/cgroup') as f:
+                    for line in f:
+                        if line.startswith('0::'):
+                            path = os.path.join(_CGROUP_ROOT, line[3:].strip().lstrip('/'))
+                            if path != _own_cgroup():
+                                self.path = path
+            except OSError:
+                pass
+        return self.path
+
+    def usage(self) -> Optional[str]:
+        """Short 'mem 3.2G cpu 740%' string for the overlay, or None."""
+        if not self.active:
+            return None
+        now = time.monotonic()
+        if now - self._usage_time < _USAGE_INTERVAL_S:
+            return self._usage_str
+        path = self._resolve_path()
+        if path is None:
+            return None
+        parts = []
+        try:
+            with open(os.path.join(path, 'memory.current')) as f:
+                parts.append(f"mem {_fmt_bytes(int(f.read()))}")
+        except (OSError, ValueError):
+            pass
+        try:
+            with open(os.path.join(path, 'cpu.stat')) as f:
+                usec = next(int(line.split()[1]) for line in f if line.startswith('usage_usec'))
+            if self._usage_cpu_usec is not None and now > self._usage_time:
+                pct = 100 * (usec - self._usage_cpu_usec) / ((now - self._usage_time) * 1e6)
+                parts.append(f"cpu {pct:.0f}%")
+            self._usage_cpu_usec = usec
+        except (OSError, ValueError, StopIteration):
+            pass
+        self._usage_time = now
+        self._usage_str = ' '.join(parts) or None
+        return self._usage_str
+
+    def cleanup(self) -> None:
+        """Undo `prepare`: remove the child cgroup once it is empty and move hatchy back."""
+        if self._self_path is None:
+            return
+        try:
+            os.rmdir(self.path)
+        except OSError:
+            pass
+        parent = os.path.dirname(self.path)
+        for controller in self._enabled:
+            _write(os.path.join(parent, 'cgroup.subtree_control'), f'-{controller}')
+        self._enabled = []
+        if os.path.isdir(self._self_path):
+            _write(os.path.join(parent, 'cgroup.procs'), '0')
+            try:
+                os.rmdir(self._self_path)
+            except OSError:
+                pass
@@ -0,0 +1,107 @@
+"""Packages affected by the changes in the workspace's git repositories.
+
+Each git repository under ``src`` is diffed against the merge base of a
+reference (``--since``, by default the branch's upstream) and HEAD, plus any
+uncommitted and untracked files.  Changed files map to the package whose
+directory contains them; packages that depend on a changed package are
+affected too.  Where changes can't be determined (no such ref, a non-git
+repository, a package outside any repository) the packages are assumed
+changed, so that a selection never misses something that needs building.
+"""
+
+import os
+import subprocess
+from typing import Dict, List, Optional, Set, Tuple
+
+from .common import clr, _DIM, _YELLOW
+from .graph import load_dependency_graph, with_dependents
+from .list import find_packages, find_repos
+
+
+def _git(repo_dir: str, *args: str) -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "-C", repo_dir] + list(args), capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def _base_commit(repo_dir: str, since: Optional[str]) -> Optional[str]:
+    """Commit to diff against: where HEAD branched off ``since`` (or the upstream)."""
+    base = _git(repo_dir, "merge-base", since or "@{upstream}", "HEAD")
+    if base:
+        return base.strip()
+    if since is None:
+        # No upstream: only uncommitted changes count.
+        return "HEAD"
+    return None
+
+
+def changed_files(repo_dir: str, since: Optional[str]) -> Optional[List[str]]:
+    """Files of a git repository changed since ``since``, relative to it; None if unknown."""
+    base = _base_commit(repo_dir, since)
+    if base is None:
+        return None
+    diff = _git(repo_dir, "diff", "--name-only", "--no-renames", "-z", base)
+    untracked = _git(repo_dir, "ls-files", "--others", "--exclude-standard", "-z")
+    if diff is None or untracked is None:
+        return None
+    return [path for path in (diff + untracked).split('\0') if path]
+
+
+def _owner(path: str, package_dirs: Dict[str, str]) -> Optional[str]:
+    directory = os.path.dirname(path)
+    while directory:
+        if directory in package_dirs:
+            return package_dirs[directory]
+        directory = os.path.dirname(directory)
+    return None
+
+
+def changed_packages(workspace: str, since: Optional[str]) -> Tuple[Set[str], List[str]]:
+    """Packages with changes since ``since``, and warnings about repos that couldn't be diffed."""
+    src_dir = os.path.join(workspace, "src")
+    package_dirs = {rel: name for name, rel in find_packages(src_dir)}
+    changed = set()
+    warnings = []
+    covered = set()
+    for repo in find_repos(src_dir):
+        repo_rel = repo["path"]
+        in_repo = {rel for rel in package_dirs if rel == repo_rel or rel.startswith(repo_rel + os.sep)}
+        covered |= in_repo
+        files = changed_files(os.path.join(workspace, repo_rel), since) if repo["type"] == "git" else None
+        if files is None:
+            if repo["type"] != "git":
+                reason = "not a git repository"
+            elif since is None:
+                reason = "no upstream branch or commit to compare with"
+            else:
+                reason = f"no '{since}' to compare with"
+            warnings.append(f"{repo_rel}: {reason}; treating its {len(in_repo)} package(s) as changed")
+            changed |= {package_dirs[rel] for rel in in_repo}
+            continue
+        for path in files:
+            owner = _owner(os.path.join(repo_rel, path), package_dirs)
+            if owner:
+                changed.add(owner)
+    loose = set(package_dirs) - covered
+    if loose:
+        warnings.append(f"{len(loose)} package(s) outside any repository treated as changed")
+        changed |= {package_dirs[rel] for rel in loose}
+    return changed, warnings
+
+
+def select_changed_packages(workspace: str, since: Optional[str]) -> List[str]:
+    """Changed packages and their dependents, reporting what was selected."""
+    changed, warnings = changed_packages(workspace, since)
+    for warning in warnings:
+        print(clr(f"Warning: {warning}.", _YELLOW))
+    affected = with_dependents(load_dependency_graph(workspace), changed)
+    base = since or "upstream"
+    if not affected:
+        print(clr(f"No packages changed since {base}.", _DIM))
+        return []
+    dependents = len(affected) - len(changed)
+    print(clr(f"Changed since {base}: {', '.join(sorted(changed))}"
+              + (f" (+{dependents} dependent package(s))" if dependents else ""), _DIM))
+    return sorted(affected)
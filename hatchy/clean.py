@@ -1,12 +1,12 @@
 import os
-import shutil
 import sys
 import textwrap
 
 import yaml
 
-from .common import (get_workspace_dir, get_package,
-                     get_dependent_packages, delete_matching_dirs)
+from .common import get_workspace_dir, get_package, find_matching_dirs, clr, _fmt_bytes, _DIM
+from .graph import resolve_packages
+from .trash import move_to_trash, pending, start_worker, trash_status
 
 
 def register(subparsers):
@@ -38,6 +38,8 @@ def register(subparsers):
     packages_group.add_argument(
         "--dependents", "--dep", action="store_true",
         help="Clean the packages which depend on the packages to be cleaned.")
+    parser.add_argument("--status", action="store_true",
+                        help="Show what previous cleans left to delete in the background.")
     parser.set_defaults(func=clean_command)
 
 
@@ -53,6 +55,10 @@ def clean_command(args):
         print(f"Error: Parent colcon workspace directory does not exist.")
         sys.exit(1)
 
+    if args.status:
+        _print_trash_status(workspace)
+        return
+
     config_file = os.path.join(workspace, ".hatch", "config.yaml")
 
     config_content = {
@@ -88,6 +94,9 @@ def clean_command(args):
 
     if len(target_paths) == 0:
         print("Nothing to clean.")
+        if pending(workspace):
+            # Resume deleting what an interrupted worker left behind.
+            start_worker(workspace)
         return
 
     packages = args.pkgs
@@ -97,7 +106,7 @@ def clean_command(args):
             packages.append(current_package)
 
     if len(packages) > 0 and args.dependents:
-        packages = get_dependent_packages(packages)
+        packages = resolve_packages(workspace, packages, 'above') or packages
 
     if len(packages) > 0:
         print("Cleaning the following packages:")
@@ -117,8 +126,23 @@ def clean_command(args):
             exit(1)
 
     if len(packages) > 0:
-        for target_path in target_paths:
-            delete_matching_dirs(target_path, packages)
+        doomed = [path for target_path in target_paths for path in find_matching_dirs(target_path, packages)]
     else:
-        for target_path in target_paths:
-            shutil.rmtree(target_path)
+        doomed = target_paths
+    moved, errors = move_to_trash(workspace, doomed)
+    if moved or pending(workspace):
+        start_worker(workspace)
+        print(clr("Deleting in the background; see `hatchy clean --status`.", _DIM))
+    for error in errors:
+        print(f"Error: {error}")
+    if errors:
+        sys.exit(1)
+
+
+def _print_trash_status(workspace):
+    batches, size, running = trash_status(workspace)
+    if not batches:
+        print("Nothing pending deletion.")
+        return
+    state = "being deleted" if running else "no worker running, `hatchy clean` resumes it"
+    print(f"{_fmt_bytes(size)} from {batches} clean(s) pending deletion, {state}.")
@@ -0,0 +1,70 @@
+"""colcon event handler that streams job events to a running hatchy process.
+
+Registered under the ``colcon_core.event_handler`` entry point group as
+``hatchy``.  The handler is inert unless hatchy passes the write end of an
+event pipe through the environment (see `events.EVENTS_FD_ENV`), so plain
+``colcon`` invocations are unaffected by having hatchy installed.
+
+Each event is written as one JSON object per line.  See `events` for the
+reading side and the event vocabulary.
+"""
+
+import json
+import os
+
+from colcon_core.event.job import JobEnded, JobStarted
+from colcon_core.event.output import StderrLine
+from colcon_core.event.test import TestFailure
+from colcon_core.event_handler import EventHandlerExtensionPoint
+from colcon_core.plugin_system import satisfies_version
+
+from .events import EVENTS_FD_ENV
+
+
+class HatchyEventHandler(EventHandlerExtensionPoint):
+    """Forward job start/end, stderr and test failure events to hatchy."""
+
+    def __init__(self):  # noqa: D107
+        super().__init__()
+        satisfies_version(
+            EventHandlerExtensionPoint.EXTENSION_POINT_VERSION, '^1.0')
+        self._fd = None
+        fd = os.environ.get(EVENTS_FD_ENV)
+        if fd and fd.isdigit():
+            self._fd = int(fd)
+
+    def _emit(self, payload):
+        if self._fd is None:
+            return
+        data = (json.dumps(payload, separators=(',', ':')) + '\n').encode()
+        try:
+            while data:
+                written = os.write(self._fd, data)
+                data = data[written:]
+        except OSError:
+            # hatchy went away; stop trying rather than failing the build.
+            self._fd = None
+
+    def __call__(self, event):  # noqa: D102
+        if self._fd is None:
+            return
+        data, job = event[0], event[1]
+
+        if isinstance(data, JobStarted):
+            self._emit({'event': 'start', 'pkg': data.identifier})
+
+        elif isinstance(data, JobEnded):
+            rc = data.rc
+            if not isinstance(rc, (int, str)) and rc is not None:
+                rc = str(rc)
+            self._emit({'event': 'end', 'pkg': data.identifier, 'rc': rc})
+
+        elif isinstance(data, TestFailure):
+            self._emit({'event': 'test_failure', 'pkg': data.identifier})
+
+        elif isinstance(data, StderrLine) and job is not None:
+            line = data.line
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', errors='replace')
+            for piece in line.rstrip('\n').split('\n'):
+                self._emit({'event': 'stderr', 'pkg': job.identifier, 'line': piece})
@@ -1,12 +1,7 @@
 import os
 import re
 import shlex
-import shutil
-import subprocess
 import sys
-import xml.etree.ElementTree as ET
-import yaml
-from pathlib import Path
 
 # ANSI color codes
 _RESET = "\033[0m"
@@ -96,23 +91,56 @@ def _fmt_duration(secs: float) -> str:
     return f"{h}h {int(m)}min {s:.1f}s"
 
 
+def _fmt_bytes(n: int) -> str:
+    for unit in ('B', 'K', 'M', 'G'):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}T"
+
+
+# Per-package stderr lines held in memory before the rest spills to a
+# temporary file under the log space.  Overridable per workspace with
+# `hatchy config --stderr-memory-lines`.
+STDERR_MEMORY_LINES = 20000
+
+
+def parse_line_count(value):
+    """A positive line count from a config value or argument; None if malformed."""
+    if isinstance(value, bool):
+        return None
+    try:
+        lines = int(value)
+    except (TypeError, ValueError):
+        return None
+    return lines if lines >= 1 and str(lines) == str(value).strip() else None
+
+
+def get_stderr_memory_lines(config):
+    """The workspace's ``stderr_memory_lines`` setting, or None for the default."""
+    value = config.get("stderr_memory_lines")
+    if value is None:
+        return None
+    lines = parse_line_count(value)
+    if lines is None:
+        print(clr(f"Warning: ignoring stderr_memory_lines {value!r} in config.yaml; "
+                  "expected a positive integer.", _YELLOW))
+    return lines
+
+
 def remove_duplicates(lst):
     seen = set()
     return [x for x in lst if not (x in seen or seen.add(x))]
 
 
-def delete_matching_dirs(root_dir, names_to_delete):
-    root_path = Path(root_dir)
-    for subdir in root_path.rglob('*'):
-        if subdir.is_dir() and subdir.name in names_to_delete:
-            shutil.rmtree(subdir)
-
-
-def get_dependent_packages(packages):
-    cmd = ["colcon", "list", "-n", "--packages-above"] + packages
-    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-    pkgs = [pkg for pkg in result.stdout.splitlines() if "not found" not in pkg.lower()]
-    return pkgs
+def find_matching_dirs(root_dir, names):
+    """Directories under root_dir named one of names, not counting those inside another match."""
+    matches = []
+    for dirpath, dirnames, _ in os.walk(root_dir):
+        for dirname in [d for d in dirnames if d in names]:
+            matches.append(os.path.join(dirpath, dirname))
+            dirnames.remove(dirname)
+    return matches
 
 
 def split_arguments(args, splitter_index):
@@ -165,6 +193,7 @@ def get_workspace_dir(current_dir):
 
 def parse_package_name(file_path):
     try:
+        import xml.etree.ElementTree as ET
         tree = ET.parse(file_path)
         root = tree.getroot()
         if root.tag != "package":
@@ -177,8 +206,108 @@ def parse_package_name(file_path):
         return None
 
 
+# package.xml tags naming packages that colcon orders a package after.
+_DEPENDENCY_TAGS = ('depend', 'build_depend', 'buildtool_depend', 'build_export_depend',
+                    'buildtool_export_depend', 'exec_depend', 'run_depend', 'test_depend')
+
+
+_CONDITION_TOKEN_RE = re.compile(r'\s*(\$\w+|==|!=|>=|<=|>|<|\(|\)|[^\s()=!<>]+)')
+_CONDITION_OPS = {
+    '==': lambda a, b: a == b, '!=': lambda a, b: a != b,
+    '>=': lambda a, b: a >= b, '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b, '<': lambda a, b: a < b,
+}
+
+
+def evaluate_condition(condition, env):
+    """Evaluate a package.xml ``condition`` attribute (REP 149) against ``env``.
+
+    Empty conditions are true; malformed ones are treated as true as well.
+    """
+    tokens = _CONDITION_TOKEN_RE.findall(condition or '')
+    if not tokens:
+        return True
+    pos = 0
+
+    def take():
+        nonlocal pos
+        if pos >= len(tokens):
+            raise ValueError(condition)
+        pos += 1
+        return tokens[pos - 1]
+
+    def operand():
+        token = take()
+        if token in _CONDITION_OPS or token in ('(', ')', 'and', 'or'):
+            raise ValueError(condition)
+        return env.get(token[1:], '') if token.startswith('$') else token
+
+    def atom():
+        if pos < len(tokens) and tokens[pos] == '(':
+            take()
+            result = disjunction()
+            if take() != ')':
+                raise ValueError(condition)
+            return result
+        left = operand()
+        op = take()
+        if op not in _CONDITION_OPS:
+            raise ValueError(condition)
+        return _CONDITION_OPS[op](left, operand())
+
+    def conjunction():
+        result = atom()
+        while pos < len(tokens) and tokens[pos] == 'and':
+            take()
+            result = atom() and result
+        return result
+
+    def disjunction():
+        result = conjunction()
+        while pos < len(tokens) and tokens[pos] == 'or':
+            take()
+            result = conjunction() or result
+        return result
+
+    try:
+        result = disjunction()
+        return result if pos == len(tokens) else True
+    except ValueError:
+        return True
+
+
+def parse_package_manifest(file_path):
+    """Return (name, dependencies, build type) from a package.xml, or None on error.
+
+    Dependencies are (name, condition) pairs, the condition being '' for
+    unconditional ones; see `evaluate_condition`.
+    """
+    try:
+        import xml.etree.ElementTree as ET
+        root = ET.parse(file_path).getroot()
+        if root.tag != "package":
+            return None
+        name_element = root.find("name")
+        if name_element is None or not name_element.text:
+            return None
+        deps = set()
+        for tag in _DEPENDENCY_TAGS:
+            for element in root.findall(tag):
+                if element.text and element.text.strip():
+                    deps.add((element.text.strip(), element.get("condition", "").strip()))
+        # catkin is the build type of packages that don't declare one.
+        build_type = root.findtext("export/build_type") or "catkin"
+        return name_element.text.strip(), deps, build_type.strip()
+    except Exception:
+        return None
+
+
 def get_package(current_dir):
     current_dir = os.path.abspath(current_dir)
+    workspace = get_workspace_dir(current_dir)
+    if workspace is not None:
+        from .package_index import package_containing
+        return package_containing(workspace, current_dir)
     while current_dir != os.path.dirname(current_dir):
         package_file = os.path.join(current_dir, 'package.xml')
         if os.path.isfile(package_file):
@@ -207,6 +336,7 @@ def parse_cmake_settings(colcon_build_args):
     ccache = None
     build_testing = None
     compile_commands = None
+    time_trace = None
     generator = None
 
     skip = set()
@@ -253,6 +383,11 @@ def parse_cmake_settings(colcon_build_args):
             compile_commands = m.group(1).lower()
             continue
 
+        m = re.match(r'^-DCMAKE_CXX_FLAGS(?::[A-Z_]+)?=(.*)$', token, re.IGNORECASE)
+        if m and '-ftime-trace' in m.group(1).split():
+            time_trace = 'on'
+            continue
+
     return {
         'generator': generator,
         'build_type': build_type,
@@ -261,6 +396,7 @@ def parse_cmake_settings(colcon_build_args):
         'ccache': ccache,
         'build_testing': build_testing,
         'compile_commands': compile_commands,
+        'time_trace': time_trace,
     }
 
 
@@ -274,8 +410,14 @@ def print_workspace_state(workspace):
     install_space = "install"
     test_result_space = "test_results"
     nice = 0
+    io_class = None
+    jobserver = None
+    skip_unchanged = None
+    stderr_memory_lines = None
+    limits = {}
 
     if os.path.exists(config_file):
+        import yaml
         with open(config_file, "r") as f:
             config = yaml.safe_load(f)
             colcon_build_args = config.get('colcon_build_args', [])
@@ -286,6 +428,16 @@ def print_workspace_state(workspace):
             install_space = config.get("install_space", "install") or "install"
             test_result_space = config.get("test_result_space", "test_results") or "test_results"
             nice = config.get("nice", 0) or 0
+            io_class = config.get("io_class", None)
+            jobserver = config.get("jobserver", None)
+            if isinstance(jobserver, bool):  # unquoted on/off in hand-edited YAML
+                jobserver = 'on' if jobserver else 'off'
+            skip_unchanged = config.get("skip_unchanged", None)
+            if isinstance(skip_unchanged, bool):
+                skip_unchanged = 'on' if skip_unchanged else 'off'
+            stderr_memory_lines = config.get("stderr_memory_lines", None)
+            limits = {key: config.get(key) for key in
+                      ('cpu_weight', 'memory_high', 'memory_max', 'io_weight')}
 
     build_dir = os.path.join(workspace, build_space)
     install_dir = os.path.join(workspace, install_space)
@@ -341,6 +493,19 @@ def print_workspace_state(workspace):
 
     print(sep)
     print(f"{_key_pad('CPU Niceness:', value_col)}{nice}")
+    print(f"{_key_pad('I/O Class:', key_w)}{_cmake_status(io_class)}")
+    print(f"{_key_pad('Shared Jobserver:', key_w)}{_cmake_status(jobserver, 'on')}")
+    print(f"{_key_pad('Skip Unchanged:', key_w)}{_cmake_status(skip_unchanged, 'off')}")
+    if stderr_memory_lines is not None and parse_line_count(stderr_memory_lines) is None:
+        stderr_lines_status = ' ' * _STATUS_TAG_W + clr(f"{stderr_memory_lines!r} (invalid)", _RED)
+    else:
+        stderr_lines_status = _cmake_status(None if stderr_memory_lines is None else str(stderr_memory_lines),
+                                            str(STDERR_MEMORY_LINES))
+    print(f"{_key_pad('Stderr Lines:', key_w)}{stderr_lines_status}")
+    for key, label in (('cpu_weight', 'CPU Weight:'), ('memory_high', 'Memory High:'),
+                       ('memory_max', 'Memory Max:'), ('io_weight', 'I/O Weight:')):
+        value = limits.get(key)
+        print(f"{_key_pad(label, key_w)}{_cmake_status(None if value is None else str(value))}")
     if not colcon_build_args:
         print(f"{_key_pad('Colcon Build Args:', value_col)}None")
     else:
@@ -354,4 +519,5 @@ def print_workspace_state(workspace):
     print(f"{_key_pad('Compiler Cache:', key_w)}{_cmake_status(cmake['ccache'])}")
     print(f"{_key_pad('Build Testing:', key_w)}{_cmake_status(cmake['build_testing'], 'on')}")
     print(f"{_key_pad('Compile Commands:', key_w)}{_cmake_status(cmake['compile_commands'], 'off')}")
+    print(f"{_key_pad('Time Trace:', key_w)}{_cmake_status(cmake['time_trace'], 'off')}")
     print(sep)
@@ -1,12 +1,12 @@
+from .common import get_workspace_dir
+from .package_index import load_package_index
+
+
 _BASH_COMPLETION_SCRIPT = """\
 # Bash completion for hatchy (https://github.com/hatchbed/hatchy)
 
 _hatchy_packages() {
-    local ws="${1:-.}"
-    if [[ -d "$ws/src" ]]; then
-        find "$ws/src" -name "package.xml" -exec dirname {} \\; 2>/dev/null \\
-            | xargs -I{} basename {} 2>/dev/null
-    fi
+    command hatchy _complete packages --workspace "${1:-.}" 2>/dev/null
 }
 
 _hatchy_get_workspace() {
@@ -46,7 +46,7 @@ _hatchy() {
     # Top level
     if [[ -z "$subcommand" ]]; then
         COMPREPLY=($(compgen -W \\
-            "--version --help build clean completion config init list test" \\
+            "--version --help build build-report clean completion config daemon init list stats test" \\
             -- "$cur"))
         return
     fi
@@ -58,15 +58,31 @@ _hatchy() {
 
     case "$subcommand" in
         build)
+            if [[ "$prev" == "--io-class" ]]; then
+                COMPREPLY=($(compgen -W "best-effort idle Default" -- "$cur"))
+                return
+            fi
+            if [[ "$prev" == "--trace" ]]; then
+                _filedir json
+                return
+            fi
             if [[ -n "$cur" && "$cur" != -* ]]; then
                 COMPREPLY=($(compgen -W "$(_hatchy_packages "$workspace")" -- "$cur"))
             else
                 COMPREPLY=($(compgen -W "
-                    --workspace -w --this --no-deps
-                    --colcon-build-args --nice -n --help
+                    --workspace -w --this --no-deps --changed --since
+                    --colcon-build-args --nice -n --io-class --no-jobserver --adaptive-jobs
+                    --skip-unchanged --trace --help
                 " -- "$cur"))
             fi
             ;;
+        build-report)
+            if [[ -n "$cur" && "$cur" != -* ]]; then
+                COMPREPLY=($(compgen -W "$(_hatchy_packages "$workspace")" -- "$cur"))
+            else
+                COMPREPLY=($(compgen -W "--workspace -w --time-trace --limit -n --help" -- "$cur"))
+            fi
+            ;;
         clean)
             if [[ -n "$cur" && "$cur" != -* ]]; then
                 COMPREPLY=($(compgen -W "$(_hatchy_packages "$workspace")" -- "$cur"))
@@ -78,7 +94,7 @@ _hatchy() {
                     --install-space --install -i
                     --test-result-space --test -t
                     --log-space --logs -l
-                    --this --dependents --dep --help
+                    --this --dependents --dep --status --help
                 " -- "$cur"))
             fi
             ;;
@@ -122,7 +138,12 @@ _hatchy() {
                 COMPREPLY=($(compgen -W "$caches" -- "$cur"))
                 return
             fi
-            if [[ "$prev" == "--build-testing" || "$prev" == "--compile-commands" ]]; then
+            if [[ "$prev" == "--io-class" ]]; then
+                COMPREPLY=($(compgen -W "best-effort idle Default" -- "$cur"))
+                return
+            fi
+            if [[ "$prev" == "--build-testing" || "$prev" == "--compile-commands" || "$prev" == "--jobserver"
+                  || "$prev" == "--time-trace" || "$prev" == "--skip-unchanged" ]]; then
                 COMPREPLY=($(compgen -W "on off Default" -- "$cur"))
                 return
             fi
@@ -135,27 +156,48 @@ _hatchy() {
                 --test-result-space --test -t --default-test-result-space
                 --space-suffix -x
                 --generator --build-type --compiler --linker --ccache
-                --build-testing --compile-commands
+                --build-testing --compile-commands --time-trace
                 --no-colcon-build-args --colcon-build-args
-                --nice -n --help
+                --nice -n --io-class --jobserver --skip-unchanged
+                --cpu-weight --memory-high --memory-max --io-weight --help
             " -- "$cur"))
             ;;
         init)
             COMPREPLY=($(compgen -W "--workspace -w --help" -- "$cur"))
             ;;
+        daemon)
+            COMPREPLY=($(compgen -W "--workspace -w --detach -d --stop --status --help" -- "$cur"))
+            ;;
         list)
             if [[ -z "$subsubcommand" ]]; then
                 COMPREPLY=($(compgen -W "--help packages repos" -- "$cur"))
+            elif [[ "$subsubcommand" == "packages" ]]; then
+                COMPREPLY=($(compgen -W "--workspace -w --check --help" -- "$cur"))
+            elif [[ "$subsubcommand" == "repos" ]]; then
+                if [[ "$prev" == "--format" ]]; then
+                    COMPREPLY=($(compgen -W "table yaml" -- "$cur"))
+                else
+                    COMPREPLY=($(compgen -W "--workspace -w --format --status --help" -- "$cur"))
+                fi
             else
                 COMPREPLY=($(compgen -W "--workspace -w --help" -- "$cur"))
             fi
             ;;
+        stats)
+            if [[ -n "$cur" && "$cur" != -* ]]; then
+                COMPREPLY=($(compgen -W "$(_hatchy_packages "$workspace")" -- "$cur"))
+            else
+                COMPREPLY=($(compgen -W "
+                    --workspace -w --test --changes --accuracy --days --limit -n --help
+                " -- "$cur"))
+            fi
+            ;;
         test)
             if [[ -n "$cur" && "$cur" != -* ]]; then
                 COMPREPLY=($(compgen -W "$(_hatchy_packages "$workspace")" -- "$cur"))
             else
                 COMPREPLY=($(compgen -W "
-                    --workspace -w --this --no-deps
+                    --workspace -w --this --no-deps --changed --since
                     --colcon-build-args --verbose -v
                     --results-only -r --no-color --help
                 " -- "$cur"))
@@ -173,6 +215,21 @@ def register(subparsers):
         "completion", help="Print the bash completion script to stdout.")
     parser.set_defaults(func=completion_command)
 
+    # Used by the completion script; left out of the verb list without help=.
+    complete_parser = subparsers.add_parser("_complete")
+    complete_parser.add_argument("kind", choices=["packages"])
+    complete_parser.add_argument("--workspace", "-w", default=".")
+    complete_parser.set_defaults(func=complete_command)
+
 
 def completion_command(args):
     print(_BASH_COMPLETION_SCRIPT, end="")
+
+
+def complete_command(args):
+    workspace = get_workspace_dir(args.workspace)
+    if workspace is None:
+        return
+    names = sorted({p["name"] for p in load_package_index(workspace).values()})
+    if names:
+        print("\n".join(names))
@@ -6,7 +6,10 @@ import sys
 
 import yaml
 
-from .common import (get_workspace_dir, remove_duplicates, print_workspace_state)
+from .common import (get_workspace_dir, parse_cmake_settings, remove_duplicates, print_workspace_state,
+                     parse_line_count, STDERR_MEMORY_LINES)
+from .cgroup import LIMITS, parse_size, parse_weight
+from .priority import IO_CLASSES
 
 BUILD_TYPES = ['Debug', 'Release', 'RelWithDebInfo', 'MinSizeRel', 'Default']
 CACHES = ['ccache', 'sccache', 'Default']
@@ -24,6 +27,8 @@ _CMAKE_LINKER_FLAGS_RE = re.compile(r'^-DCMAKE_(EXE|MODULE|SHARED)_LINKER_FLAGS(
 _CMAKE_COMPILER_LAUNCHER_RE = re.compile(r'^-DCMAKE_(C|CXX)_COMPILER_LAUNCHER(:[A-Z_]+)?=', re.IGNORECASE)
 _CMAKE_BUILD_TESTING_RE = re.compile(r'^-DBUILD_TESTING(:[A-Z_]+)?=', re.IGNORECASE)
 _CMAKE_EXPORT_COMPILE_COMMANDS_RE = re.compile(r'^-DCMAKE_EXPORT_COMPILE_COMMANDS(:[A-Z_]+)?=', re.IGNORECASE)
+_CMAKE_LANG_FLAGS_RE = re.compile(r'^-DCMAKE_(C|CXX)_FLAGS(:[A-Z_]+)?=', re.IGNORECASE)
+_TIME_TRACE_FLAG = '-ftime-trace'
 
 
 def _ci_choice(choices):
@@ -38,6 +43,27 @@ def _ci_choice(choices):
     return convert
 
 
+def _cgroup_value(parse):
+    """Return a type converter for a cgroup limit, accepting any casing of 'Default'."""
+    def convert(value):
+        if value.lower() == 'default':
+            return 'Default'
+        if parse(value) is None:
+            raise argparse.ArgumentTypeError(f"invalid value {value!r}")
+        return value.upper() if parse is parse_size else int(value)
+    return convert
+
+
+def _line_count_value(value):
+    """Type converter for a positive line count, accepting any casing of 'Default'."""
+    if value.lower() == 'default':
+        return 'Default'
+    lines = parse_line_count(value)
+    if lines is None:
+        raise argparse.ArgumentTypeError(f"invalid value {value!r}; expected a positive integer")
+    return lines
+
+
 def _normalize_free(value):
     """Lowercase the value, mapping any casing of 'default' to canonical 'Default'."""
     return 'Default' if value.lower() == 'default' else value.lower()
@@ -166,6 +192,34 @@ def set_cmake_compile_commands(colcon_args, value):
     return _set_cmake_args(colcon_args, _CMAKE_EXPORT_COMPILE_COMMANDS_RE, new_values)
 
 
+def set_cmake_time_trace(colcon_args, value):
+    """Add or remove -ftime-trace in CMAKE_C_FLAGS and CMAKE_CXX_FLAGS, keeping any other flags.
+
+    'off' leaves an explicit (possibly empty) flags value behind so the
+    cached one of a previous configure is overwritten.
+    """
+    tokens = []
+    for arg in colcon_args:
+        tokens.extend(shlex.split(arg))
+    flags = {'C': [], 'CXX': []}
+    for token in tokens:
+        m = _CMAKE_LANG_FLAGS_RE.match(token)
+        if m:
+            flags[m.group(1).upper()] = [f for f in token[m.end():].split() if f != _TIME_TRACE_FLAG]
+
+    new_values = []
+    for lang, lang_flags in flags.items():
+        if value == 'on':
+            lang_flags = lang_flags + [_TIME_TRACE_FLAG]
+        if lang_flags or value == 'off':
+            new_values.append(f"-DCMAKE_{lang}_FLAGS={' '.join(lang_flags)}")
+    return _set_cmake_args(colcon_args, _CMAKE_LANG_FLAGS_RE, new_values)
+
+
+def _is_clang(compiler):
+    return compiler is not None and _VERSIONED_CLANG_RE.match(os.path.basename(compiler)) is not None
+
+
 def register(subparsers):
     parser = subparsers.add_parser("config", help="Configures a colcon workspace's context.")
     parser.add_argument("--workspace", "-w", default=".",
@@ -238,8 +292,47 @@ def register(subparsers):
         type=_ci_choice(BOOL_OPTIONS),
         help=f"Export compile commands (-DCMAKE_EXPORT_COMPILE_COMMANDS): {', '.join(BOOL_OPTIONS)}. "
              "'Default' removes the flag from colcon build args.")
+    build_group.add_argument(
+        "--time-trace", choices=BOOL_OPTIONS, metavar='VALUE',
+        type=_ci_choice(BOOL_OPTIONS),
+        help=f"Have clang write a -ftime-trace profile of every translation unit, summarized by "
+             f"'hatchy build-report --time-trace': {', '.join(BOOL_OPTIONS)}. Requires --compiler clang.")
     build_group.add_argument("--nice", "-n", type=int,
                              help="CPU niceness for build commands. (default: 0)")
+    build_group.add_argument(
+        "--io-class", choices=IO_CLASSES, metavar='CLASS',
+        type=_ci_choice(IO_CLASSES),
+        help=f"I/O scheduling class for build and test commands: {', '.join(IO_CLASSES)}. "
+             "'Default' leaves the I/O priority unchanged.")
+    build_group.add_argument(
+        "--jobserver", choices=BOOL_OPTIONS, metavar='VALUE',
+        type=_ci_choice(BOOL_OPTIONS),
+        help=f"Share one make/ninja jobserver sized to the CPU count across all package builds: "
+             f"{', '.join(BOOL_OPTIONS)}. (default: on)")
+    build_group.add_argument(
+        "--skip-unchanged", choices=BOOL_OPTIONS, metavar='VALUE',
+        type=_ci_choice(BOOL_OPTIONS),
+        help=f"Only build packages whose sources, build arguments or dependencies changed: "
+             f"{', '.join(BOOL_OPTIONS)}. (default: off)")
+    build_group.add_argument(
+        "--stderr-memory-lines", metavar='LINES', type=_line_count_value,
+        help=f"Stderr lines per package kept in memory by the status display before spilling "
+             f"to the log space, or 'Default'. (default: {STDERR_MEMORY_LINES})")
+    resource_group = parser.add_argument_group(
+        'Resource Limits', 'cgroup v2 limits for the colcon process tree. '
+        "'Default' removes the limit.")
+    resource_group.add_argument(
+        "--cpu-weight", metavar='WEIGHT', type=_cgroup_value(parse_weight),
+        help="Relative CPU weight, 1-10000 (cpu.weight; the system default is 100)")
+    resource_group.add_argument(
+        "--memory-high", metavar='SIZE', type=_cgroup_value(parse_size),
+        help="Memory usage above which the build is throttled and reclaimed, e.g. 16G (memory.high)")
+    resource_group.add_argument(
+        "--memory-max", metavar='SIZE', type=_cgroup_value(parse_size),
+        help="Hard memory limit, e.g. 24G (memory.max)")
+    resource_group.add_argument(
+        "--io-weight", metavar='WEIGHT', type=_cgroup_value(parse_weight),
+        help="Relative I/O weight, 1-10000 (io.weight; the system default is 100)")
     parser.set_defaults(func=config_command)
 
 
@@ -352,9 +445,46 @@ def config_command(args):
         colcon_args = config_content.get('colcon_build_args', []) or []
         config_content['colcon_build_args'] = set_cmake_compile_commands(colcon_args, args.compile_commands)
 
+    if args.time_trace:
+        colcon_args = config_content.get('colcon_build_args', []) or []
+        if args.time_trace == 'on' and not _is_clang(parse_cmake_settings(colcon_args)['compiler']):
+            print("Error: --time-trace requires clang. Set it with '--compiler clang' or '--compiler clang-<N>'.")
+            sys.exit(1)
+        config_content['colcon_build_args'] = set_cmake_time_trace(colcon_args, args.time_trace)
+
     if args.nice:
         config_content['nice'] = args.nice
 
+    if args.io_class:
+        if args.io_class == 'Default':
+            config_content.pop('io_class', None)
+        else:
+            config_content['io_class'] = args.io_class
+
+    if args.jobserver:
+        if args.jobserver == 'Default':
+            config_content.pop('jobserver', None)
+        else:
+            config_content['jobserver'] = args.jobserver
+
+    if args.skip_unchanged:
+        if args.skip_unchanged == 'Default':
+            config_content.pop('skip_unchanged', None)
+        else:
+            config_content['skip_unchanged'] = args.skip_unchanged
+
+    if args.stderr_memory_lines == 'Default':
+        config_content.pop('stderr_memory_lines', None)
+    elif args.stderr_memory_lines is not None:
+        config_content['stderr_memory_lines'] = args.stderr_memory_lines
+
+    for key in LIMITS:
+        value = getattr(args, key)
+        if value == 'Default':
+            config_content.pop(key, None)
+        elif value is not None:
+            config_content[key] = value
+
     with open(config_file, "w") as f:
         yaml.dump(config_content, f, default_flow_style=False)
 
@@ -0,0 +1,326 @@
+"""Resident per-workspace daemon holding the package index and repository list.
+
+``hatchy daemon`` keeps a workspace's package index and repositories in
+memory and answers queries on the Unix socket ``.hatch/daemon.sock``.
+inotify watches on the directories of ``src`` down to the packages and on
+the git and common git directories of every git repository (followed from
+a worktree's or submodule's ``.git`` file) tell it when to rescan;
+pending events are drained before every answer, so a reply never predates
+a change made before the query was sent.
+
+`query` is the client side: it returns None when no daemon is running or it
+doesn't answer promptly, and callers then compute the answer themselves.
+"""
+
+import json
+import os
+import select
+import socket
+import struct
+import subprocess
+import sys
+import time
+from typing import Dict, Optional
+
+from .common import get_workspace_dir, clr, _DIM, _GREEN
+from .git_info import git_dirs
+
+_PROTOCOL_VERSION = 1
+# How long a client waits for the daemon before doing the work itself.
+_CLIENT_TIMEOUT_S = 1.0
+# How often the daemon checks that its socket is still in place.
+_IDLE_CHECK_S = 30.0
+
+# inotify(7) event bits.
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x01000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+               | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct('iIII')
+# Files in a repository's .git directory that change its listed url or branch.
+_GIT_STATE_FILES = ('HEAD', 'config')
+
+
+def socket_path(workspace: str) -> str:
+    return os.path.join(workspace, '.hatch', 'daemon.sock')
+
+
+def _request(workspace: str, request: dict) -> Optional[dict]:
+    path = socket_path(workspace)
+    if not os.path.exists(path):
+        return None
+    request = dict(request, version=_PROTOCOL_VERSION)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(_CLIENT_TIMEOUT_S)
+            sock.connect(path)
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        reply = json.loads(b''.join(chunks))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(reply, dict) or reply.get('version') != _PROTOCOL_VERSION:
+        return None
+    return reply
+
+
+def query(workspace: str, name: str):
+    """The daemon's answer to ``name`` ('packages' or 'repos'), or None without a daemon."""
+    reply = _request(workspace, {'query': name})
+    return None if reply is None else reply.get('result')
+
+
+class _Inotify:
+    """Minimal ctypes binding of the Linux inotify API."""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Watch descriptor for ``path``, or -1 if it can't be watched."""
+        return self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+
+    def read(self):
+        """Pending (wd, mask, name) events."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+                offset += length
+                events.append((wd, mask, name))
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _WorkspaceState:
+    """Package index and repositories of a workspace, rescanned when inotify reports changes."""
+
+    def __init__(self, workspace: str, inotify: _Inotify):
+        self.workspace = workspace
+        self._inotify = inotify
+        self._watches: Dict[int, tuple] = {}
+        self._watched: Dict[str, int] = {}
+        self._packages = None
+        self._repos = None
+        self.queries = 0
+        self.started = time.time()
+
+    def _watch(self, path: str, kind: str) -> None:
+        if path in self._watched:
+            return
+        wd = self._inotify.add_watch(path, _WATCH_MASK)
+        if wd >= 0:
+            self._watches[wd] = (kind, path)
+            self._watched[path] = wd
+
+    def handle_events(self) -> None:
+        for wd, mask, name in self._inotify.read():
+            if mask & _IN_Q_OVERFLOW:
+                self._packages = self._repos = None
+                continue
+            if mask & _IN_IGNORED:
+                kind, path = self._watches.pop(wd, (None, None))
+                if path is not None and self._watched.get(path) == wd:
+                    del self._watched[path]
+            kind = self._watches.get(wd, ('src',))[0]
+            if kind == 'git':
+                if name in _GIT_STATE_FILES:
+                    self._repos = None
+            else:
+                # Directories under src decide both what packages and what repositories exist.
+                self._packages = self._repos = None
+
+    def packages(self) -> Dict[str, dict]:
+        if self._packages is None:
+            from .package_index import scan_package_index
+            dirs, self._packages = scan_package_index(self.workspace)
+            for rel in dirs:
+                self._watch(os.path.join(self.workspace, rel), 'src')
+        return self._packages
+
+    def repos(self) -> list:
+        if self._repos is None:
+            from .list import scan_repos
+            self._repos = scan_repos(os.path.join(self.workspace, 'src'))
+            for repo in self._repos:
+                if repo['type'] != 'git':
+                    continue
+                # A worktree's or submodule's .git is a file pointing at the
+                # git directory; HEAD is there, config in the common directory.
+                dirs = git_dirs(os.path.join(self.workspace, repo['path']))
+                for git_dir in set(dirs or ()):
+                    self._watch(git_dir, 'git')
+        return self._repos
+
+    def answer(self, request: dict) -> dict:
+        self.handle_events()
+        self.queries += 1
+        name = request.get('query')
+        if name == 'packages':
+            return {'result': self.packages()}
+        if name == 'repos':
+            return {'result': self.repos()}
+        if name == 'status':
+            return {'result': {'pid': os.getpid(), 'started': self.started, 'queries': self.queries,
+                               'watches': len(self._watches)}}
+        return {'error': f"unknown query {name!r}"}
+
+
+def _serve_client(conn: socket.socket, state: _WorkspaceState) -> bool:
+    """Answer one request; returns False if it asked the daemon to stop."""
+    conn.settimeout(_CLIENT_TIMEOUT_S)
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    try:
+        request = json.loads(data)
+    except ValueError:
+        return True
+    if not isinstance(request, dict) or request.get('version') != _PROTOCOL_VERSION:
+        reply = {}
+    elif request.get('query') == 'stop':
+        conn.sendall(json.dumps({'version': _PROTOCOL_VERSION, 'result': True}).encode())
+        return False
+    else:
+        reply = state.answer(request)
+    reply['version'] = _PROTOCOL_VERSION
+    conn.sendall(json.dumps(reply, separators=(',', ':')).encode())
+    return True
+
+
+def serve(workspace: str) -> None:
+    """Run the daemon for ``workspace`` until it is stopped or its socket is removed."""
+    path = socket_path(workspace)
+    if _request(workspace, {'query': 'status'}) is not None:
+        print(f"Error: A hatchy daemon is already running for '{workspace}'.")
+        sys.exit(1)
+    try:
+        inotify = _Inotify()
+    except (OSError, AttributeError) as e:
+        print(f"Error: inotify is not available: {e}")
+        sys.exit(1)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        if os.path.exists(path):
+            os.unlink(path)
+        server.bind(path)
+    except OSError as e:
+        print(f"Error: Could not create '{path}': {e}")
+        sys.exit(1)
+    server.listen(16)
+    inode = os.stat(path).st_ino
+    state = _WorkspaceState(workspace, inotify)
+    state.packages()
+    state.repos()
+    print(clr(f"hatchy daemon serving {workspace} (pid {os.getpid()})", _DIM))
+    try:
+        running = True
+        while running:
+            readable, _, _ = select.select([server, inotify.fd], [], [], _IDLE_CHECK_S)
+            if inotify.fd in readable:
+                state.handle_events()
+            if server in readable:
+                conn, _ = server.accept()
+                with conn:
+                    try:
+                        running = _serve_client(conn, state)
+                    except OSError:
+                        pass
+            if not readable:
+                try:
+                    running = os.stat(path).st_ino == inode
+                except OSError:
+                    running = False
+    finally:
+        server.close()
+        try:
+            if os.stat(path).st_ino == inode:
+                os.unlink(path)
+        except OSError:
+            pass
+        inotify.close()
+
+
+def register(subparsers):
+    parser = subparsers.add_parser(
+        "daemon", help="Keeps workspace state in memory to speed up other verbs.")
+    parser.add_argument("--workspace", "-w", default=".",
+                        help="The path to the colcon workspace (default: \".\")")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--detach", "-d", action="store_true",
+                        help="Start the daemon in the background.")
+    action.add_argument("--stop", action="store_true", help="Stop the running daemon.")
+    action.add_argument("--status", action="store_true", help="Show whether a daemon is running.")
+    parser.set_defaults(func=daemon_command)
+
+
+def daemon_command(args):
+    workspace = get_workspace_dir(os.path.abspath(args.workspace))
+    if workspace is None:
+        print(f"Error: Could not find a hatch workspace from '{args.workspace}'.")
+        sys.exit(1)
+
+    if args.stop:
+        if _request(workspace, {'query': 'stop'}) is None:
+            print("No hatchy daemon is running.")
+        else:
+            print("Stopped hatchy daemon.")
+        return
+
+    if args.status:
+        reply = _request(workspace, {'query': 'status'})
+        if reply is None:
+            print("No hatchy daemon is running.")
+            return
+        status = reply['result']
+        uptime = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(status['started']))
+        print(clr("hatchy daemon is running", _GREEN)
+              + f" (pid {status['pid']}, since {uptime}, {status['queries']} queries, "
+              f"{status['watches']} watched directories)")
+        return
+
+    if args.detach:
+        subprocess.Popen(
+            [sys.executable, '-m', 'hatchy.main', 'daemon', '--workspace', workspace],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if _request(workspace, {'query': 'status'}) is not None:
+                print(f"Started hatchy daemon for {workspace}.")
+                return
+            time.sleep(0.05)
+        print("Error: The hatchy daemon did not start.")
+        sys.exit(1)
+
+    serve(workspace)
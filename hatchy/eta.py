@@ -0,0 +1,100 @@
+"""Remaining-time predictions for the status overlay.
+
+Per-package durations come from the workspace history (`history`): the
+median of each package's recent successful runs.  The overall ETA replays
+the rest of the run as colcon would schedule it -- each package starts once
+its workspace dependencies have finished and a worker is free -- using
+those durations, so a long chain of dependent packages isn't hidden behind
+a wide but shallow set of quick ones.
+"""
+
+import heapq
+import os
+import shlex
+from typing import Dict, Iterable, List, Optional, Set
+
+from .graph import load_dependency_graph
+from .history import percentile, typical_durations
+
+
+def colcon_workers(colcon_cmd: List[str]) -> int:
+    """Number of packages colcon builds at once for ``colcon_cmd``."""
+    tokens = []
+    for arg in colcon_cmd:
+        tokens.extend(shlex.split(arg))
+    workers = os.cpu_count() or 1
+    for i, token in enumerate(tokens):
+        if token == '--executor' and tokens[i + 1:i + 2] == ['sequential']:
+            return 1
+        if token == '--parallel-workers' and i + 1 < len(tokens) and tokens[i + 1].isdigit():
+            workers = int(tokens[i + 1])
+        elif token.startswith('--parallel-workers=') and token.split('=', 1)[1].isdigit():
+            workers = int(token.split('=', 1)[1])
+    return max(1, workers)
+
+
+class EtaModel:
+    """Predicts package durations and the remaining time of a colcon run."""
+
+    def __init__(self, durations: Dict[str, float], deps: Dict[str, Set[str]], workers: int):
+        self._durations = durations
+        self._deps = deps
+        self._workers = max(1, workers)
+        # Packages without history are assumed to take a typical time.
+        self._fallback = percentile(list(durations.values()), 50) or 0.0
+
+    def __bool__(self) -> bool:
+        return bool(self._durations)
+
+    def predict(self, name: str) -> Optional[float]:
+        """Expected duration of ``name``, or None without history for it."""
+        return self._durations.get(name)
+
+    def remaining(self, running: Dict[str, float], pending: Iterable[str]) -> Optional[float]:
+        """Seconds until the run finishes.
+
+        ``running`` maps each running package to its elapsed time; ``pending``
+        lists the packages not yet started.  None without any history.
+        """
+        if not self._durations:
+            return None
+        pending = set(pending) - running.keys()
+        unfinished = pending | running.keys()
+        # Dependencies each pending package is still waiting for.
+        waiting = {name: self._deps.get(name, set()) & unfinished for name in pending}
+        dependents: Dict[str, List[str]] = {}
+        for name, deps in waiting.items():
+            for dep in deps:
+                dependents.setdefault(dep, []).append(name)
+        ready = [name for name, deps in waiting.items() if not deps]
+
+        now = 0.0
+        events = []
+        for name, elapsed in running.items():
+            expected = self._durations.get(name, self._fallback)
+            heapq.heappush(events, (max(expected - elapsed, 0.0), name))
+        free = max(0, self._workers - len(running))
+        while True:
+            # Longest first, like a critical-path-aware scheduler would.
+            ready.sort(key=lambda n: self._durations.get(n, self._fallback))
+            while free and ready:
+                name = ready.pop()
+                heapq.heappush(events, (now + self._durations.get(name, self._fallback), name))
+                free -= 1
+            if not events:
+                return now
+            now, name = heapq.heappop(events)
+            free += 1
+            for dependent in dependents.get(name, ()):
+                deps = waiting[dependent]
+                deps.discard(name)
+                if not deps:
+                    ready.append(dependent)
+
+
+def load_eta_model(workspace: str, verb: str, colcon_cmd: List[str]) -> Optional[EtaModel]:
+    """An `EtaModel` from the workspace history, or None if there is none yet."""
+    durations = typical_durations(workspace, verb)
+    if not durations:
+        return None
+    return EtaModel(durations, load_dependency_graph(workspace), colcon_workers(colcon_cmd))
@@ -0,0 +1,117 @@
+"""Structured colcon job events for the live status display.
+
+When the hatchy colcon event handler (`colcon_event_handler`) is installed in
+colcon's Python environment, hatchy hands colcon the write end of a pipe
+and receives one JSON object per line instead of scraping colcon's console
+output.  Events are dicts with an ``event`` key:
+
+- ``start``: ``pkg``
+- ``end``: ``pkg``, ``rc`` (0 on success, ``'SIGINT'`` when aborted)
+- ``stderr``: ``pkg``, ``line``
+- ``test_failure``: ``pkg``
+"""
+
+import json
+import os
+import shlex
+import subprocess
+from typing import Optional
+
+EVENTS_FD_ENV = 'HATCHY_EVENTS_FD'
+
+# colcon console handlers whose output is superseded by the structured events.
+REPLACED_EVENT_HANDLERS = ('console_start_end-', 'console_stderr-')
+
+
+# Run by the interpreter of the colcon script, in colcon's environment.
+_PROBE = (
+    "import json, sys\n"
+    "from colcon_core.extension_point import get_extension_points\n"
+    "print(json.dumps({'available': 'hatchy' in get_extension_points('colcon_core.event_handler'),"
+    " 'paths': sys.path}))"
+)
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def handler_available(workspace: str, shell_prefix: str = '') -> bool:
+    """True when colcon, run after ``shell_prefix``, will load the hatchy event handler extension.
+
+    colcon often runs from another Python environment than hatchy, so the
+    question is asked of colcon's own interpreter.  The answer is cached in
+    ``.hatch/event_handler.json`` until the shell prefix, PATH or PYTHONPATH
+    change, or a package is installed into or removed from one of the
+    directories on colcon's ``sys.path``.
+    """
+    cache_path = os.path.join(workspace, '.hatch', 'event_handler.json')
+    key = [shell_prefix, os.environ.get('PATH', ''), os.environ.get('PYTHONPATH', '')]
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached['key'] == key and all(_mtime(path) == mtime for path, mtime in cached['paths'].items()):
+            return cached['available']
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+
+    # The interpreter from colcon's shebang line, unquoted so "/usr/bin/env python3" works too.
+    command = (shell_prefix + 'exec $(sed -n "1s/^#!//p" "$(command -v colcon)") -c '
+               + shlex.quote(_PROBE))
+    try:
+        result = subprocess.run(["bash", "-c", command], capture_output=True, text=True, timeout=30)
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        available = bool(probe['available'])
+        paths = {path: _mtime(path) for path in probe['paths'] if path and os.path.isdir(path)}
+    except (OSError, subprocess.TimeoutExpired, IndexError, ValueError, KeyError, TypeError):
+        # No usable colcon to ask: fall back to following the logs.
+        return False
+    tmp = cache_path + '.tmp'
+    try:
+        with open(tmp, 'w') as f:
+            json.dump({'key': key, 'available': available, 'paths': paths}, f)
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass
+    return available
+
+
+def decode_event(raw: bytes) -> Optional[dict]:
+    """Parse one JSON-lines event, or None if it is malformed."""
+    try:
+        event = json.loads(raw)
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) and 'event' in event else None
+
+
+class EventChannel:
+    """Pipe carrying events from the colcon process back to hatchy."""
+
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+
+    def popen_kwargs(self, env: dict) -> dict:
+        """Keyword arguments for ``subprocess.Popen`` that hand colcon the pipe."""
+        return {
+            'env': {**env, EVENTS_FD_ENV: str(self.write_fd)},
+            'pass_fds': (self.write_fd,),
+        }
+
+    def close_write_end(self) -> None:
+        """Drop hatchy's copy of the write end so EOF arrives when colcon exits."""
+        if self.write_fd != -1:
+            os.close(self.write_fd)
+            self.write_fd = -1
+
+    def close(self) -> None:
+        self.close_write_end()
+        if self.read_fd != -1:
+            try:
+                os.close(self.read_fd)
+            except OSError:
+                pass
+            self.read_fd = -1
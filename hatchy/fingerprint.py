@@ -0,0 +1,181 @@
+"""Source fingerprints for skipping packages a build would leave unchanged.
+
+``.hatch/fingerprints.json`` records, for every package hatchy built
+successfully, a digest of its source tree's stat metadata (path, size,
+mtime and mode of every file except version control metadata and
+``__pycache__``), the newest mtime in it, a digest of the
+effective colcon/CMake arguments and the fingerprints of its workspace
+dependencies at the time.  A package is up to date while all of those still
+match and its install space marker exists.
+
+Checking a package first walks its tree only until it finds anything newer
+than the recorded mtime, so edited packages are found without a full walk.
+A fingerprint is only stored if nothing in the tree changed after the build
+started, so edits made during a build are picked up by the next one.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .graph import load_packages, with_dependencies
+
+_CACHE_VERSION = 1
+# Version control metadata and bytecode caches, which don't affect a build.
+_IGNORED = frozenset(('.git', '.hg', '.svn', '.bzr', '__pycache__'))
+# Stat-heavy tree walks overlap well on slow or network file systems.
+_WALK_WORKERS = 8
+
+
+def _sha1(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def tree_digest(path: str, newer_than: Optional[int] = None) -> Optional[Tuple[str, int]]:
+    """(digest, newest mtime in ns) of the files under ``path``.
+
+    Returns None as soon as an entry newer than ``newer_than`` is found.
+    Version control directories (``.git``, ``.hg``, ``.svn``, ``.bzr``) and
+    ``__pycache__`` are ignored; other dot-entries such as ``.clang-format``
+    are part of the digest.
+    """
+    entries = []
+    newest = 0
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.name in _IGNORED:
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if newer_than is not None and st.st_mtime_ns > newer_than:
+                    return None
+                newest = max(newest, st.st_mtime_ns)
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                rel = os.path.relpath(entry.path, path)
+                if entry.is_symlink():
+                    try:
+                        entries.append(f"{rel}\0->{os.readlink(entry.path)}")
+                    except OSError:
+                        pass
+                else:
+                    entries.append(f"{rel}\0{st.st_size}\0{st.st_mtime_ns}\0{st.st_mode}")
+    entries.sort()
+    return _sha1('\n'.join(entries)), newest
+
+
+def _installed(install_dir: str, name: str) -> bool:
+    """Whether colcon's package marker exists in an isolated or merged install space."""
+    marker = os.path.join('share', 'colcon-core', 'packages', name)
+    return (os.path.exists(os.path.join(install_dir, name, marker))
+            or os.path.exists(os.path.join(install_dir, marker)))
+
+
+class FingerprintCache:
+    """Up-to-date checks and fingerprint updates for the packages of one build."""
+
+    def __init__(self, workspace: str, install_dir: str, build_args: list):
+        self.path = os.path.join(workspace, '.hatch', 'fingerprints.json')
+        self._install_dir = install_dir
+        self._args = _sha1(json.dumps(build_args, sort_keys=True))
+        self._dirs, self._graph = load_packages(workspace)
+        self._packages: Dict[str, dict] = {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('version') == _CACHE_VERSION:
+                self._packages = data.get('packages', {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def candidates(self, packages: List[str], no_deps: bool) -> List[str]:
+        """Workspace packages colcon would build for this selection."""
+        if not packages:
+            return sorted(self._graph)
+        selected = {p for p in packages if p in self._graph}
+        return sorted(selected if no_deps else with_dependencies(self._graph, selected))
+
+    def _unchanged(self, name: str) -> bool:
+        entry = self._packages.get(name)
+        if not entry or entry.get('args') != self._args or name not in self._dirs:
+            return False
+        if not _installed(self._install_dir, name):
+            return False
+        tree = tree_digest(self._dirs[name], newer_than=entry.get('newest'))
+        return tree is not None and tree[0] == entry.get('tree')
+
+    def stale(self, candidates: Iterable[str]) -> List[str]:
+        """Candidates that need building: changed themselves or depending on one that does."""
+        candidates = list(candidates)
+        with ThreadPoolExecutor(max_workers=_WALK_WORKERS) as pool:
+            unchanged = dict(zip(candidates, pool.map(self._unchanged, candidates)))
+        stale: Set[str] = {name for name, ok in unchanged.items() if not ok}
+        for name in self._topological(candidates):
+            entry = self._packages.get(name, {})
+            recorded = entry.get('deps', {})
+            for dep in self._graph.get(name, ()):
+                current = self._packages.get(dep, {}).get('fingerprint')
+                if dep in stale or recorded.get(dep) != current:
+                    stale.add(name)
+                    break
+        return sorted(stale)
+
+    def _topological(self, names: Iterable[str]) -> List[str]:
+        """``names`` ordered so that dependencies come before their dependents."""
+        names = set(names)
+        order: List[str] = []
+        visited: Set[str] = set()
+
+        def visit(name):
+            if name in visited:
+                return
+            visited.add(name)
+            for dep in self._graph.get(name, ()):
+                if dep in names:
+                    visit(dep)
+            order.append(name)
+
+        for name in sorted(names):
+            visit(name)
+        return order
+
+    def update(self, built: Iterable[str], started: float) -> None:
+        """Record the fingerprints of packages built successfully in a build started at ``started``."""
+        built = [name for name in built if name in self._dirs]
+        with ThreadPoolExecutor(max_workers=_WALK_WORKERS) as pool:
+            trees = dict(zip(built, pool.map(
+                lambda name: tree_digest(self._dirs[name], newer_than=int(started * 1e9)), built)))
+        for name in self._topological(built):
+            tree = trees[name]
+            if tree is None:
+                # Edited while building: leave it stale for the next build.
+                self._packages.pop(name, None)
+                continue
+            deps = {dep: self._packages.get(dep, {}).get('fingerprint')
+                    for dep in sorted(self._graph.get(name, ()))}
+            self._packages[name] = {
+                'tree': tree[0],
+                'newest': tree[1],
+                'args': self._args,
+                'deps': deps,
+                'fingerprint': _sha1(json.dumps([tree[0], self._args, deps], sort_keys=True)),
+            }
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'version': _CACHE_VERSION, 'packages': self._packages}, f, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
@@ -0,0 +1,195 @@
+"""Branch, commit and remote of a git repository, read from its files.
+
+Spawning ``git`` for every repository of a large workspace dominates the
+time of listing them, so HEAD, refs, ``packed-refs`` and ``config`` are read
+directly.  A ``.git`` file (worktrees, submodules) is followed to the actual
+git directory, and a worktree's ``commondir`` to the shared one.  Where the
+files can't be trusted to give git's answer (config includes, ``insteadOf``
+URL rewriting, line continuations) callers fall back to running git.
+"""
+
+import functools
+import os
+import re
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+_SECTION_RE = re.compile(r'\s*\[\s*([-.\w]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\](.*)$')
+_KEY_RE = re.compile(r'\s*([A-Za-z][-A-Za-z0-9]*)\s*(?:=(.*))?$')
+_ESCAPES = {'n': '\n', 't': '\t', 'b': '\b', '"': '"', '\\': '\\'}
+
+
+def git_dirs(repo_dir: str) -> Optional[Tuple[str, str]]:
+    """(git directory, common git directory) of a working tree, or None if it has neither."""
+    dot_git = os.path.join(repo_dir, '.git')
+    if os.path.isdir(dot_git):
+        git_dir = dot_git
+    else:
+        try:
+            with open(dot_git) as f:
+                line = f.readline().strip()
+        except OSError:
+            return None
+        if not line.startswith('gitdir:'):
+            return None
+        git_dir = os.path.normpath(os.path.join(repo_dir, line[len('gitdir:'):].strip()))
+    try:
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except OSError:
+        common_dir = git_dir
+    return git_dir, common_dir
+
+
+def read_head(git_dir: str) -> Optional[str]:
+    """What HEAD points to: 'refs/heads/<branch>', or a commit id if detached."""
+    try:
+        with open(os.path.join(git_dir, 'HEAD')) as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    if head.startswith('ref:'):
+        return head[len('ref:'):].strip()
+    return head or None
+
+
+def resolve_ref(git_dir: str, common_dir: str, ref: str) -> Optional[str]:
+    """Commit id of a full ref name, from a loose ref file or ``packed-refs``."""
+    for directory in (git_dir, common_dir):
+        try:
+            with open(os.path.join(directory, ref)) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.startswith('ref:'):
+            return resolve_ref(git_dir, common_dir, value[len('ref:'):].strip())
+        return value or None
+    try:
+        with open(os.path.join(common_dir, 'packed-refs')) as f:
+            for line in f:
+                if line.startswith(('#', '^')):
+                    continue
+                commit, _, name = line.strip().partition(' ')
+                if name == ref:
+                    return commit
+    except OSError:
+        pass
+    return None
+
+
+def _config_value(raw: str) -> Optional[str]:
+    """Value of a config line after '=', or None if it continues on the next line."""
+    value = []
+    quoted = False
+    pending_space = ''
+    i = 0
+    while i < len(raw):
+        c = raw[i]
+        if c == '\\':
+            if i + 1 >= len(raw):
+                return None
+            value.append(pending_space + _ESCAPES.get(raw[i + 1], raw[i + 1]))
+            pending_space = ''
+            i += 2
+            continue
+        if c == '"':
+            quoted = not quoted
+        elif c in '#;' and not quoted:
+            break
+        elif c.isspace() and not quoted:
+            if value:
+                pending_space += c
+        else:
+            value.append(pending_space + c)
+            pending_space = ''
+        i += 1
+    return ''.join(value)
+
+
+def read_config(path: str) -> Optional[Dict[str, List[str]]]:
+    """Map 'section.subsection.key' to its values in a git config file.
+
+    Section and key names are lower-cased, subsections are kept as they are.
+    Returns None if the file includes others or rewrites URLs, as its values
+    alone don't tell what git would use then.
+    """
+    config: Dict[str, List[str]] = {}
+    section = None
+    try:
+        with open(path, errors='replace') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return {}
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped.startswith(('#', ';')):
+            continue
+        match = _SECTION_RE.match(line)
+        if match:
+            name, subsection, rest = match.groups()
+            name = name.lower()
+            if name in ('include', 'includeif'):
+                return None
+            section = name if subsection is None else f"{name}.{subsection}"
+            line = rest
+            if not line.strip() or line.strip().startswith(('#', ';')):
+                continue
+        match = _KEY_RE.match(line)
+        if section is None or not match:
+            continue
+        key = match.group(1).lower()
+        if key in ('insteadof', 'pushinsteadof'):
+            return None
+        value = 'true' if match.group(2) is None else _config_value(match.group(2))
+        if value is None:
+            return None
+        config.setdefault(f"{section}.{key}", []).append(value)
+    return config
+
+
+@functools.lru_cache(maxsize=None)
+def _global_config_ok() -> bool:
+    """Whether the system and user config leave remote URLs alone."""
+    home = os.path.expanduser('~')
+    xdg = os.environ.get('XDG_CONFIG_HOME') or os.path.join(home, '.config')
+    paths = ['/etc/gitconfig', os.path.join(xdg, 'git', 'config'), os.path.join(home, '.gitconfig')]
+    if os.environ.get('GIT_CONFIG_GLOBAL'):
+        paths.append(os.environ['GIT_CONFIG_GLOBAL'])
+    return all(read_config(path) is not None for path in paths)
+
+
+def repo_state(repo_dir: str) -> Optional[dict]:
+    """Git directories, HEAD and config of a repository, or None if git has to be asked."""
+    dirs = git_dirs(repo_dir)
+    if dirs is None or not _global_config_ok():
+        return None
+    git_dir, common_dir = dirs
+    head = read_head(git_dir)
+    config = read_config(os.path.join(common_dir, 'config'))
+    if head is None or config is None:
+        return None
+    return {'git_dir': git_dir, 'common_dir': common_dir, 'head': head, 'config': config}
+
+
+def describe_repo(repo_dir: str) -> Optional[Tuple[str, str]]:
+    """(origin URL, branch or detached commit) read from the repository's files, or None."""
+    state = repo_state(repo_dir)
+    if state is None:
+        return None
+    url = state['config'].get('remote.origin.url', [''])[-1]
+    head = state['head']
+    version = head[len('refs/heads/'):] if head.startswith('refs/heads/') else head
+    return url, version
+
+
+def describe_repo_with_git(repo_dir: str) -> Tuple[str, str]:
+    """(origin URL, branch or detached commit) as reported by git."""
+    def run(*args):
+        try:
+            result = subprocess.run(["git", "-C", repo_dir] + list(args), capture_output=True, text=True)
+        except OSError:
+            return ""
+        return result.stdout.strip() if result.returncode == 0 else ""
+
+    branch = run("symbolic-ref", "-q", "--short", "HEAD")
+    return run("remote", "get-url", "origin"), branch or run("rev-parse", "HEAD")
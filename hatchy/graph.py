@@ -0,0 +1,166 @@
+"""Package dependency graph of a workspace, read from its package index.
+
+Answers the package selections hatchy used to ask ``colcon list`` for
+(``--packages-select``, ``--packages-up-to``, ``--packages-above``, in
+topological order) without starting colcon.  Dependency conditions
+(REP 149) are evaluated against the environment, and every dependency tag
+counts, as colcon orders packages by all of them.  ``colcon list`` remains
+the fallback if the graph can't be ordered, and `check_against_colcon`
+compares the two.
+"""
+
+import heapq
+import os
+import subprocess
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .common import evaluate_condition
+from .package_index import load_package_index
+
+_COLCON_SELECTION_ARGS = {
+    'select': '--packages-select',
+    'up-to': '--packages-up-to',
+    'above': '--packages-above',
+}
+
+
+def _manifests(workspace: str) -> Dict[str, Tuple[str, Set[str]]]:
+    """Map each package in ``workspace/src`` to its directory and dependencies."""
+    env = dict(os.environ)
+    return {package['name']: (os.path.join(workspace, rel),
+                              {name for name, condition in package['deps']
+                               if evaluate_condition(condition, env)})
+            for rel, package in sorted(load_package_index(workspace).items())}
+
+
+def load_dependency_graph(workspace: str) -> Dict[str, Set[str]]:
+    """Map each package in ``workspace/src`` to its dependencies in the workspace.
+
+    Dependencies outside the workspace (system or underlay packages) are
+    dropped, since they don't affect build order.
+    """
+    return load_packages(workspace)[1]
+
+
+def load_packages(workspace: str) -> Tuple[Dict[str, str], Dict[str, Set[str]]]:
+    """Directory of each package in ``workspace/src``, and the dependency graph."""
+    manifests = _manifests(workspace)
+    dirs = {name: path for name, (path, _) in manifests.items()}
+    return dirs, {name: deps & manifests.keys() for name, (_, deps) in manifests.items()}
+
+
+def _dependents(graph: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    dependents: Dict[str, Set[str]] = {}
+    for name, deps in graph.items():
+        for dep in deps:
+            dependents.setdefault(dep, set()).add(name)
+    return dependents
+
+
+def with_dependents(graph: Dict[str, Set[str]], packages: Iterable[str]) -> Set[str]:
+    """``packages`` plus every package that depends on one of them, directly or not."""
+    dependents = _dependents(graph)
+    result = set(packages)
+    stack = list(result)
+    while stack:
+        for dependent in dependents.get(stack.pop(), ()):
+            if dependent not in result:
+                result.add(dependent)
+                stack.append(dependent)
+    return result
+
+
+def with_dependencies(graph: Dict[str, Set[str]], packages: Iterable[str]) -> Set[str]:
+    """``packages`` plus every workspace package they depend on, directly or not."""
+    result = set(packages)
+    stack = list(result)
+    while stack:
+        for dep in graph.get(stack.pop(), ()):
+            if dep not in result:
+                result.add(dep)
+                stack.append(dep)
+    return result
+
+
+def topological_order(graph: Dict[str, Set[str]], names: Iterable[str]) -> List[str]:
+    """``names`` with dependencies first, ties broken by name.
+
+    Raises ValueError if the packages depend on each other in a cycle.
+    """
+    names = set(names)
+    waiting = {name: len(graph.get(name, set()) & names) for name in names}
+    dependents = _dependents({name: graph.get(name, set()) & names for name in names})
+    ready = [name for name, count in waiting.items() if count == 0]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        name = heapq.heappop(ready)
+        order.append(name)
+        for dependent in dependents.get(name, ()):
+            waiting[dependent] -= 1
+            if waiting[dependent] == 0:
+                heapq.heappush(ready, dependent)
+    if len(order) < len(names):
+        raise ValueError(f"dependency cycle between {', '.join(sorted(names - set(order)))}")
+    return order
+
+
+def select_packages(graph: Dict[str, Set[str]], packages: Iterable[str], mode: str) -> Set[str]:
+    """Packages colcon would pick for ``--packages-<mode> packages``; unknown names are ignored."""
+    selected = {name for name in packages if name in graph}
+    if mode == 'up-to':
+        return with_dependencies(graph, selected)
+    if mode == 'above':
+        return with_dependents(graph, selected)
+    return selected
+
+
+def _colcon_list(workspace: str, packages: List[str], mode: str) -> Optional[List[str]]:
+    cmd = ["colcon", "list", "-n", "--topological-order"]
+    if packages:
+        cmd += [_COLCON_SELECTION_ARGS[mode]] + packages
+    try:
+        result = subprocess.run(cmd, cwd=workspace, capture_output=True, text=True)
+    except OSError:
+        return None
+    names = [line.strip() for line in result.stdout.splitlines()
+             if line.strip() and "not found" not in line.lower()]
+    return names or None
+
+
+def resolve_packages(workspace: str, packages: List[str], mode: str = 'up-to') -> Optional[List[str]]:
+    """Names of the packages colcon will process, in topological order, or None if there are none.
+
+    With no ``packages`` that is every package in the workspace.  Falls back
+    to ``colcon list`` if the workspace graph can't be ordered.
+    """
+    graph = load_dependency_graph(workspace)
+    selected = select_packages(graph, packages, mode) if packages else set(graph)
+    try:
+        names = topological_order(graph, selected)
+    except ValueError:
+        return _colcon_list(workspace, packages, mode)
+    return names or None
+
+
+def check_against_colcon(workspace: str) -> Optional[List[str]]:
+    """Differences between the workspace graph and ``colcon list``; None if colcon is unavailable.
+
+    Compares the packages found, and checks that colcon's topological order
+    puts every dependency of the graph before its dependents.
+    """
+    colcon_order = _colcon_list(workspace, [], 'select')
+    if colcon_order is None:
+        return None
+    graph = load_dependency_graph(workspace)
+    problems = []
+    for name in sorted(set(graph) - set(colcon_order)):
+        problems.append(f"{name}: found by hatchy but not by colcon")
+    for name in sorted(set(colcon_order) - set(graph)):
+        problems.append(f"{name}: found by colcon but not by hatchy")
+    position = {name: i for i, name in enumerate(colcon_order)}
+    for name, deps in sorted(graph.items()):
+        for dep in sorted(deps):
+            if name in position and dep in position and position[dep] > position[name]:
+                problems.append(f"{name}: depends on {dep}, which colcon orders after it")
+    return problems
@@ -0,0 +1,362 @@
+"""Per-package build and test history in ``.hatch/history.sqlite``.
+
+Every ``hatchy build``/``hatchy test`` run appends one ``runs`` row and one
+``packages`` row per package colcon finished: wall time, exit status, time
+spent in each phase (cmake, build, link, install, test), whether it wrote to
+stderr, plus the CMake configuration fingerprint and host of the run.
+Packages are indexed by ``(verb, name, started)`` so per-package queries
+read only that package's rows.  The same database keeps the steps of the
+packages' ninja logs and clang time trace summaries for ``hatchy build-report``.
+
+Recording is best effort: a locked or unwritable database never fails the
+build it describes.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import re
+import socket
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .common import parse_cmake_settings
+from .ninja_log import ninja_log_paths, read_ninja_log, step_kind
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    verb TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL,
+    returncode INTEGER,
+    host TEXT,
+    config_hash TEXT,
+    config TEXT,
+    predicted REAL
+);
+CREATE TABLE IF NOT EXISTS packages (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    verb TEXT NOT NULL,
+    name TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    ok INTEGER,
+    aborted INTEGER NOT NULL DEFAULT 0,
+    has_stderr INTEGER,
+    phases TEXT,
+    predicted REAL
+);
+CREATE TABLE IF NOT EXISTS ninja_logs (
+    path TEXT PRIMARY KEY,
+    inode INTEGER,
+    offset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ninja_steps (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER,
+    package TEXT NOT NULL,
+    output TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    start_ms INTEGER NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    ingested REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS time_traces (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    package TEXT NOT NULL,
+    source TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    frontend_us INTEGER NOT NULL,
+    backend_us INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS time_trace_entries (
+    trace_id INTEGER NOT NULL REFERENCES time_traces(id),
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    dur_us INTEGER NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_verb_started ON runs(verb, started);
+CREATE INDEX IF NOT EXISTS packages_name ON packages(verb, name, started);
+CREATE INDEX IF NOT EXISTS packages_started ON packages(verb, started);
+CREATE INDEX IF NOT EXISTS packages_run ON packages(run_id);
+CREATE INDEX IF NOT EXISTS ninja_steps_output ON ninja_steps(package, output, id);
+CREATE INDEX IF NOT EXISTS ninja_steps_ingested ON ninja_steps(ingested);
+CREATE INDEX IF NOT EXISTS time_trace_entries_trace ON time_trace_entries(trace_id);
+CREATE INDEX IF NOT EXISTS time_trace_entries_kind ON time_trace_entries(kind, name);
+"""
+
+# colcon-output's events.log: "[<relative secs>] (<job>) <EventType>: <dict>"
+_EVENT_LOG_RE = re.compile(r'^\[(\d+(?:\.\d+)?)\] \(([^)]*)\) (JobStarted|JobEnded|JobProgress|StderrLine): (.*)$')
+_EVENT_RC_RE = re.compile(r"'rc': (-?\d+)")
+
+# Columns added after the schema was first created: (table, column, type).
+_MIGRATIONS = (
+    ('runs', 'predicted', 'REAL'),
+    ('packages', 'predicted', 'REAL'),
+)
+
+# Most recent successful runs of a package used for its typical duration.
+RECENT_RUNS = 10
+# Ninja steps older than this are dropped when new ones are ingested.
+_NINJA_RETENTION_S = 90 * 86400
+
+
+def history_path(workspace: str) -> str:
+    return os.path.join(workspace, '.hatch', 'history.sqlite')
+
+
+def connect(workspace: str) -> sqlite3.Connection:
+    """Open the workspace history database, creating its schema if needed."""
+    conn = sqlite3.connect(history_path(workspace), timeout=5)
+    conn.executescript(_SCHEMA)
+    for table, column, kind in _MIGRATIONS:
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+    return conn
+
+
+def _package_names(conn: sqlite3.Connection, verb: str) -> List[str]:
+    """Names of the packages with history for ``verb``, one index seek each."""
+    names = []
+    name = ''
+    while True:
+        row = conn.execute("SELECT MIN(name) FROM packages WHERE verb = ? AND name > ?",
+                           (verb, name)).fetchone()
+        if row[0] is None:
+            return names
+        name = row[0]
+        names.append(name)
+
+
+def median_durations(conn: sqlite3.Connection, verb: str, since: float = 0.0,
+                     until: Optional[float] = None) -> Dict[str, Tuple[float, int]]:
+    """(median, runs) of each package's recent successful runs in a time window.
+
+    Only the newest `RECENT_RUNS` rows of each package are read, through the
+    ``packages_name`` index, so the cost doesn't grow with the history.
+    """
+    until = until if until is not None else time.time()
+    medians = {}
+    for name in _package_names(conn, verb):
+        runs = [duration for duration, in conn.execute(
+            "SELECT duration FROM packages WHERE verb = ? AND name = ? AND started >= ? "
+            "AND started < ? AND ok = 1 ORDER BY started DESC LIMIT ?",
+            (verb, name, since, until, RECENT_RUNS))]
+        if runs:
+            medians[name] = (percentile(runs, 50), len(runs))
+    return medians
+
+
+def typical_durations(workspace: str, verb: str) -> Dict[str, float]:
+    """Median recent duration of every package with history; empty without any."""
+    if not os.path.exists(history_path(workspace)):
+        return {}
+    try:
+        conn = connect(workspace)
+        try:
+            return {name: median for name, (median, _) in median_durations(conn, verb).items()}
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return {}
+
+
+def fastest_durations(workspace: str, verb: str) -> Dict[str, float]:
+    """Shortest successful run of every package with history, closest to a no-op run."""
+    if not os.path.exists(history_path(workspace)):
+        return {}
+    try:
+        conn = connect(workspace)
+        try:
+            return dict(conn.execute(
+                "SELECT name, MIN(duration) FROM packages WHERE verb = ? AND ok = 1 GROUP BY name", (verb,)))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return {}
+
+
+def config_fingerprint(colcon_build_args) -> Dict[str, str]:
+    """The CMake settings of a run, as shown by `print_workspace_state`."""
+    settings = parse_cmake_settings(colcon_build_args)
+    return {k: v for k, v in sorted(settings.items()) if v is not None}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Linearly interpolated percentile of ``values`` (0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * pct / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def parse_event_log(path: str, started: float) -> List[dict]:
+    """Package records from a colcon ``events.log``, for runs without the overlay.
+
+    Event times are relative to colcon's first event, which is anchored at
+    ``started`` (wall clock).
+    """
+    jobs: Dict[str, dict] = {}
+    try:
+        f = open(path, errors='replace')
+    except OSError:
+        return []
+    with f:
+        for line in f:
+            m = _EVENT_LOG_RE.match(line)
+            if not m:
+                continue
+            t, job, kind, data = float(m.group(1)), m.group(2), m.group(3), m.group(4)
+            if kind == 'JobStarted':
+                jobs[job] = {'name': job, 'started': started + t, 'phases': {}, 'spans': [],
+                             'phase': None, 'phase_start': t, 'has_stderr': False}
+                continue
+            rec = jobs.get(job)
+            if rec is None:
+                continue
+            if kind == 'StderrLine':
+                rec['has_stderr'] = True
+            elif kind == 'JobProgress':
+                try:
+                    phase = ast.literal_eval(data).get('progress')
+                except (ValueError, SyntaxError, AttributeError):
+                    continue
+                _close_phase(rec, t, started)
+                rec['phase'], rec['phase_start'] = phase, t
+            elif kind == 'JobEnded':
+                _close_phase(rec, t, started)
+                rc = _EVENT_RC_RE.search(data)
+                rec['duration'] = started + t - rec['started']
+                rec['ok'] = rc is not None and int(rc.group(1)) == 0
+                # A non-numeric rc is colcon's SIGINT marker.
+                rec['aborted'] = rc is None
+    records = []
+    for rec in jobs.values():
+        if 'duration' in rec:
+            rec.pop('phase')
+            rec.pop('phase_start')
+            records.append(rec)
+    return records
+
+
+def _close_phase(rec: dict, t: float, started: float) -> None:
+    if rec['phase']:
+        phases = rec['phases']
+        phases[rec['phase']] = phases.get(rec['phase'], 0.0) + t - rec['phase_start']
+        rec['spans'].append((rec['phase'], started + rec['phase_start'], started + t))
+
+
+def ingest_ninja_logs(conn: sqlite3.Connection, build_dir: str, run_id: Optional[int] = None) -> int:
+    """Append the steps ninja logged since the last call; returns how many.
+
+    Each log is read from the offset stored for it.  When ninja has
+    recompacted a log (new inode or shorter file) it is read from the start,
+    skipping entries identical to the latest step already stored for their
+    output.  Call inside a transaction.
+    """
+    now = time.time()
+    known = {path: (inode, offset) for path, inode, offset in
+             conn.execute("SELECT path, inode, offset FROM ninja_logs")}
+    count = 0
+    for package, path in sorted(ninja_log_paths(build_dir).items()):
+        try:
+            inode = os.stat(path).st_ino
+        except OSError:
+            continue
+        stored_inode, offset = known.get(path, (inode, 0))
+        if stored_inode != inode:
+            offset = 0
+        entries, new_offset = read_ninja_log(path, offset)
+        if new_offset < offset:
+            offset = 0
+        latest = {}
+        if path in known and offset == 0:
+            latest = {output: (start, duration) for output, start, duration in conn.execute(
+                "SELECT output, start_ms, duration_ms FROM ninja_steps WHERE id IN "
+                "(SELECT MAX(id) FROM ninja_steps WHERE package = ? GROUP BY output)", (package,))}
+        rows = [(run_id, package, e.output, step_kind(e.output), e.start_ms, e.end_ms - e.start_ms, now)
+                for e in entries
+                if latest.get(e.output) != (e.start_ms, e.end_ms - e.start_ms)]
+        conn.executemany(
+            "INSERT INTO ninja_steps (run_id, package, output, kind, start_ms, duration_ms, ingested) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("INSERT OR REPLACE INTO ninja_logs (path, inode, offset) VALUES (?, ?, ?)",
+                     (path, inode, new_offset))
+        count += len(rows)
+    if count:
+        conn.execute("DELETE FROM ninja_steps WHERE ingested < ?", (now - _NINJA_RETENTION_S,))
+    return count
+
+
+class RunRecorder:
+    """Collects the packages of one build/test run and writes them at the end."""
+
+    def __init__(self, workspace: str, verb: str, colcon_build_args):
+        self.workspace = workspace
+        self.verb = verb
+        self.started = time.time()
+        self.config = config_fingerprint(colcon_build_args)
+        # Predicted duration of the whole run, kept to measure ETA accuracy.
+        self.predicted: Optional[float] = None
+        self._packages: List[dict] = []
+
+    @property
+    def packages(self) -> List[dict]:
+        return self._packages
+
+    def add_packages(self, records: Iterable[dict]) -> None:
+        self._packages.extend(records)
+
+    def add_from_event_log(self, log_subdir: str) -> None:
+        path = os.path.join(self.workspace, 'log', log_subdir, 'events.log')
+        # An events.log older than this run belongs to a previous one.
+        try:
+            if os.path.getmtime(path) < self.started:
+                return
+        except OSError:
+            return
+        self.add_packages(parse_event_log(path, self.started))
+
+    def finish(self, returncode: int, build_dir: Optional[str] = None) -> Optional[int]:
+        """Write the run; returns its id, or None if it couldn't be recorded.
+
+        With ``build_dir`` the ninja steps of the run are ingested as well.
+        """
+        config = json.dumps(self.config, sort_keys=True)
+        config_hash = hashlib.sha1(config.encode()).hexdigest()[:12]
+        try:
+            conn = connect(self.workspace)
+            try:
+                with conn:
+                    cur = conn.execute(
+                        "INSERT INTO runs (verb, started, duration, returncode, host, config_hash, config, "
+                        "predicted) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (self.verb, self.started, time.time() - self.started, returncode,
+                         socket.gethostname(), config_hash, config, self.predicted))
+                    run_id = cur.lastrowid
+                    conn.executemany(
+                        "INSERT INTO packages (run_id, verb, name, started, duration, ok, aborted, "
+                        "has_stderr, phases, predicted) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(run_id, self.verb, p['name'], p['started'], p['duration'],
+                          None if p.get('ok') is None else int(p['ok']),
+                          int(bool(p.get('aborted'))),
+                          None if p.get('has_stderr') is None else int(p['has_stderr']),
+                          json.dumps({k: round(v, 3) for k, v in p.get('phases', {}).items()}),
+                          p.get('predicted'))
+                         for p in self._packages])
+                    if build_dir:
+                        ingest_ninja_logs(conn, build_dir, run_id)
+                return run_id
+            finally:
+                conn.close()
+        except (sqlite3.Error, OSError):
+            return None
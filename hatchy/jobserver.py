@@ -0,0 +1,236 @@
+"""GNU make jobserver owned by hatchy.
+
+hatchy creates a named-pipe jobserver and exports it through ``MAKEFLAGS``
+(``-jN --jobserver-auth=fifo:PATH``), so every make (>= 4.4) and ninja
+(>= 1.13) that colcon starts draws compile jobs from the same token pool.
+colcon-cmake leaves out its own ``-j``/``-l`` arguments when ``MAKEFLAGS``
+already sets a job count, which is what lets the pool take effect.
+
+Each client keeps one implicit job of its own, so a running package can
+always make progress; the pool bounds everything above that.  hatchy
+shrinks the pool by reading tokens out of the pipe and holding on to them,
+and grows it again by writing them back.
+
+`PressureMonitor` drives that from Linux PSI (``/proc/pressure``) and
+``MemAvailable`` for ``hatchy build --adaptive-jobs``.
+"""
+
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# First versions with fifo jobserver support (client side for ninja).
+_MIN_MAKE = (4, 4)
+_MIN_NINJA = (1, 13)
+
+# Memory budget per colcon worker when choosing --parallel-workers in
+# adaptive mode; link steps of large C++ packages easily need this much.
+_MEM_PER_WORKER = 2 << 30
+
+# PressureMonitor policy.  Percentages are PSI avg10 values.
+_TICK_S = 1.0
+_MEM_SOME_HIGH = 10.0
+_MEM_FULL_HIGH = 2.0
+_CPU_SOME_HIGH = 80.0
+_MEM_AVAIL_LOW = 0.10
+_MEM_AVAIL_OK = 0.20
+# Minimum time between two shrinks, and calm time required before growing.
+_SHRINK_EVERY_S = 2.0
+_GROW_AFTER_S = 10.0
+
+_VERSION_RE = re.compile(r'(\d+)\.(\d+)')
+
+
+def cpu_count() -> int:
+    """Number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _tool_version(tool: str) -> Optional[Tuple[int, int]]:
+    try:
+        result = subprocess.run([tool, '--version'], capture_output=True, text=True)
+    except OSError:
+        return None
+    m = _VERSION_RE.search(result.stdout)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
+def jobserver_unsupported_reason(env: Dict[str, str]) -> Optional[str]:
+    """Why a fifo jobserver can't be used for this build, or None if it can."""
+    if 'MAKEFLAGS' in env:
+        return "MAKEFLAGS is already set"
+    make = _tool_version('make')
+    if make is not None and make < _MIN_MAKE:
+        # Older make aborts on a fifo --jobserver-auth rather than ignoring it.
+        return f"make {make[0]}.{make[1]} predates fifo jobservers (needs 4.4)"
+    ninja = _tool_version('ninja')
+    if ninja is not None and ninja < _MIN_NINJA:
+        # colcon-cmake drops -j/-l once MAKEFLAGS sets a job count, so an old
+        # ninja would fall back to its own unbounded default.
+        return f"ninja {ninja[0]}.{ninja[1]} has no jobserver client (needs 1.13)"
+    return None
+
+
+def read_meminfo() -> Dict[str, int]:
+    """``/proc/meminfo`` values in bytes."""
+    info = {}
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                fields = rest.split()
+                if fields:
+                    info[key] = int(fields[0]) * 1024
+    except (OSError, ValueError):
+        pass
+    return info
+
+
+def read_pressure(resource: str) -> Dict[str, float]:
+    """``avg10`` of the ``some``/``full`` lines of ``/proc/pressure/<resource>``."""
+    values = {}
+    try:
+        with open(f'/proc/pressure/{resource}') as f:
+            for line in f:
+                kind, _, rest = line.partition(' ')
+                for field in rest.split():
+                    if field.startswith('avg10='):
+                        values[kind] = float(field[6:])
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+def initial_workers() -> int:
+    """colcon worker count for adaptive mode: CPUs, capped by available memory."""
+    available = read_meminfo().get('MemAvailable')
+    workers = cpu_count()
+    if available:
+        workers = min(workers, max(1, available // _MEM_PER_WORKER))
+    return workers
+
+
+class Jobserver:
+    """A fifo jobserver with ``jobs`` slots whose limit can be lowered at runtime."""
+
+    def __init__(self, jobs: int):
+        self.jobs = max(1, jobs)
+        self.limit = self.jobs
+        self.reason: Optional[str] = None
+        self._held = 0
+        self._dir = tempfile.mkdtemp(prefix='hatchy-jobserver-')
+        self.path = os.path.join(self._dir, 'fifo')
+        os.mkfifo(self.path, 0o600)
+        # Holding a read-write descriptor keeps the fifo open between clients
+        # and lets us take tokens back without blocking.
+        self._fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+        # The client that starts a job holds one implicit slot.
+        os.write(self._fd, b'+' * (self.jobs - 1))
+
+    def env(self, env: Dict[str, str]) -> Dict[str, str]:
+        """``env`` with ``MAKEFLAGS`` pointing make/ninja at this jobserver."""
+        return {**env, 'MAKEFLAGS': f'-j{self.jobs} --jobserver-auth=fifo:{self.path}'}
+
+    def set_limit(self, limit: int, reason: Optional[str]) -> None:
+        self.limit = max(1, min(self.jobs, limit))
+        self.reason = reason
+        self.rebalance()
+
+    def rebalance(self) -> None:
+        """Take or return tokens until the pool matches the limit.
+
+        Tokens that clients are using can only be taken once they are
+        returned, so shrinking may need several calls.
+        """
+        want = self.jobs - self.limit
+        if self._held < want:
+            try:
+                self._held += len(os.read(self._fd, want - self._held))
+            except BlockingIOError:
+                pass
+        elif self._held > want:
+            self._held -= os.write(self._fd, b'+' * (self._held - want))
+
+    def status(self) -> str:
+        """Short 'jobs 6/16 (memory pressure 24%)' string for the overlay."""
+        text = f"jobs {self.limit}/{self.jobs}"
+        return f"{text} ({self.reason})" if self.reason else text
+
+    def close(self) -> None:
+        if self._fd != -1:
+            os.close(self._fd)
+            self._fd = -1
+        try:
+            os.unlink(self.path)
+            os.rmdir(self._dir)
+        except OSError:
+            pass
+
+
+class PressureMonitor:
+    """Background thread resizing a `Jobserver` from memory and CPU pressure."""
+
+    def __init__(self, jobserver: Jobserver):
+        self._jobserver = jobserver
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='hatchy-pressure', daemon=True)
+        self._last_shrink = 0.0
+        self._calm_since: Optional[float] = None
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(_TICK_S):
+            self.tick(time.monotonic())
+
+    def _pressure_reason(self) -> Optional[str]:
+        mem = read_pressure('memory')
+        if mem.get('full', 0.0) >= _MEM_FULL_HIGH or mem.get('some', 0.0) >= _MEM_SOME_HIGH:
+            return f"memory pressure {mem.get('some', 0.0):.0f}%"
+        info = read_meminfo()
+        total, available = info.get('MemTotal'), info.get('MemAvailable')
+        if total and available is not None and available < total * _MEM_AVAIL_LOW:
+            return f"low memory {available / (1 << 30):.1f}G free"
+        cpu = read_pressure('cpu')
+        if cpu.get('some', 0.0) >= _CPU_SOME_HIGH:
+            return f"cpu pressure {cpu['some']:.0f}%"
+        return None
+
+    def _calm(self) -> bool:
+        mem = read_pressure('memory')
+        info = read_meminfo()
+        total, available = info.get('MemTotal'), info.get('MemAvailable')
+        return (mem.get('some', 0.0) < _MEM_SOME_HIGH / 4
+                and (not total or available is None or available >= total * _MEM_AVAIL_OK))
+
+    def tick(self, now: float) -> None:
+        js = self._jobserver
+        reason = self._pressure_reason()
+        if reason is not None:
+            self._calm_since = None
+            if now - self._last_shrink >= _SHRINK_EVERY_S and js.limit > 1:
+                # Memory trouble backs off hard; CPU contention one job at a time.
+                step = 1 if reason.startswith('cpu') else max(1, js.limit // 4)
+                js.set_limit(js.limit - step, reason)
+                self._last_shrink = now
+        elif js.limit < js.jobs and self._calm():
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - self._calm_since >= _GROW_AFTER_S:
+                js.set_limit(js.limit + 1, "pressure eased" if js.limit + 1 < js.jobs else None)
+                self._calm_since = now
+        else:
+            self._calm_since = None
+        js.rebalance()
@@ -1,8 +1,13 @@
 import os
-import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from .common import get_workspace_dir, parse_package_name, clr, _CYAN, _DIM, _BRIGHT_MAGENTA
+from .common import get_workspace_dir, clr, _strip_ansi, _CYAN, _DIM, _GREEN, _RED, _YELLOW, _BRIGHT_MAGENTA
+from .git_info import describe_repo, describe_repo_with_git
+from .graph import check_against_colcon
+from .package_index import load_package_index
+from .repo_status import repo_statuses
 
 
 def register(subparsers):
@@ -13,11 +18,19 @@ def register(subparsers):
     packages_parser = list_subparsers.add_parser("packages", help="List packages in workspace.")
     packages_parser.add_argument("--workspace", "-w", default=".",
                                  help="The path to the colcon workspace (default: \".\")")
+    packages_parser.add_argument("--check", action="store_true",
+                                 help="Compare hatchy's package graph with 'colcon list'.")
     packages_parser.set_defaults(func=list_packages_command)
 
     repos_parser = list_subparsers.add_parser("repos", help="List repos in workspace.")
     repos_parser.add_argument("--workspace", "-w", default=".",
                               help="The path to the colcon workspace (default: \".\")")
+    output = repos_parser.add_mutually_exclusive_group()
+    output.add_argument("--format", choices=["table", "yaml"], default="table",
+                        help="Print a table (default) or a vcstool .repos file.")
+    output.add_argument("--status", action="store_true",
+                        help="Show local changes, ahead/behind counts, stashes and last commit age "
+                             "of git repos.")
     repos_parser.set_defaults(func=list_repos_command)
 
 
@@ -27,56 +40,71 @@ _VCS_MARKERS = {
     ".svn": "svn",
     ".bzr": "bzr",
 }
+# Concurrent git processes for repos whose files can't be read directly.
+_GIT_WORKERS = 8
 
 
 def find_packages(src_dir):
-    """Walk src_dir and return a sorted list of (name, rel_path) for each package.xml found."""
+    """Return a sorted list of (name, rel_path) for each package under src_dir, from the package index."""
     workspace = os.path.dirname(src_dir)
-    packages = []
-    for dirpath, dirnames, filenames in os.walk(src_dir):
-        if "package.xml" in filenames:
-            name = parse_package_name(os.path.join(dirpath, "package.xml"))
-            if name:
-                rel = os.path.relpath(dirpath, workspace)
-                packages.append((name, rel))
+    packages = [(p["name"], rel) for rel, p in load_package_index(workspace).items()]
     return sorted(packages, key=lambda p: p[0])
 
 
 def find_repos(src_dir):
-    """Walk src_dir and return a sorted list of repo dicts, not descending into nested repos."""
+    """Return a sorted list of repo dicts under src_dir, from the workspace daemon if one is running."""
+    from .daemon import query
+    repos = query(os.path.dirname(src_dir), 'repos')
+    if repos is not None:
+        return repos
+    return scan_repos(src_dir)
+
+
+def _find_vcs_dirs(src_dir):
+    """Yield (directory, vcs type) of each repo under src_dir, not descending into nested repos."""
+    try:
+        entries = list(os.scandir(src_dir))
+    except PermissionError:
+        return
+    subdirs = []
+    vcs_type = None
+    for entry in entries:
+        if entry.name in _VCS_MARKERS and (entry.is_dir(follow_symlinks=False)
+                                           or entry.name == ".git" and entry.is_file()):
+            # A .git file points to the git directory of a worktree or submodule.
+            vcs_type = _VCS_MARKERS[entry.name]
+        elif entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry.path)
+    if vcs_type:
+        yield src_dir, vcs_type
+    else:
+        for subdir in subdirs:
+            yield from _find_vcs_dirs(subdir)
+
+
+def iter_repos(src_dir):
+    """Yield repo dicts under src_dir sorted by path, each as soon as it and those before it are known.
+
+    Git repos are described from their files; those that need git itself
+    are queried in a thread pool while the others are yielded.
+    """
     workspace = os.path.dirname(src_dir)
-    repos = []
-
-    def _walk(directory):
-        try:
-            entries = list(os.scandir(directory))
-        except PermissionError:
-            return
-        subdirs = []
-        vcs_type = None
-        for entry in entries:
-            if entry.is_dir(follow_symlinks=False) and entry.name in _VCS_MARKERS:
-                vcs_type = _VCS_MARKERS[entry.name]
-            elif entry.is_dir(follow_symlinks=False):
-                subdirs.append(entry.path)
-        if vcs_type:
-            info = {"path": os.path.relpath(directory, workspace), "type": vcs_type}
+    found = sorted(_find_vcs_dirs(src_dir))
+    described = {directory: describe_repo(directory) for directory, vcs_type in found if vcs_type == "git"}
+    with ThreadPoolExecutor(max_workers=_GIT_WORKERS) as pool:
+        pending = {directory: pool.submit(describe_repo_with_git, directory)
+                   for directory, info in described.items() if info is None}
+        for directory, vcs_type in found:
+            repo = {"path": os.path.relpath(directory, workspace), "type": vcs_type}
             if vcs_type == "git":
-                url = subprocess.run(
-                    ["git", "-C", directory, "remote", "get-url", "origin"],
-                    capture_output=True, text=True).stdout.strip()
-                branch = subprocess.run(
-                    ["git", "-C", directory, "rev-parse", "--abbrev-ref", "HEAD"],
-                    capture_output=True, text=True).stdout.strip()
-                info["url"] = url or ""
-                info["version"] = branch or ""
-            repos.append(info)
-        else:
-            for subdir in subdirs:
-                _walk(subdir)
-
-    _walk(src_dir)
-    return sorted(repos, key=lambda r: r["path"])
+                info = described[directory] or pending[directory].result()
+                repo["url"], repo["version"] = info
+            yield repo
+
+
+def scan_repos(src_dir):
+    """Return a sorted list of repo dicts under src_dir."""
+    return list(iter_repos(src_dir))
 
 
 def _resolve_workspace(args):
@@ -96,31 +124,123 @@ def _col(label, width):
     return clr(label, _CYAN) + ' ' * (width - len(label))
 
 
+def _check_packages(workspace):
+    problems = check_against_colcon(workspace)
+    if problems is None:
+        print("Error: 'colcon list' failed; is colcon installed and the workspace sourced?")
+        sys.exit(1)
+    if not problems:
+        print(clr("Package graph matches 'colcon list'.", _GREEN))
+        return
+    for problem in problems:
+        print(clr(problem, _YELLOW))
+    sys.exit(1)
+
+
 def list_packages_command(args):
     workspace, src_dir = _resolve_workspace(args)
-    packages = find_packages(src_dir)
+    if args.check:
+        _check_packages(workspace)
+        return
+    index = load_package_index(workspace)
+    packages = sorted((p["name"], p["build_type"], rel) for rel, p in index.items())
     if not packages:
         print("No packages found.")
         return
 
-    name_w = max(max(len(name) for name, _ in packages), len("name"))
-    path_w = max(max(len(p) for _, p in packages), len("path"))
-    sep = clr("-" * (name_w + 2 + path_w), _BRIGHT_MAGENTA)
+    name_w = max(max(len(name) for name, _, _ in packages), len("name"))
+    type_w = max(max(len(build_type) for _, build_type, _ in packages), len("type"))
+    path_w = max(max(len(p) for _, _, p in packages), len("path"))
+    sep = clr("-" * (name_w + 2 + type_w + 2 + path_w), _BRIGHT_MAGENTA)
 
     print(sep)
-    print(f"{_col('name', name_w)}  {clr('path', _CYAN)}")
+    print(f"{_col('name', name_w)}  {_col('type', type_w)}  {clr('path', _CYAN)}")
     print(sep)
-    for name, rel_path in packages:
-        print(f"{name:<{name_w}}  {clr(rel_path, _DIM)}")
+    for name, build_type, rel_path in packages:
+        print(f"{name:<{name_w}}  {build_type:<{type_w}}  {clr(rel_path, _DIM)}")
+    print(sep)
+
+
+def _print_repos_file(repos, src_dir):
+    """Print repos in vcstool's .repos format, paths relative to src_dir, as they arrive."""
+    import yaml
+    workspace = os.path.dirname(src_dir)
+    print("repositories:", flush=True)
+    for repo in repos:
+        path = os.path.relpath(os.path.join(workspace, repo["path"]), src_dir)
+        entry = {"type": repo["type"]}
+        if repo.get("url"):
+            entry["url"] = repo["url"]
+        if repo.get("version"):
+            entry["version"] = repo["version"]
+        text = yaml.safe_dump({path: entry}, default_flow_style=False, sort_keys=False)
+        print("".join("  " + line for line in text.splitlines(True)), end="", flush=True)
+
+
+def _fmt_age(secs):
+    if secs < 3600:
+        return f"{max(int(secs // 60), 0)}min ago"
+    if secs < 86400:
+        return f"{int(secs // 3600)}h ago"
+    return f"{int(secs // 86400)}d ago"
+
+
+def _status_row(repo, status, now):
+    """Colored (branch, changes, upstream, stash, last commit) cells of a repo."""
+    if repo["type"] != "git":
+        return [""] * 5
+    if status is None:
+        return [clr("git status failed", _RED)] + [""] * 4
+    if status["head"] == "(detached)":
+        branch = clr(f"detached at {(status['oid'] or '')[:8]}", _YELLOW)
+    else:
+        branch = status["head"] or ""
+    counts = [(status["staged"], "staged"), (status["modified"], "modified"),
+              (status["conflicts"], "conflicted")]
+    changes = ", ".join(f"{n} {label}" for n, label in counts if n)
+    changes = clr(changes, _RED if status["conflicts"] else _YELLOW) if changes else clr("clean", _DIM)
+    if not status["upstream"]:
+        upstream = clr("no upstream", _DIM)
+    elif status["ahead"] is None:
+        upstream = ""
+    elif status["ahead"] or status["behind"]:
+        upstream = clr(f"+{status['ahead']} -{status['behind']}", _YELLOW)
+    else:
+        upstream = clr("up to date", _DIM)
+    stash = str(status["stash"]) if status["stash"] else ""
+    committed = _fmt_age(now - status["committed"]) if status["committed"] else ""
+    return [branch, changes, upstream, stash, clr(committed, _DIM)]
+
+
+def _print_repo_status(workspace, repos):
+    statuses = repo_statuses(workspace, [r["path"] for r in repos if r["type"] == "git"])
+    now = time.time()
+    rows = [[clr(r["path"], _CYAN)] + _status_row(r, statuses.get(r["path"]), now) for r in repos]
+    headers = ["path", "branch", "changes", "upstream", "stash", "last commit"]
+    widths = [max(len(_strip_ansi(row[i])) for row in rows + [headers]) for i in range(len(headers))]
+    sep = clr("-" * (sum(widths) + 2 * (len(widths) - 1)), _BRIGHT_MAGENTA)
+
+    print(sep)
+    print("  ".join(_col(h, w) for h, w in zip(headers, widths)).rstrip())
+    print(sep)
+    for row in rows:
+        print("  ".join(cell + " " * (w - len(_strip_ansi(cell))) for cell, w in zip(row, widths)).rstrip())
     print(sep)
 
 
 def list_repos_command(args):
     workspace, src_dir = _resolve_workspace(args)
+    if args.format == "yaml":
+        from .daemon import query
+        _print_repos_file(query(workspace, 'repos') or iter_repos(src_dir), src_dir)
+        return
     repos = find_repos(src_dir)
     if not repos:
         print("No repositories found.")
         return
+    if args.status:
+        _print_repo_status(workspace, repos)
+        return
 
     path_w = max(max(len(r["path"]) for r in repos), len("path"))
     type_w = max(max(len(r["type"]) for r in repos), len("type"))
@@ -1,10 +1,24 @@
 import argparse
-import importlib.metadata
+import importlib
 import sys
-from datetime import date
 
 from .common import get_colcon_build_args
-from . import build, clean, completion, config, init, list as list_cmd, test
+
+# Verb -> (module, help).  A verb's module is only imported when it is run,
+# so that e.g. shell completion doesn't pay for importing the build machinery.
+_VERBS = {
+    'build': ('build', "Builds a colcon workspace."),
+    'build-report': ('build_report', "Shows compile and link costs from the ninja logs of a workspace."),
+    'clean': ('clean', "Deletes various products of the build verb."),
+    'completion': ('completion', "Print the bash completion script to stdout."),
+    'config': ('config', "Configures a colcon workspace's context."),
+    'daemon': ('daemon', "Keeps workspace state in memory to speed up other verbs."),
+    'init': ('init', "Initializes a given folder as a colcon workspace."),
+    'list': ('list', "Lists colcon packages in the workspace or other arbitrary folders."),
+    'stats': ('stats', "Shows build and test timing history for a workspace."),
+    'test': ('test', "Tests a colcon workspace."),
+    '_complete': ('completion', None),
+}
 
 
 class CustomArgumentParser(argparse.ArgumentParser):
@@ -23,6 +37,13 @@ class CustomArgumentParser(argparse.ArgumentParser):
         return "\n".join(formatted_lines) + "\n"
 
 
+def _add_verb_stubs(subparsers):
+    """Add placeholder parsers for every verb, enough for the top-level help."""
+    for verb, (_, help_text) in _VERBS.items():
+        if help_text is not None:
+            subparsers.add_parser(verb, help=help_text)
+
+
 def main():
     parser = CustomArgumentParser(
         prog="hatchy",
@@ -36,14 +57,6 @@ def main():
         description="Call `hatchy VERB -h` for help on each verb listed below:",
         metavar="")
 
-    build.register(subparsers)
-    clean.register(subparsers)
-    completion.register(subparsers)
-    config.register(subparsers)
-    init.register(subparsers)
-    list_cmd.register(subparsers)
-    test.register(subparsers)
-
     sysargs = sys.argv[1:]
     pre_verb_args = []
     verb = None
@@ -54,9 +67,12 @@ def main():
             post_verb_args = sysargs[index + 1:]
             break
         if arg in ['-h', '--help', '--version']:
+            _add_verb_stubs(subparsers)
             args = parser.parse_args(sysargs)
             if args.version:
-                version = importlib.metadata.version('hatchy')
+                from datetime import date
+                from importlib import metadata
+                version = metadata.version('hatchy')
                 year = date.today().year
                 if year > 2025:
                     year = f'2025-{year}'
@@ -69,12 +85,16 @@ def main():
         pre_verb_args.append(arg)
 
     if verb is None:
+        _add_verb_stubs(subparsers)
         parser.print_help()
         sys.exit("Error: No verb provided.")
-    elif verb not in ['build', 'clean', 'completion', 'config', 'init', 'list', 'test']:
+    elif verb not in _VERBS:
+        _add_verb_stubs(subparsers)
         parser.print_help()
         sys.exit("Error: Unknown verb '{0}' provided.".format(verb))
 
+    importlib.import_module('.' + _VERBS[verb][0], __package__).register(subparsers)
+
     post_verb_args, colcon_build_args = get_colcon_build_args(verb, post_verb_args)
     processed_args = pre_verb_args + [verb] + post_verb_args
 
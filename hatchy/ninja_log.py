@@ -0,0 +1,106 @@
+"""Reader for ninja's ``.ninja_log`` build logs.
+
+Each line after the ``# ninja log vN`` header records one output that ninja
+built: start and end in milliseconds since that ninja invocation started,
+the output's mtime, its path and a command hash.  ninja only ever appends
+to the log (except when it recompacts it at the start of a build), so
+readers remember the byte offset they stopped at and parse just the new
+tail on the next call.
+"""
+
+import os
+from collections import namedtuple
+from typing import Dict, List, Tuple
+
+NinjaEntry = namedtuple('NinjaEntry', 'start_ms end_ms output')
+
+_HEADER_PREFIX = b'# ninja log v'
+# Outputs of a single compiler invocation (objects, precompiled headers).
+_COMPILE_SUFFIXES = ('.o', '.obj', '.gch', '.pch', '.ii', '.i')
+
+
+def read_ninja_log(path: str, offset: int = 0) -> Tuple[List[NinjaEntry], int]:
+    """Parse entries of ``path`` from byte ``offset``; returns (entries, new offset).
+
+    If the file is now shorter than ``offset`` ninja has recompacted it and
+    it is read again from the start.  A trailing partial line is left for
+    the next call.
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if offset > size:
+                offset = 0
+            f.seek(offset)
+            data = f.read()
+    except OSError:
+        return [], offset
+    end = data.rfind(b'\n') + 1
+    entries = []
+    for line in data[:end].splitlines():
+        if not line or line.startswith(_HEADER_PREFIX):
+            continue
+        fields = line.split(b'\t')
+        if len(fields) < 4:
+            continue
+        try:
+            entries.append(NinjaEntry(int(fields[0]), int(fields[1]),
+                                      fields[3].decode('utf-8', 'replace')))
+        except ValueError:
+            continue
+    return entries, offset + end
+
+
+def ninja_log_paths(build_dir: str) -> Dict[str, str]:
+    """Map each package in a build space to its ``.ninja_log``, if it has one."""
+    paths = {}
+    try:
+        entries = list(os.scandir(build_dir))
+    except OSError:
+        return paths
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            log = os.path.join(entry.path, '.ninja_log')
+            if os.path.isfile(log):
+                paths[entry.name] = log
+    return paths
+
+
+def snapshot_offsets(build_dir: str) -> Dict[str, int]:
+    """Current size of every package's ``.ninja_log``, taken before a build."""
+    offsets = {}
+    for pkg, log in ninja_log_paths(build_dir).items():
+        try:
+            offsets[pkg] = os.path.getsize(log)
+        except OSError:
+            pass
+    return offsets
+
+
+def is_link_step(output: str) -> bool:
+    """True for outputs that are linked (executables and libraries) rather than compiled."""
+    name = os.path.basename(output)
+    if name.endswith(_COMPILE_SUFFIXES):
+        return False
+    return (name.endswith(('.so', '.a', '.dylib')) or '.so.' in name
+            or '.' not in name)
+
+
+def step_kind(output: str) -> str:
+    """'compile', 'link' or 'other' (code generation and custom commands)."""
+    if os.path.basename(output).endswith(_COMPILE_SUFFIXES):
+        return 'compile'
+    return 'link' if is_link_step(output) else 'other'
+
+
+def source_path(output: str) -> str:
+    """Source-relative path of a compiled object, e.g. ``src/foo.cpp`` for
+    ``CMakeFiles/foo.dir/src/foo.cpp.o``; other outputs are returned as is."""
+    parts = output.split('/')
+    for i in range(len(parts) - 1):
+        if parts[i] == 'CMakeFiles' and parts[i + 1].endswith('.dir'):
+            # CMake spells ".." as "__" in object paths.
+            rest = ['..' if p == '__' else p for p in parts[i + 2:]]
+            path = '/'.join(parts[:i] + rest)
+            return os.path.splitext(path)[0] if path.endswith(_COMPILE_SUFFIXES) else path
+    return output
@@ -0,0 +1,142 @@
+"""Persistent index of the packages in a workspace's ``src``.
+
+``.hatch/package_index.json`` records every directory under ``src`` down to
+the packages with its mtime and subdirectories, and every package with its
+name, dependencies (with their REP 149 conditions), build type and
+package.xml mtime.  Directories holding a COLCON_IGNORE, AMENT_IGNORE or
+CATKIN_IGNORE marker are skipped, as colcon does.  Loading the index
+stats each recorded directory and manifest: a directory whose mtime is
+unchanged is not listed again, and a manifest whose mtime is unchanged is
+not parsed again, so only the subtrees that changed are rescanned.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from .common import parse_package_manifest
+
+_INDEX_VERSION = 2
+# Marker files that make colcon skip a directory and everything below it.
+_IGNORE_MARKERS = ('COLCON_IGNORE', 'AMENT_IGNORE', 'CATKIN_IGNORE')
+
+
+def index_path(workspace: str) -> str:
+    return os.path.join(workspace, '.hatch', 'package_index.json')
+
+
+def _read_index(workspace: str) -> Tuple[dict, dict]:
+    try:
+        with open(index_path(workspace)) as f:
+            data = json.load(f)
+        if data.get('version') == _INDEX_VERSION:
+            return data['dirs'], data['packages']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    return {}, {}
+
+
+def _list_dir(path: str) -> Optional[List[str]]:
+    """Subdirectories to descend into, or None if ``path`` is a package."""
+    children = []
+    is_package = False
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name in _IGNORE_MARKERS:
+                    return []
+                if entry.name == 'package.xml' and entry.is_file():
+                    is_package = True
+                elif entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                    children.append(entry.name)
+    except OSError:
+        return []
+    return None if is_package else sorted(children)
+
+
+def load_package_index(workspace: str) -> Dict[str, dict]:
+    """Map each package directory (relative to the workspace) to its name, deps and build type.
+
+    ``deps`` are [name, condition] pairs.  Asks the workspace daemon if one
+    is running; otherwise the index is brought up to date first, rescanning
+    only what changed.
+    """
+    from .daemon import query
+    packages = query(workspace, 'packages')
+    if packages is not None:
+        return packages
+    return scan_package_index(workspace)[1]
+
+
+def scan_package_index(workspace: str) -> Tuple[Dict[str, list], Dict[str, dict]]:
+    """Bring the index up to date; returns its directories and packages."""
+    old_dirs, old_packages = _read_index(workspace)
+    dirs: Dict[str, list] = {}
+    packages: Dict[str, dict] = {}
+    changed = False
+    stack = ['src']
+    while stack:
+        rel = stack.pop()
+        path = os.path.join(workspace, rel)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        old = old_dirs.get(rel)
+        if old is not None and old[0] == mtime:
+            children = old[1]
+        else:
+            children = _list_dir(path)
+            changed = True
+        dirs[rel] = [mtime, children]
+        if children is not None:
+            stack.extend(os.path.join(rel, child) for child in children)
+            continue
+
+        manifest = os.path.join(path, 'package.xml')
+        try:
+            manifest_mtime = os.stat(manifest).st_mtime_ns
+        except OSError:
+            continue
+        package = old_packages.get(rel)
+        if package is None or package['mtime'] != manifest_mtime:
+            changed = True
+            parsed = parse_package_manifest(manifest)
+            if parsed is None:
+                continue
+            name, deps, build_type = parsed
+            package = {'name': name, 'deps': sorted(list(dep) for dep in deps), 'build_type': build_type,
+                       'mtime': manifest_mtime}
+        packages[rel] = package
+
+    if changed or dirs.keys() != old_dirs.keys():
+        _write_index(workspace, dirs, packages)
+    return dirs, packages
+
+
+def _write_index(workspace: str, dirs: dict, packages: dict) -> None:
+    path = index_path(workspace)
+    if not os.path.isdir(os.path.dirname(path)):
+        return
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w') as f:
+            json.dump({'version': _INDEX_VERSION, 'dirs': dirs, 'packages': packages}, f,
+                      separators=(',', ':'))
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def package_containing(workspace: str, path: str) -> Optional[str]:
+    """Name of the package whose directory contains ``path``, if any."""
+    rel = os.path.relpath(os.path.abspath(path), workspace)
+    packages = load_package_index(workspace)
+    while rel and rel != os.curdir and not rel.startswith(os.pardir):
+        if rel in packages:
+            return packages[rel]['name']
+        rel = os.path.dirname(rel)
+    return None
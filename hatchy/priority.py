@@ -0,0 +1,169 @@
+"""CPU and I/O priority for the colcon process tree.
+
+Colcon is started as the leader of its own session with the configured
+niceness (and I/O class) already applied, so every compiler and test process
+it spawns inherits them.  `PriorityManager.enforce` re-applies the niceness
+with ``os.setpriority`` to any process in that session that changed its own,
+found by scanning ``/proc`` rather than spawning ``renice``/``pgrep``.
+"""
+
+import contextlib
+import ctypes
+import os
+import platform
+import signal
+import subprocess
+from typing import Iterator, Optional
+
+IO_CLASSES = ['best-effort', 'idle', 'Default']
+
+# ioprio_set(2) constants from linux/ioprio.h.
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_CLASSES = {'best-effort': 2, 'idle': 3}
+# Lowest best-effort priority level; idle ignores the level.
+_IOPRIO_BE_LOWEST = 7
+_SYS_IOPRIO_SET = {
+    'x86_64': 251,
+    'i386': 289, 'i686': 289,
+    'aarch64': 30,
+    'armv7l': 314, 'armv6l': 314,
+    'ppc64le': 273,
+    'riscv64': 30,
+}
+
+# Minimum interval between /proc scans re-applying the niceness.
+ENFORCE_INTERVAL_S = 1.0
+
+
+def ioprio_set(pid: int, io_class: str) -> bool:
+    """Set the I/O scheduling class of ``pid`` (0 = caller).  False on failure."""
+    nr = _SYS_IOPRIO_SET.get(platform.machine())
+    klass = _IOPRIO_CLASSES.get(io_class)
+    if nr is None or klass is None:
+        return False
+    level = _IOPRIO_BE_LOWEST if io_class == 'best-effort' else 0
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.syscall(nr, _IOPRIO_WHO_PROCESS, pid,
+                            (klass << _IOPRIO_CLASS_SHIFT) | level) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def _session_pids(sid: int) -> Iterator[int]:
+    """Yield the pids of all processes whose session id is ``sid``."""
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name (field 2) may contain spaces and parentheses, so
+        # split after its closing paren: state ppid pgrp session ...
+        fields = stat[stat.rfind(b')') + 2:].split()
+        if len(fields) > 3 and int(fields[3]) == sid:
+            yield int(entry)
+
+
+class PriorityManager:
+    """Owns the niceness and I/O class of a colcon session."""
+
+    def __init__(self, nice: int = 0, io_class: Optional[str] = None):
+        self.nice = nice
+        self.io_class = io_class if io_class in _IOPRIO_CLASSES else None
+
+    def _apply_to_self(self) -> None:
+        # Runs in the child between fork and exec.
+        if self.nice:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, self.nice)
+            except OSError:
+                pass
+        if self.io_class:
+            ioprio_set(0, self.io_class)
+
+    def popen_kwargs(self) -> dict:
+        """Keyword arguments for ``subprocess.Popen`` starting colcon."""
+        kwargs = {'start_new_session': True}
+        if self.nice or self.io_class:
+            kwargs['preexec_fn'] = self._apply_to_self
+        return kwargs
+
+    def enforce(self, session_pid: int) -> None:
+        """Re-apply the niceness to every process in the colcon session."""
+        if not self.nice:
+            return
+        for pid in _session_pids(session_pid):
+            try:
+                if os.getpriority(os.PRIO_PROCESS, pid) != self.nice:
+                    os.setpriority(os.PRIO_PROCESS, pid, self.nice)
+            except OSError:
+                pass
+
+
+def interrupt_session(process, timeout: float = 5.0, sig: int = signal.SIGINT) -> None:
+    """Stop a colcon session started by `PriorityManager.popen_kwargs`.
+
+    The session doesn't share our terminal's process group, so a Ctrl-C only
+    reaches hatchy; forward it (or ``sig``) so colcon can abort its jobs
+    cleanly, and SIGKILL the group if it hasn't exited after ``timeout``.
+    """
+    try:
+        os.killpg(process.pid, sig)
+    except OSError:
+        process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            process.kill()
+        process.wait()
+
+
+@contextlib.contextmanager
+def forward_termination(process):
+    """Pass SIGTERM and SIGHUP on to a colcon session while it runs, then exit.
+
+    Its own session doesn't receive the hangup of our terminal or a
+    ``kill`` of hatchy, which would otherwise leave colcon and its
+    compilers running orphaned.
+    """
+    def forward(signum, frame):
+        interrupt_session(process, sig=signum)
+        raise SystemExit(128 + signum)
+
+    previous = {}
+    for sig in (signal.SIGTERM, signal.SIGHUP):
+        try:
+            previous[sig] = signal.signal(sig, forward)
+        except ValueError:
+            # Not the main thread: signals can't be handled here.
+            pass
+    try:
+        yield
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+
+
+def wait_with_priority(process, priority: PriorityManager) -> int:
+    """Wait for a colcon session, enforcing its priority.  Returns the exit code."""
+    try:
+        with forward_termination(process):
+            while True:
+                try:
+                    return process.wait(timeout=ENFORCE_INTERVAL_S)
+                except subprocess.TimeoutExpired:
+                    priority.enforce(process.pid)
+    except KeyboardInterrupt:
+        interrupt_session(process)
+        return 1
@@ -0,0 +1,157 @@
+"""Working tree and branch state of the git repositories in a workspace.
+
+Every repository's local changes and branch come from one
+``git status --porcelain=v2 --untracked-files=no``, which uses fsmonitor and
+the untracked cache where they are configured; repositories are queried
+concurrently.  Ahead/behind counts and the time of the last commit only
+change with the commits HEAD and its upstream point to, so they are cached
+in ``.hatch/repo_status.json`` keyed on those commit ids, read from the refs
+directly; while they are unchanged ``git status`` is told to skip counting.
+Local changes are never cached: editing a tracked file touches neither the
+refs nor the index.
+"""
+
+import json
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from .git_info import git_dirs, repo_state, resolve_ref
+
+_CACHE_VERSION = 1
+# Concurrent git processes.
+_WORKERS = 8
+
+
+def _git(repo_dir: str, *args: str) -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "-C", repo_dir] + list(args), capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout if result.returncode == 0 else None
+
+
+def _stash_count(common_dir: str) -> int:
+    try:
+        with open(os.path.join(common_dir, 'logs', 'refs', 'stash')) as f:
+            return sum(1 for line in f if line.strip())
+    except OSError:
+        return 0
+
+
+def _upstream_ref(config: Dict[str, List[str]], branch: str) -> Optional[str]:
+    """Full ref name of a branch's upstream, from its branch.<name>.remote/merge settings."""
+    remote = config.get(f'branch.{branch}.remote', [''])[-1]
+    merge = config.get(f'branch.{branch}.merge', [''])[-1]
+    if not remote or not merge.startswith('refs/heads/'):
+        return None
+    if remote == '.':
+        return merge
+    return f"refs/remotes/{remote}/{merge[len('refs/heads/'):]}"
+
+
+def _commit_key(repo_dir: str) -> Optional[List[Optional[str]]]:
+    """[HEAD commit, upstream commit] read from the refs, or None if they can't be read."""
+    state = repo_state(repo_dir)
+    if state is None:
+        return None
+    git_dir, common_dir, head = state['git_dir'], state['common_dir'], state['head']
+    if not head.startswith('refs/'):
+        return [head, None]
+    commit = resolve_ref(git_dir, common_dir, head)
+    if commit is None:
+        return None
+    upstream = None
+    if head.startswith('refs/heads/'):
+        ref = _upstream_ref(state['config'], head[len('refs/heads/'):])
+        upstream = ref and resolve_ref(git_dir, common_dir, ref)
+    return [commit, upstream]
+
+
+def parse_status(output: str) -> dict:
+    """Branch and change counts from ``git status --porcelain=v2 -z --branch`` output."""
+    status = {'head': None, 'oid': None, 'upstream': None, 'ahead': None, 'behind': None,
+              'staged': 0, 'modified': 0, 'conflicts': 0}
+    fields = output.split('\0')
+    i = 0
+    while i < len(fields):
+        field = fields[i]
+        i += 1
+        if field.startswith('# branch.oid '):
+            status['oid'] = field[len('# branch.oid '):]
+        elif field.startswith('# branch.head '):
+            status['head'] = field[len('# branch.head '):]
+        elif field.startswith('# branch.upstream '):
+            status['upstream'] = field[len('# branch.upstream '):]
+        elif field.startswith('# branch.ab '):
+            ahead, behind = field.split()[2:4]
+            if ahead[1:].isdigit() and behind[1:].isdigit():
+                status['ahead'], status['behind'] = int(ahead[1:]), int(behind[1:])
+        elif field.startswith(('1 ', '2 ')):
+            if field[2] != '.':
+                status['staged'] += 1
+            if field[3] != '.':
+                status['modified'] += 1
+            if field.startswith('2 '):
+                # A rename is followed by its original path.
+                i += 1
+        elif field.startswith('u '):
+            status['conflicts'] += 1
+    return status
+
+
+def repo_status(repo_dir: str, cached: Optional[dict] = None) -> Optional[dict]:
+    """State of one repository; ``cached`` is its entry from a previous call."""
+    key = _commit_key(repo_dir)
+    reuse = cached is not None and key is not None and cached.get('key') == key
+    args = ["status", "--porcelain=v2", "-z", "--branch", "--untracked-files=no"]
+    if reuse:
+        args.append("--no-ahead-behind")
+    output = _git(repo_dir, *args)
+    if output is None:
+        return None
+    status = parse_status(output)
+    if reuse:
+        if status['upstream'] and status['ahead'] is None:
+            status['ahead'], status['behind'] = cached['ahead'], cached['behind']
+        status['committed'] = cached['committed']
+    else:
+        committed = (_git(repo_dir, "log", "-1", "--format=%ct") or '').strip()
+        status['committed'] = int(committed) if committed.isdigit() else None
+    dirs = git_dirs(repo_dir)
+    status['stash'] = _stash_count(dirs[1]) if dirs else 0
+    status['key'] = key
+    return status
+
+
+def _cache_path(workspace: str) -> str:
+    return os.path.join(workspace, '.hatch', 'repo_status.json')
+
+
+def repo_statuses(workspace: str, paths: List[str]) -> Dict[str, Optional[dict]]:
+    """State of the git repositories at ``paths`` (relative to the workspace), queried concurrently."""
+    cache = {}
+    try:
+        with open(_cache_path(workspace)) as f:
+            data = json.load(f)
+        if data.get('version') == _CACHE_VERSION:
+            cache = data['repos']
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+
+    with ThreadPoolExecutor(max_workers=_WORKERS) as pool:
+        statuses = dict(zip(paths, pool.map(
+            lambda path: repo_status(os.path.join(workspace, path), cache.get(path)), paths)))
+
+    cache = {path: {'key': status['key'], 'ahead': status['ahead'], 'behind': status['behind'],
+                    'committed': status['committed']}
+             for path, status in statuses.items() if status and status['key']}
+    tmp = _cache_path(workspace) + '.tmp'
+    try:
+        with open(tmp, 'w') as f:
+            json.dump({'version': _CACHE_VERSION, 'repos': cache}, f, sort_keys=True)
+        os.replace(tmp, _cache_path(workspace))
+    except OSError:
+        pass
+    return statuses
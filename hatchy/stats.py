@@ -0,0 +1,213 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from .common import get_workspace_dir, clr, _fmt_duration, _BRIGHT_MAGENTA, _CYAN, _DIM, _GREEN, _RED
+from .history import connect, history_path, median_durations, percentile
+
+# Rows read for a single package's breakdown.
+_PACKAGE_RUNS = 200
+# Smallest median change reported by --changes.
+_MIN_CHANGE = 0.10
+# Most recent predictions evaluated by --accuracy.
+_ACCURACY_ROWS = 1000
+
+
+def register(subparsers):
+    parser = subparsers.add_parser("stats", help="Shows build and test timing history for a workspace.")
+    parser.add_argument("--workspace", "-w", default=".",
+                        help="The path to the colcon workspace (default: \".\")")
+    parser.add_argument(
+        "pkgs", metavar="PKGNAME", nargs='*', type=str,
+        help="Show p50/p95 timings and phase breakdown for these packages.")
+    parser.add_argument("--test", action="store_true",
+                        help="Report on test runs instead of build runs.")
+    parser.add_argument("--changes", action="store_true",
+                        help="Compare package times of the last --days days with the period before.")
+    parser.add_argument("--accuracy", action="store_true",
+                        help="Show how far the overlay's predicted times were from the actual ones.")
+    parser.add_argument("--days", type=int, default=7,
+                        help="Length of the --changes comparison window in days. (default: 7)")
+    parser.add_argument("--limit", "-n", type=int, default=10,
+                        help="Number of packages to list. (default: 10)")
+    parser.set_defaults(func=stats_command)
+
+
+def _col(label, width):
+    return clr(label, _CYAN) + ' ' * (width - len(label))
+
+
+def _print_slowest(conn, verb, limit):
+    medians = median_durations(conn, verb)
+    if not medians:
+        print(f"No successful {verb} runs recorded yet.")
+        return
+    ranked = sorted(medians.items(), key=lambda kv: kv[1][0], reverse=True)[:limit]
+    name_w = max(max(len(name) for name, _ in ranked), len("package"))
+    sep = clr("-" * (name_w + 30), _BRIGHT_MAGENTA)
+    print(sep)
+    print(f"{_col('package', name_w)}  {_col('median', 14)}  {clr('runs', _CYAN)}")
+    print(sep)
+    for name, (median, runs) in ranked:
+        print(f"{name:<{name_w}}  {_fmt_duration(median):<14}  {clr(str(runs), _DIM)}")
+    print(sep)
+
+
+def _print_package(conn, verb, name):
+    rows = conn.execute(
+        "SELECT started, duration, ok, aborted, phases FROM packages "
+        "WHERE verb = ? AND name = ? ORDER BY started DESC LIMIT ?",
+        (verb, name, _PACKAGE_RUNS)).fetchall()
+    sep = clr("-" * 50, _BRIGHT_MAGENTA)
+    print(sep)
+    print(clr(name, _CYAN))
+    print(sep)
+    if not rows:
+        print(f"No {verb} runs recorded.")
+        print(sep)
+        return
+    ok = [duration for _, duration, ok, _, _ in rows if ok]
+    failed = sum(1 for _, _, ok, aborted, _ in rows if ok == 0 and not aborted)
+    last_started, last_duration, last_ok = rows[0][0], rows[0][1], rows[0][2]
+    last_result = clr('ok', _GREEN) if last_ok else clr('failed', _RED)
+    print(f"{'Runs:':<12}{len(rows)} ({failed} failed)")
+    if ok:
+        print(f"{'p50:':<12}{_fmt_duration(percentile(ok, 50))}")
+        print(f"{'p95:':<12}{_fmt_duration(percentile(ok, 95))}")
+        print(f"{'Min / Max:':<12}{_fmt_duration(min(ok))} / {_fmt_duration(max(ok))}")
+    when = datetime.fromtimestamp(last_started).strftime('%Y-%m-%d %H:%M')
+    print(f"{'Last run:':<12}{when}  {_fmt_duration(last_duration)}  {last_result}")
+
+    phases = {}
+    for _, _, ok, _, phase_json in rows:
+        if ok and phase_json:
+            for phase, secs in json.loads(phase_json).items():
+                phases.setdefault(phase, []).append(secs)
+    if phases:
+        print(clr("Phases (p50):", _DIM))
+        for phase, secs in phases.items():
+            print(f"  {phase:<10}{_fmt_duration(percentile(secs, 50))}")
+    print(sep)
+
+
+def _configs(conn, verb, since, until):
+    return {row[0]: row[1] for row in conn.execute(
+        "SELECT config_hash, config FROM runs WHERE verb = ? AND started >= ? AND started < ?",
+        (verb, since, until))}
+
+
+def _print_changes(conn, verb, days, limit):
+    now = time.time()
+    window = days * 86400
+    current = median_durations(conn, verb, now - window, now)
+    previous = median_durations(conn, verb, now - 2 * window, now - window)
+    if not current or not previous:
+        print(f"Not enough {verb} history to compare the last {days} days with the {days} before.")
+        return
+
+    changes = []
+    for name, (median, _) in current.items():
+        if name in previous:
+            before = previous[name][0]
+            if before > 0 and abs(median - before) / before >= _MIN_CHANGE:
+                changes.append((name, before, median))
+    changes.sort(key=lambda c: abs(c[2] - c[1]), reverse=True)
+
+    sep = clr("-" * 70, _BRIGHT_MAGENTA)
+    print(sep)
+    print(clr(f"Changes over the last {days} days", _CYAN))
+    print(sep)
+    if changes:
+        name_w = max(len(name) for name, _, _ in changes[:limit])
+        for name, before, after in changes[:limit]:
+            pct = 100 * (after - before) / before
+            delta = clr(f"{pct:+.0f}%", _RED if pct > 0 else _GREEN)
+            print(f"{name:<{name_w}}  {_fmt_duration(before)} -> {_fmt_duration(after)}  {delta}")
+    else:
+        print(f"No package median changed by more than {_MIN_CHANGE:.0%}.")
+    added = sorted(set(current) - set(previous))
+    removed = sorted(set(previous) - set(current))
+    if added:
+        print(f"{clr('New:', _DIM)} {', '.join(added)}")
+    if removed:
+        print(f"{clr('Not built:', _DIM)} {', '.join(removed)}")
+
+    before_cfg = _configs(conn, verb, now - 2 * window, now - window)
+    after_cfg = _configs(conn, verb, now - window, now)
+    for config in (after_cfg[h] for h in sorted(set(after_cfg) - set(before_cfg))):
+        settings = ', '.join(f'{k}={v}' for k, v in json.loads(config).items())
+        print(f"{clr('New configuration:', _DIM)} {settings or 'defaults'}")
+    print(sep)
+
+
+def _print_accuracy(conn, verb, limit):
+    sep = clr("-" * 70, _BRIGHT_MAGENTA)
+    runs = conn.execute(
+        "SELECT started, duration, predicted FROM runs WHERE verb = ? AND predicted IS NOT NULL "
+        "AND returncode = 0 ORDER BY started DESC LIMIT ?", (verb, limit)).fetchall()
+    rows = conn.execute(
+        "SELECT name, duration, predicted FROM packages WHERE verb = ? AND ok = 1 "
+        "AND predicted IS NOT NULL ORDER BY started DESC LIMIT ?", (verb, _ACCURACY_ROWS)).fetchall()
+    if not runs and not rows:
+        print(f"No predictions recorded for {verb} runs yet.")
+        return
+
+    print(sep)
+    print(clr("Overall ETA (predicted at start)", _CYAN))
+    print(sep)
+    for started, duration, predicted in runs:
+        when = datetime.fromtimestamp(started).strftime('%Y-%m-%d %H:%M')
+        err = 100 * (predicted - duration) / duration if duration else 0.0
+        print(f"{when}  {_fmt_duration(predicted):>16} -> {_fmt_duration(duration):<16} "
+              f"{clr(f'{err:+.0f}%', _DIM)}")
+    errors = {}
+    for name, duration, predicted in rows:
+        if duration > 0:
+            errors.setdefault(name, []).append(abs(predicted - duration) / duration)
+    if errors:
+        all_errors = [e for errs in errors.values() for e in errs]
+        print(sep)
+        print(clr("Per-package predictions", _CYAN))
+        print(sep)
+        print(f"{'Median error:':<16}{percentile(all_errors, 50):.0%}")
+        print(f"{'p95 error:':<16}{percentile(all_errors, 95):.0%}")
+        worst = sorted(errors.items(), key=lambda kv: percentile(kv[1], 50), reverse=True)[:limit]
+        print(clr("Least predictable:", _DIM))
+        name_w = max(len(name) for name, _ in worst)
+        for name, errs in worst:
+            print(f"  {name:<{name_w}}  {percentile(errs, 50):.0%}")
+    print(sep)
+
+
+def stats_command(args):
+    workspace = os.path.abspath(args.workspace)
+
+    if not os.path.exists(workspace):
+        print(f"Error: The specified workspace directory '{workspace}' does not exist.")
+        sys.exit(1)
+
+    workspace = get_workspace_dir(workspace)
+    if workspace is None:
+        print(f"Error: Parent colcon workspace directory does not exist.")
+        sys.exit(1)
+
+    if not os.path.exists(history_path(workspace)):
+        print("No history recorded yet. Run 'hatchy build' or 'hatchy test' first.")
+        sys.exit(0)
+
+    verb = 'test' if args.test else 'build'
+    conn = connect(workspace)
+    try:
+        if args.accuracy:
+            _print_accuracy(conn, verb, args.limit)
+        elif args.changes:
+            _print_changes(conn, verb, args.days, args.limit)
+        elif args.pkgs:
+            for name in args.pkgs:
+                _print_package(conn, verb, name)
+        else:
+            _print_slowest(conn, verb, args.limit)
+    finally:
+        conn.close()
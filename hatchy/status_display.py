@@ -6,47 +6,70 @@ the `_run_with_status` driver loop that pumps a colcon subprocess into the
 display.  Two thin public wrappers — `run_build_with_status` and
 `run_test_with_status` — configure the display for each command.
 
-Stderr highlighting is delegated to the `highlighters` module.
+Package lifecycle comes either from colcon's console output or, when the
+hatchy colcon event handler is installed, from structured events (see the
+`events` module).  Stderr highlighting is delegated to the `highlighters`
+module.
 """
 
+import codecs
+import functools
 import locale
 import os
-import queue
 import re
 import select
+import selectors
 import shutil
 import signal
-import subprocess
 import sys
+import tempfile
 import termios
-import threading
 import time
 import tty
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
 
 from .common import (
-    clr, supports_ansi, _strip_ansi, _truncate_ansi, _fmt_duration,
+    clr, supports_ansi, _strip_ansi, _truncate_ansi, _fmt_duration, STDERR_MEMORY_LINES,
     _GREEN, _YELLOW, _RED, _BOLD_RED, _BOLD_GREEN,
     _CYAN, _BRIGHT_BLUE, _BRIGHT_MAGENTA, _DIM, _BOLD,
 )
+from .eta import EtaModel
+from .events import EventChannel, decode_event
+from .history import RunRecorder
 from .highlighters import highlight_stderr
+from .priority import ENFORCE_INTERVAL_S, PriorityManager, forward_termination, interrupt_session
 
 # ---- tunables ----------------------------------------------------------------
 # Cap on left-padding for completed-package names so very long names don't blow
 # out the terminal width.
 _MAX_NAME_WIDTH = 40
-# Tail of the colcon stdout.log read on each render to extract progress.
+# Largest window of a package's stdout.log the progress tailer will catch up
+# on in one go; older output is skipped when a burst exceeds it.
 _TAIL_READ_BYTES = 32768
-# Sleep between overlay renders.  Lower = smoother spinner, higher CPU.
+# Interval between overlay renders.  Lower = smoother spinner, higher CPU.
 _RENDER_INTERVAL_S = 0.1
-# Minimum interval between renice calls on the colcon process tree.
-_RENICE_INTERVAL_S = 1.0
+# Once no package has reported new progress for _IDLE_AFTER_S, frames slow
+# down to _IDLE_RENDER_INTERVAL_S (elapsed timers and spinner only).
+_IDLE_AFTER_S = 2.0
+_IDLE_RENDER_INTERVAL_S = 0.5
+
+# Maximum age of the simulated overall ETA before it is recomputed.
+_ETA_INTERVAL_S = 1.0
+# Maximum bytes taken from the colcon output pipe per read; each read is
+# split into lines and handed to the display as one batch.
+_READ_CHUNK_BYTES = 65536
 # Idle time after a successful Finished <<< before we flush the buffered
 # [ ok ] line.  The buffer exists so a trailing CTest stderr block can flip
 # [ ok ] to [ FAIL ]; without a timeout, a quiet build would leave the most
 # recent completion invisible until the next colcon event.
 _PENDING_FLUSH_S = 0.25
+# Stderr lines printed from the start and end of a package's block; anything
+# in between is elided from the terminal (colcon's stderr.log keeps it all).
+_STDERR_HEAD_LINES = 2000
+_STDERR_TAIL_LINES = 200
+# Lines read back and highlighted per chunk when printing a stderr block.
+_STDERR_CHUNK_LINES = 1000
 # Window after a SIGWINCH during which we render overlay lines with extra
 # right-edge slack so further small width reductions don't wrap the just-
 # rendered lines.  Sized to outlast a typical drag session.
@@ -58,6 +81,10 @@ _OVERLAY_LINE_MARGIN = 2
 # between this render and the next.
 _RESIZE_LINE_MARGIN = 8
 
+# When set in the environment, the build summary reports how many bytes the
+# overlay wrote to the terminal and the average rate.
+_RENDER_STATS_ENV = 'HATCHY_RENDER_STATS'
+
 # DEC mode 2026 — synchronized output.  Bracketing a write sequence with
 # BSU/ESU tells the terminal to buffer the output and present it atomically,
 # so a SIGWINCH-driven reflow can't interleave with our ANSI sequences in
@@ -87,6 +114,42 @@ _COLCON_BOUNDARY_RE = re.compile(
 )
 
 
+# Single-pass classifier for colcon console lines.  Each alternative has one
+# named group, so ``match.lastgroup`` names the line kind and the group holds
+# the package name.  Only lines starting with one of _LINE_LEADERS can match,
+# which lets the common case (build tool output) skip the regex entirely.
+_LINE_RE = re.compile(
+    r'(?P<summary>Summary:)'
+    r'|Starting\s+>>>\s+(?P<start>.+)$'
+    r'|Finished\s+<<<\s+(?P<finished>.+?)\s+\[.+\]$'
+    r'|\[\s*OK\s*\]\s+(?P<ok>.+?)\s+\(.+\)$'
+    r'|Failed\s+<<<\s+(?P<failed>.+?)\s+\[.+\]$'
+    r'|Aborted\s+<<<\s+(?P<aborted>.+?)\s+\[.+\]$'
+    # Strip the optional trailing ' ---' from the stderr header.
+    r'|---\s+stderr:\s+(?P<stderr>.+?)\s*(?:---\s*)?$'
+)
+_LINE_LEADERS = frozenset('SFA[-')
+# (ok, aborted) for each package-completion line kind.
+_FINISH_KINDS = {
+    'finished': (True, False),
+    'ok': (True, False),
+    'failed': (False, False),
+    'aborted': (False, True),
+}
+
+
+def _classify_line(line: str) -> Tuple[Optional[str], Optional[str]]:
+    """Return (kind, package) for a colcon console line, or (None, None)."""
+    if not line or line[0] not in _LINE_LEADERS:
+        return None, None
+    m = _LINE_RE.match(line)
+    if m is None:
+        return None, None
+    kind = m.lastgroup
+    value = m.group(kind)
+    return kind, value.strip() if kind != 'summary' else value
+
+
 def _is_ctest_boilerplate(line: str) -> bool:
     stripped = line.strip()
     return any(p in stripped for p in _CTEST_BOILERPLATE)
@@ -96,15 +159,28 @@ def _is_colcon_boundary(line: str) -> bool:
     return bool(_COLCON_BOUNDARY_RE.match(line))
 
 
-def _read_tail(path: str, nbytes: int = _TAIL_READ_BYTES) -> str:
-    try:
-        with open(path, 'rb') as f:
-            f.seek(0, 2)
-            size = f.tell()
-            f.seek(max(0, size - nbytes))
-            return f.read().decode('utf-8', errors='replace')
-    except OSError:
-        return ''
+@functools.lru_cache(maxsize=1024)
+def _visible_width(text: str) -> int:
+    """Visible character count of ``text`` with ANSI sequences removed.
+
+    Overlay lines repeat from frame to frame, so the widths are memoized.
+    """
+    return len(_strip_ansi(text)) if '\x1b' in text else len(text)
+
+
+def _common_prefix_cut(old: str, new: str) -> int:
+    """Index into ``new`` from which it must be rewritten to turn ``old`` into it.
+
+    The shared prefix is backed off to the start of the last escape sequence
+    inside it.  Overlay colors are always complete set-then-reset spans (see
+    ``clr``), so re-emitting from that escape restores the right attributes.
+    """
+    n = min(len(old), len(new))
+    k = 0
+    while k < n and old[k] == new[k]:
+        k += 1
+    esc = new.rfind('\x1b', 0, k)
+    return esc if esc >= 0 else k
 
 
 def _truncate_desc(desc: str, max_len: int) -> str:
@@ -132,7 +208,7 @@ def _truncate_desc(desc: str, max_len: int) -> str:
 
 
 # CTest stdout.log parser patterns.  Compiled at module load so the hot path
-# in _parse_test_progress doesn't recompile per-line.  The per-test patterns
+# in _TestProgress.feed doesn't recompile per-line.  The per-test patterns
 # capture the leading test index as a group rather than hard-coding it, so a
 # single compiled regex covers any test number.
 _CTEST_RESULT_RE = re.compile(r'^(\d+)/(\d+)\s+Test\s+#\d+:')
@@ -142,99 +218,200 @@ _GTEST_END_RE = re.compile(r'^(\d+):\s*\[\s*(?:OK|FAILED)\s*\]')
 _PYUNIT_START_RE = re.compile(r'^(\d+):\s+(\w+)\s+\([^)]+\)\s+\.\.\.')
 _PYUNIT_END_RE = re.compile(r'^(\d+):\s+(?:ok|FAIL(?:ED)?|ERROR|Ran\s+\d+)')
 
+# Build progress patterns for cmake/make and ninja stdout.log lines.
+_MAKE_PROGRESS_RE = re.compile(r'^\[\s*(\d+)%\]\s+(.*)')
+_NINJA_PROGRESS_RE = re.compile(r'^\[(\d+)/(\d+)\]\s+(.*)')
+_NINJA_SOURCE_RE = re.compile(r'(?:^|\s)-c\s+(\S+)')
+
 
-def _parse_test_progress(log_path: Optional[str]) -> Optional[Tuple[int, str]]:
-    """Return (percent, description) from a CTest stdout.log.
+class _TestProgress:
+    """Incremental (percent, description) tracker over a CTest stdout.log.
 
     CTest writes verbose output with each line prefixed by the test index
     (e.g. '1: [ RUN      ] Suite.TestCase') so we can extract the active
     gtest case from the same file without reading any secondary log.
     """
-    if not log_path:
-        return None
-    tail = _strip_ansi(_read_tail(log_path))
-    completed = 0
-    total = None
-    current_test: Optional[str] = None
-    current_test_num: Optional[int] = None
-    current_case: Optional[str] = None
-
-    for line in tail.splitlines():
+
+    __slots__ = ('completed', 'total', 'current_test', 'current_test_num', 'current_case')
+
+    def __init__(self):
+        self.completed = 0
+        self.total: Optional[int] = None
+        self.current_test: Optional[str] = None
+        self.current_test_num: Optional[int] = None
+        self.current_case: Optional[str] = None
+
+    def feed(self, line: str) -> None:
         stripped = line.strip()
 
         # Result: "3/10 Test #3: test_name .......... Passed  0.01 sec"
         m = _CTEST_RESULT_RE.match(stripped)
         if m:
-            completed = int(m.group(1))
-            total = int(m.group(2))
-            current_test = None
-            current_test_num = None
-            current_case = None
-            continue
+            self.completed = int(m.group(1))
+            self.total = int(m.group(2))
+            self.current_test = None
+            self.current_test_num = None
+            self.current_case = None
+            return
 
         # Start: "    Start 4: test_name"  (leading whitespace in CTest output)
         m = _CTEST_START_RE.match(line)
         if m:
-            current_test_num = int(m.group(1))
-            current_test = m.group(2).strip()
-            current_case = None
-            continue
+            self.current_test_num = int(m.group(1))
+            self.current_test = m.group(2).strip()
+            self.current_case = None
+            return
 
         # Per-test verbose output: "4: [ RUN      ] Suite.TestCase"  (gtest)
         # or "4: test_name (module.Class.test_name) ..."  (Python unittest /
         # launch_test).  Only honor patterns whose leading index matches the
         # currently-running test number — other indices are output from
         # already-completed tests still being flushed by ctest.
-        if current_test_num is not None:
-            m = _GTEST_RUN_RE.match(stripped)
-            if m and int(m.group(1)) == current_test_num:
-                current_case = m.group(2).strip()
-                continue
-            m = _GTEST_END_RE.match(stripped)
-            if m and int(m.group(1)) == current_test_num:
-                current_case = None
-                continue
-            m = _PYUNIT_START_RE.match(stripped)
-            if m and int(m.group(1)) == current_test_num:
-                current_case = m.group(2).strip()
-                continue
-            m = _PYUNIT_END_RE.match(stripped)
-            if m and int(m.group(1)) == current_test_num:
-                current_case = None
+        num = self.current_test_num
+        if num is None:
+            return
+        m = _GTEST_RUN_RE.match(stripped)
+        if m and int(m.group(1)) == num:
+            self.current_case = m.group(2).strip()
+            return
+        m = _GTEST_END_RE.match(stripped)
+        if m and int(m.group(1)) == num:
+            self.current_case = None
+            return
+        m = _PYUNIT_START_RE.match(stripped)
+        if m and int(m.group(1)) == num:
+            self.current_case = m.group(2).strip()
+            return
+        m = _PYUNIT_END_RE.match(stripped)
+        if m and int(m.group(1)) == num:
+            self.current_case = None
 
-    if total is None and current_test is None:
-        return None
-    pct = int(100 * completed / total) if total else 0
-    if current_test is not None:
-        desc = f"{current_test}: {current_case}" if current_case else current_test
-    else:
-        desc = f"{completed}/{total}" if total else "starting..."
-    return pct, desc
+    def result(self) -> Optional[Tuple[int, str]]:
+        if self.total is None and self.current_test is None:
+            return None
+        total = self.total
+        pct = int(100 * self.completed / total) if total else 0
+        if self.current_test is not None:
+            case = self.current_case
+            desc = f"{self.current_test}: {case}" if case else self.current_test
+        else:
+            desc = f"{self.completed}/{total}" if total else "starting..."
+        return pct, desc
 
 
-def _parse_progress(log_path: Optional[str]) -> Optional[Tuple[int, str]]:
-    """Return (percent, description) from the most recent build progress line."""
-    if not log_path:
-        return None
-    tail = _strip_ansi(_read_tail(log_path))
-    for line in reversed(tail.splitlines()):
+class _BuildProgress:
+    """Incremental (percent, description) tracker over a colcon build stdout.log.
+
+    Keeps the most recent cmake/make (``[67%] ...``) or ninja (``[67/100] ...``)
+    progress line seen so far.
+    """
+
+    __slots__ = ('last',)
+
+    def __init__(self):
+        self.last: Optional[Tuple[int, str]] = None
+
+    def feed(self, line: str) -> None:
         line = line.strip()
+        if not line.startswith('['):
+            return
         # cmake/make: [67%] Building CXX object src/foo.cc.o
-        m = re.match(r'^\[\s*(\d+)%\]\s+(.*)', line)
+        m = _MAKE_PROGRESS_RE.match(line)
         if m:
-            return int(m.group(1)), m.group(2).strip()
+            self.last = int(m.group(1)), m.group(2).strip()
+            return
         # ninja: [67/100] ...
-        m = re.match(r'^\[(\d+)/(\d+)\]\s+(.*)', line)
+        m = _NINJA_PROGRESS_RE.match(line)
         if m:
             a, b = int(m.group(1)), int(m.group(2))
             pct = int(100 * a / b) if b else 0
             desc = m.group(3).strip()
             # With VERBOSE=1, ninja shows full compiler commands; extract source file.
-            src = re.search(r'(?:^|\s)-c\s+(\S+)', desc)
+            src = _NINJA_SOURCE_RE.search(desc)
             if src:
                 desc = f"Compiling {os.path.basename(src.group(1))}"
-            return pct, desc
-    return None
+            self.last = pct, desc
+
+    def result(self) -> Optional[Tuple[int, str]]:
+        return self.last
+
+
+class _LogTailer:
+    """Follows one package's colcon stdout.log and feeds new lines to a tracker.
+
+    The file descriptor stays open for the lifetime of the package and the
+    consumed offset is remembered, so each ``poll`` costs one ``fstat`` when
+    nothing was appended and otherwise reads only the new bytes.  A partial
+    trailing line is held back until its newline arrives.  When the file is
+    first opened (or a burst outruns us) by more than ``_TAIL_READ_BYTES`` we
+    skip ahead to that window, matching what a full tail read would have seen.
+    """
+
+    __slots__ = ('path', '_tracker_cls', '_tracker', '_fd', '_offset', '_partial', '_skip_partial')
+
+    def __init__(self, path: str, tracker_cls):
+        self.path = path
+        self._tracker_cls = tracker_cls
+        self._tracker = tracker_cls()
+        self._fd: Optional[int] = None
+        self._offset = 0
+        self._partial = b''
+        self._skip_partial = False
+
+    def poll(self) -> Optional[Tuple[int, str]]:
+        """Consume any newly appended bytes and return the tracker's result."""
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+            except OSError:
+                return None
+        try:
+            size = os.fstat(self._fd).st_size
+        except OSError:
+            return self._tracker.result()
+        if size < self._offset:
+            # Truncated or replaced underneath us — start over.
+            self._offset = 0
+            self._partial = b''
+            self._tracker = self._tracker_cls()
+        if size == self._offset:
+            return self._tracker.result()
+        if size - self._offset > _TAIL_READ_BYTES:
+            self._offset = size - _TAIL_READ_BYTES
+            self._partial = b''
+            self._skip_partial = True
+        try:
+            data = os.pread(self._fd, size - self._offset, self._offset)
+        except OSError:
+            return self._tracker.result()
+        self._offset += len(data)
+        data = self._partial + data
+        cut = data.rfind(b'\n')
+        if cut < 0:
+            self._partial = data
+            return self._tracker.result()
+        self._partial = data[cut + 1:]
+        chunk = data[:cut]
+        if self._skip_partial:
+            # We landed mid-line after skipping ahead; drop the fragment.
+            self._skip_partial = False
+            nl = chunk.find(b'\n')
+            chunk = chunk[nl + 1:] if nl >= 0 else b''
+        text = chunk.decode('utf-8', errors='replace')
+        if '\x1b' in text:
+            text = _strip_ansi(text)
+        feed = self._tracker.feed
+        for line in text.splitlines():
+            feed(line)
+        return self._tracker.result()
+
+    def close(self) -> None:
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
 
 
 def _infer_phase(last_progress: Optional[Tuple[int, str]]) -> str:
@@ -248,17 +425,114 @@ def _infer_phase(last_progress: Optional[Tuple[int, str]]) -> str:
     return 'build'
 
 
-@dataclass
+class _StderrBuffer:
+    """A package's stderr lines, bounded in memory.
+
+    Up to ``cap`` lines are kept in a list.  On overflow the buffered lines
+    and everything after them go to an anonymous temporary file in
+    ``spill_dir`` instead, so a package emitting hundreds of thousands of
+    diagnostics doesn't grow hatchy's RSS.
+    """
+
+    __slots__ = ('_cap', '_spill_dir', '_lines', '_spill', '_count')
+
+    def __init__(self, cap: int, spill_dir: Optional[str] = None):
+        self._cap = cap
+        self._spill_dir = spill_dir
+        self._lines: List[str] = []
+        self._spill = None
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, line: str) -> None:
+        self._count += 1
+        if self._spill is not None:
+            self._spill.write(line + '\n')
+            return
+        self._lines.append(line)
+        if len(self._lines) > self._cap:
+            self._spill = self._open_spill()
+            if self._spill is not None:
+                self._spill.writelines(ln + '\n' for ln in self._lines)
+                self._lines = []
+
+    def _open_spill(self):
+        spill_dir = self._spill_dir
+        if spill_dir is not None:
+            try:
+                os.makedirs(spill_dir, exist_ok=True)
+            except OSError:
+                spill_dir = None
+        try:
+            return tempfile.TemporaryFile(
+                mode='w+', encoding='utf-8', errors='replace',
+                prefix='hatchy-stderr-', dir=spill_dir)
+        except OSError:
+            # Nowhere to spill; fall back to growing in memory.
+            self._cap = float('inf')
+            return None
+
+    def iter_chunks(self, size: int) -> Iterator[List[str]]:
+        """Yield the buffered lines in order, ``size`` lines at a time."""
+        if self._spill is None:
+            for i in range(0, len(self._lines), size):
+                yield self._lines[i:i + size]
+            return
+        self._spill.flush()
+        self._spill.seek(0)
+        chunk: List[str] = []
+        for line in self._spill:
+            chunk.append(line.rstrip('\n'))
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._lines = []
+
+
 class _PkgState:
-    name: str
-    start: float
-    log_path: str
-    end: Optional[float] = None
-    ok: Optional[bool] = None
-    aborted: bool = False
-    stderr: List[str] = field(default_factory=list)
-    has_stderr: bool = False
-    last_progress: Optional[Tuple[int, str]] = None
+    """Per-package bookkeeping, shared by the running and completed views."""
+
+    __slots__ = ('name', 'start', 'log_path', 'end', 'ok', 'aborted',
+                 'stderr', 'has_stderr', 'last_progress', 'tailer',
+                 'phase', 'phase_start', 'phases', 'spans')
+
+    def __init__(self, name: str, start: float, log_path: str,
+                 tailer: Optional[_LogTailer] = None):
+        self.name = name
+        self.start = start
+        self.log_path = log_path
+        self.end: Optional[float] = None
+        self.ok: Optional[bool] = None
+        self.aborted = False
+        self.stderr: Optional[_StderrBuffer] = None
+        self.has_stderr = False
+        self.last_progress: Optional[Tuple[int, str]] = None
+        self.tailer = tailer
+        # Seconds spent in each phase shown in the overlay, for the history.
+        self.phase: Optional[str] = None
+        self.phase_start = start
+        self.phases: Dict[str, float] = {}
+        # (phase, start, end) in order, for trace export.
+        self.spans: List[Tuple[str, float, float]] = []
+
+    def enter_phase(self, phase: Optional[str], now: float) -> None:
+        """Switch to ``phase`` (None closes the current one) at ``now``."""
+        if phase == self.phase:
+            return
+        if self.phase is not None:
+            self.phases[self.phase] = self.phases.get(self.phase, 0.0) + now - self.phase_start
+            self.spans.append((self.phase, self.phase_start, now))
+        self.phase = phase
+        self.phase_start = now
 
 
 class StatusDisplay:
@@ -273,16 +547,34 @@ class StatusDisplay:
 
     def __init__(self, workspace: str, total: Optional[int] = None,
                  log_subdir: str = 'latest_build',
-                 progress_fn=None,
+                 progress_cls=None,
                  show_build_summary: bool = True,
                  pkg_names: Optional[List[str]] = None,
-                 phase: Optional[str] = None):
+                 phase: Optional[str] = None,
+                 stderr_memory_lines: Optional[int] = None,
+                 status_fns: Optional[List[Callable[[], Optional[str]]]] = None,
+                 eta: Optional[EtaModel] = None):
         self._log_base = os.path.join(workspace, 'log', log_subdir)
-        self._progress_fn = progress_fn or _parse_progress
+        # Stderr beyond the in-memory cap spills to temp files in the log space.
+        self._spill_dir = os.path.join(workspace, 'log')
+        self._stderr_memory_lines = stderr_memory_lines or STDERR_MEMORY_LINES
+        self._progress_cls = progress_cls or _BuildProgress
         self._show_build_summary = show_build_summary
+        # Extra summary-line segments (e.g. cgroup resource usage); each
+        # callable returns a short string, or None to omit its segment.
+        self._status_fns = status_fns or []
+        # History-based predictions; the overall ETA is re-simulated at most
+        # every _ETA_INTERVAL_S or when a package starts or finishes.
+        self._eta = eta
+        self._eta_value: Optional[float] = None
+        self._eta_time = 0.0
+        self._eta_sig: Optional[Tuple[int, int]] = None
         self._build_start = time.monotonic()
         self._building: Dict[str, _PkgState] = {}
         self._done: List[_PkgState] = []
+        # Every package seen so far, running or completed, by name.  Stderr
+        # routing looks packages up here rather than scanning _done.
+        self._states: Dict[str, _PkgState] = {}
         self._stderr_pkg: Optional[str] = None
         self._in_stderr = False
         self._in_summary = False
@@ -290,8 +582,15 @@ class StatusDisplay:
         self._live_lines = 0
         self._live_strs: List[str] = []
         self._live_cols: int = 0
-        # Cached terminal size from the most recent render().
+        # Cached terminal size; re-queried only after a SIGWINCH marks it stale.
         self._cached_size: Optional[os.terminal_size] = None
+        self._size_stale = True
+        # Progress signature of the last frame and when it last changed;
+        # drives the idle back-off in render_interval().
+        self._activity_sig = None
+        self._last_activity = time.monotonic()
+        # Bytes written to the terminal by the display (instrumentation).
+        self._bytes_written = 0
         self._winch_time: float = 0.0
         self._prev_winch = None
         # Self-pipe whose read end the main loop selects on instead of using
@@ -315,6 +614,7 @@ class StatusDisplay:
             except (OSError, ValueError):
                 pass
         self._total = total
+        self._pkg_names = pkg_names
         self._fixed_phase = phase
         self._status_offset = 0
         self._interrupted = False
@@ -358,6 +658,7 @@ class StatusDisplay:
         now = time.monotonic()
         entering_resize = (now - self._winch_time) >= _RESIZE_DEBOUNCE_S
         self._winch_time = now
+        self._size_stale = True
         if entering_resize:
             # Each fresh burst arms one post-settle reposition.  We do NOT
             # reset _gap_rows here — any still-unfilled blanks from previous
@@ -432,8 +733,7 @@ class StatusDisplay:
             else:
                 buf.append(f'\033[K{line}')
         buf.append(_ESU)
-        sys.stdout.write(''.join(buf))
-        sys.stdout.flush()
+        self._write(''.join(buf))
         # Record the new blank rows (the drifted-overlay's old position
         # that's now empty between scroll history and the bottom-anchored
         # overlay).  Merge with any pre-existing gap rows so _scroll_print
@@ -451,8 +751,16 @@ class StatusDisplay:
             for piece in pending:
                 self._scroll_print(piece)
 
+    def process_lines(self, lines: List[str]) -> None:
+        """Consume a batch of colcon console lines."""
+        process_line = self.process_line
+        for raw in lines:
+            process_line(raw)
+
     def process_line(self, raw: str) -> None:
-        line = _strip_ansi(raw).rstrip()
+        # Most forwarded lines (compiler commands under VERBOSE=1) carry no
+        # escape sequences, so skip the ANSI regex unless an ESC is present.
+        line = (_strip_ansi(raw) if '\x1b' in raw else raw).rstrip()
 
         # Resolve a pending stderr-close from the previous bare-`---` line.
         # The block only closes if this line is a colcon boundary; otherwise
@@ -470,7 +778,9 @@ class StatusDisplay:
         # Suppress colcon's summary block — we print our own in finalize()
         if self._in_summary:
             return
-        if re.match(r'^Summary:', line):
+
+        kind, value = _classify_line(line)
+        if kind == 'summary':
             self._in_summary = True
             return
 
@@ -478,57 +788,19 @@ class StatusDisplay:
         # stderr block header for that same package (which we still need to
         # inspect for CTest errors before committing the result).
         if self._pending_state is not None and not self._in_stderr:
-            m_check = re.match(r'^---\s+stderr:\s+(.+?)\s*(?:---\s*)?$', line)
-            if not (m_check and m_check.group(1).strip() == self._pending_state.name):
+            if not (kind == 'stderr' and value == self._pending_state.name):
                 self._flush_pending()
 
-        # Package started
-        m = re.match(r'^Starting\s+>>>\s+(.+)$', line)
-        if m:
-            pkg = m.group(1).strip()
-            self._building[pkg] = _PkgState(
-                name=pkg,
-                start=time.monotonic(),
-                log_path=os.path.join(self._log_base, pkg, 'stdout.log'),
-            )
-            return
-
-        # Package finished
-        for pat, ok, aborted in (
-            (r'^Finished\s+<<<\s+(.+?)\s+\[.+\]$', True, False),
-            (r'^\[\s*OK\s*\]\s+(.+?)\s+\(.+\)$', True, False),
-            (r'^Failed\s+<<<\s+(.+?)\s+\[.+\]$', False, False),
-            (r'^Aborted\s+<<<\s+(.+?)\s+\[.+\]$', False, True),
-        ):
-            m = re.match(pat, line)
-            if m:
-                pkg = m.group(1).strip()
-                state = self._building.pop(pkg, _PkgState(pkg, time.monotonic(), ''))
-                state.end = time.monotonic()
-                state.ok = ok
-                state.aborted = aborted
-                self._done.append(state)
-                if ok:
-                    if pkg in self._ctest_error_pkgs:
-                        # CTest already reported errors via a preceding stderr block.
-                        state.ok = False
-                        self._ctest_error_pkgs.discard(pkg)
-                        self._flush_completed(state)
-                    else:
-                        # Buffer — a following stderr block may contain CTest errors.
-                        self._pending_state = state
-                        self._pending_state_time = time.monotonic()
-                else:
-                    self._ctest_error_pkgs.discard(pkg)
-                    self._flush_completed(state)
-                return
-
-        # Stderr block start — strip optional trailing ' ---' from the header
-        # (colcon formats it as '--- stderr: PKG ---')
-        m = re.match(r'^---\s+stderr:\s+(.+?)\s*(?:---\s*)?$', line)
-        if m:
-            self._stderr_pkg = m.group(1).strip()
-            self._in_stderr = True
+        if kind is not None:
+            if kind == 'start':
+                self._start_package(value)
+            elif kind == 'stderr':
+                # Stderr block start (colcon formats it as '--- stderr: PKG ---')
+                self._stderr_pkg = value
+                self._in_stderr = True
+            else:
+                ok, aborted = _FINISH_KINDS[kind]
+                self._finish_package(value, ok, aborted)
             return
 
         # Stderr block end — defer until the next line confirms it's a real
@@ -557,15 +829,99 @@ class StatusDisplay:
         if line:
             self._scroll_print(line)
 
+    def process_event(self, event: dict) -> None:
+        """Consume one structured event from the hatchy colcon event handler.
+
+        Events carry the package lifecycle directly, so none of the
+        deferred-close or pending-[ ok ] bookkeeping that ``process_line``
+        needs for colcon's console output applies here: stderr and test
+        failures always arrive before the package's ``end`` event.
+        """
+        kind = event.get('event')
+        pkg = event.get('pkg')
+        if not pkg:
+            return
+        if kind == 'start':
+            self._start_package(pkg)
+        elif kind == 'stderr':
+            line = event.get('line', '')
+            if '\x1b' in line:
+                line = _strip_ansi(line)
+            line = line.rstrip()
+            if _is_ctest_boilerplate(line):
+                self._ctest_error_pkgs.add(pkg)
+                return
+            target = self._states.get(pkg)
+            if target is not None:
+                self._add_stderr(target, line)
+        elif kind == 'test_failure':
+            self._ctest_error_pkgs.add(pkg)
+        elif kind == 'end':
+            rc = event.get('rc')
+            state = self._finish_package(
+                pkg, ok=not rc, aborted=rc == 'SIGINT', defer_ok=False)
+            self._print_stderr_block(state)
+
+    def _start_package(self, pkg: str) -> None:
+        log_path = os.path.join(self._log_base, pkg, 'stdout.log')
+        state = _PkgState(
+            name=pkg,
+            start=time.monotonic(),
+            log_path=log_path,
+            tailer=_LogTailer(log_path, self._progress_cls),
+        )
+        self._building[pkg] = state
+        self._states[pkg] = state
+
+    def _finish_package(self, pkg: str, ok: bool, aborted: bool,
+                        defer_ok: bool = True) -> _PkgState:
+        """Move ``pkg`` from building to done and report its result.
+
+        With ``defer_ok`` a successful result is buffered as the pending
+        completion, since colcon's console output may still deliver a CTest
+        stderr block that turns it into a failure.
+        """
+        state = self._building.pop(pkg, None)
+        if state is None:
+            state = self._states[pkg] = _PkgState(pkg, time.monotonic(), '')
+        if state.tailer is not None:
+            state.tailer.close()
+            state.tailer = None
+        state.end = time.monotonic()
+        state.enter_phase(None, state.end)
+        state.ok = ok
+        state.aborted = aborted
+        self._done.append(state)
+        if ok:
+            if pkg in self._ctest_error_pkgs:
+                # CTest already reported errors via a preceding stderr block.
+                state.ok = False
+                self._ctest_error_pkgs.discard(pkg)
+                self._flush_completed(state)
+            elif defer_ok:
+                # Buffer — a following stderr block may contain CTest errors.
+                self._pending_state = state
+                self._pending_state_time = time.monotonic()
+            else:
+                self._flush_completed(state)
+        else:
+            self._ctest_error_pkgs.discard(pkg)
+            self._flush_completed(state)
+        return state
+
     def _append_stderr_line(self, line: str) -> None:
         """Append a line to the active stderr block (no-op if no block is open)."""
         if not self._stderr_pkg:
             return
-        target = self._building.get(self._stderr_pkg) or next(
-            (s for s in self._done if s.name == self._stderr_pkg), None)
+        target = self._states.get(self._stderr_pkg)
         if target is not None:
-            target.stderr.append(line)
-            target.has_stderr = True
+            self._add_stderr(target, line)
+
+    def _add_stderr(self, state: _PkgState, line: str) -> None:
+        if state.stderr is None:
+            state.stderr = _StderrBuffer(self._stderr_memory_lines, self._spill_dir)
+        state.stderr.append(line)
+        state.has_stderr = True
 
     def _commit_stderr_close(self) -> None:
         """Close the current stderr block and print its highlighted contents."""
@@ -579,37 +935,96 @@ class StatusDisplay:
         # appears before the stderr output.
         if self._pending_state is not None and pkg_name == self._pending_state.name:
             self._flush_pending()
-        state = self._building.get(pkg_name) or next(
-            (s for s in self._done if s.name == pkg_name), None)
-        if state and state.stderr:
-            is_error = (state.ok is False) or (state.name in self._ctest_error_pkgs)
-            color = _RED if is_error else _YELLOW
-            self._scroll_print(f"\n{clr(f'--- stderr: {state.name} ---', color)}")
-            for ln in highlight_stderr(state.stderr):
-                self._scroll_print(f"  {ln}")
-            self._scroll_print(clr('---', color))
-            state.stderr = []  # clear so finalize() doesn't double-print
+        state = self._states.get(pkg_name)
+        if state is not None:
+            self._print_stderr_block(state)
+
+    def _print_stderr_block(self, state: _PkgState) -> None:
+        """Print a package's collected stderr into scroll history and clear it."""
+        if not state.stderr:
+            return
+        is_error = (state.ok is False) or (state.name in self._ctest_error_pkgs)
+        for ln in self._stderr_block_lines(state, _RED if is_error else _YELLOW):
+            self._scroll_print(ln)
+
+    def _stderr_block_lines(self, state: _PkgState, color: str) -> Iterator[str]:
+        """Yield the formatted stderr block for ``state`` and release its buffer.
+
+        The buffer is highlighted and yielded in chunks so a spilled buffer is
+        never loaded back into memory whole.  Past ``_STDERR_HEAD_LINES`` only
+        the last ``_STDERR_TAIL_LINES`` lines are kept for the terminal; the
+        header then reports how many lines were elided and where colcon's
+        full stderr.log lives.
+        """
+        buf = state.stderr
+        state.stderr = None  # clear so finalize() doesn't double-print
+        total = len(buf)
+        elided = max(0, total - _STDERR_HEAD_LINES - _STDERR_TAIL_LINES)
+        title = f'--- stderr: {state.name} ---'
+        if elided:
+            log_path = os.path.join(self._log_base, state.name, 'stderr.log')
+            title = (f'--- stderr: {state.name} ({total} lines, {elided} elided; '
+                     f'full output in {log_path}) ---')
+        yield f"\n{clr(title, color)}"
+        tail: Deque[str] = deque(maxlen=_STDERR_TAIL_LINES if elided else 0)
+        seen = 0
+        try:
+            for chunk in buf.iter_chunks(_STDERR_CHUNK_LINES):
+                if elided and seen + len(chunk) > _STDERR_HEAD_LINES:
+                    keep = max(0, _STDERR_HEAD_LINES - seen)
+                    tail.extend(chunk[keep:])
+                    chunk = chunk[:keep]
+                seen += len(chunk)
+                for ln in highlight_stderr(chunk):
+                    yield f"  {ln}"
+        finally:
+            buf.close()
+        if elided:
+            yield clr(f"  ... {elided} lines elided ...", _DIM)
+            for ln in highlight_stderr(list(tail)):
+                yield f"  {ln}"
+        yield clr('---', color)
+
+    def _overall_eta(self) -> Optional[float]:
+        """Predicted seconds until the run finishes, or None without a prediction."""
+        if not self._eta or self._pkg_names is None:
+            return None
+        now = time.monotonic()
+        sig = (len(self._done), len(self._building))
+        if sig != self._eta_sig or now - self._eta_time >= _ETA_INTERVAL_S:
+            running = {name: now - state.start for name, state in self._building.items()}
+            pending = [name for name in self._pkg_names if name not in self._states]
+            self._eta_value = self._eta.remaining(running, pending)
+            self._eta_time = now
+            self._eta_sig = sig
+        if self._eta_value is None:
+            return None
+        return max(0.0, self._eta_value - (now - self._eta_time))
 
     def _build_overlay_lines(self, cols: int, spin: str = ' ') -> List[str]:
         """Build the list of overlay lines without any terminal I/O."""
         lines: List[str] = []
 
         for pkg, state in sorted(self._building.items()):
-            elapsed = _fmt_duration(time.monotonic() - state.start)
-            prog = self._progress_fn(state.log_path)
+            secs = time.monotonic() - state.start
+            elapsed = _fmt_duration(secs)
+            predicted = self._eta.predict(pkg) if self._eta else None
+            left = f", ~{_fmt_duration(predicted - secs)} left" if predicted and predicted > secs else ''
+            prog = state.tailer.poll() if state.tailer is not None else None
             if prog:
                 state.last_progress = prog
             tag = clr(f'[run{spin}]', _CYAN)
             phase_str = self._fixed_phase or _infer_phase(state.last_progress)
+            state.enter_phase(phase_str, time.monotonic())
             phase = f':{clr(phase_str, _BRIGHT_MAGENTA)}'
             if state.last_progress:
                 pct, desc = state.last_progress
-                visible_prefix = f"[run{spin}] {pkg}:{phase_str} ({elapsed}) [{pct}%] "
+                visible_prefix = f"[run{spin}] {pkg}:{phase_str} ({elapsed}{left}) [{pct}%] "
                 max_desc = cols - len(visible_prefix) - 1
                 desc = _truncate_desc(desc, max_desc)
-                lines.append(f"{tag} {pkg}{phase} ({clr(elapsed, _BRIGHT_BLUE)}) [{clr(f'{pct}%', _BRIGHT_MAGENTA)}] {clr(desc, _DIM)}")
+                lines.append(f"{tag} {pkg}{phase} ({clr(elapsed, _BRIGHT_BLUE)}{clr(left, _DIM)}) [{clr(f'{pct}%', _BRIGHT_MAGENTA)}] {clr(desc, _DIM)}")
             else:
-                lines.append(f"{tag} {pkg}{phase} ({clr(elapsed, _BRIGHT_BLUE)})")
+                lines.append(f"{tag} {pkg}{phase} ({clr(elapsed, _BRIGHT_BLUE)}{clr(left, _DIM)})")
 
         total_elapsed = _fmt_duration(time.monotonic() - self._build_start)
         n_done = len(self._done)
@@ -627,12 +1042,16 @@ class StatusDisplay:
         self._status_offset = max(0, min(self._status_offset, max(0, len(all_parts) - 1)))
         offset = self._status_offset
         left_ind = f"{clr('<', _BOLD)} " if offset > 0 else ""
-        header = f"[{clr(total_elapsed, _BRIGHT_BLUE)}] [{clr(str(n_done), _BOLD_GREEN)}/{clr(str(n_total), _GREEN)} done] {left_ind}"
+        extra = ''.join(f"[{clr(seg, _DIM)}] " for seg in (fn() for fn in self._status_fns) if seg)
+        eta = self._overall_eta()
+        if eta is not None:
+            extra = f"[ETA {clr(_fmt_duration(eta), _BRIGHT_BLUE)}] " + extra
+        header = f"[{clr(total_elapsed, _BRIGHT_BLUE)}] [{clr(str(n_done), _BOLD_GREEN)}/{clr(str(n_total), _GREEN)} done] {extra}{left_ind}"
 
-        budget = cols - len(_strip_ansi(header)) - 2  # reserve 2 for ' >'
+        budget = cols - _visible_width(header) - 2  # reserve 2 for ' >'
         kept = []
         for part in all_parts[offset:]:
-            needed = len(_strip_ansi(part)) + (1 if kept else 0)
+            needed = _visible_width(part) + (1 if kept else 0)
             if budget >= needed:
                 kept.append(part)
                 budget -= needed
@@ -650,7 +1069,7 @@ class StatusDisplay:
         # long package-name prefix can already exceed cols on its own.
         max_visible = max(0, cols - 1)
         return [
-            line if len(_strip_ansi(line)) <= max_visible
+            line if _visible_width(line) <= max_visible
             else _truncate_ansi(line, max_visible)
             for line in lines
         ]
@@ -658,7 +1077,39 @@ class StatusDisplay:
     @staticmethod
     def _phys_lines(lines: List[str], cols: int) -> int:
         """Physical terminal rows occupied by lines at a given column width."""
-        return sum(max(1, (len(_strip_ansi(l)) + cols - 1) // cols) for l in lines)
+        return sum(max(1, (_visible_width(l) + cols - 1) // cols) for l in lines)
+
+    def _terminal_size(self) -> os.terminal_size:
+        """Terminal size, re-queried only after a SIGWINCH."""
+        if self._cached_size is None or self._size_stale:
+            self._size_stale = False
+            self._cached_size = shutil.get_terminal_size((80, 24))
+        return self._cached_size
+
+    def _write(self, data: str) -> None:
+        """Write ``data`` to the terminal and account for it in the byte counter."""
+        sys.stdout.write(data)
+        sys.stdout.flush()
+        self._bytes_written += len(data.encode('utf-8', errors='replace'))
+
+    def render_interval(self) -> float:
+        """Seconds until the next frame is worth drawing.
+
+        Frames come every ``_RENDER_INTERVAL_S`` while progress is moving and
+        back off to ``_IDLE_RENDER_INTERVAL_S`` once no package has reported
+        new progress for ``_IDLE_AFTER_S``.  A hidden overlay (erased by a
+        scroll-history print) is always redrawn at the fast rate.
+        """
+        if self._live_lines == 0 or self._in_resize_burst():
+            return _RENDER_INTERVAL_S
+        if time.monotonic() - self._last_activity >= _IDLE_AFTER_S:
+            return _IDLE_RENDER_INTERVAL_S
+        return _RENDER_INTERVAL_S
+
+    def output_rate(self) -> float:
+        """Average bytes per second written to the terminal by the display."""
+        elapsed = time.monotonic() - self._build_start
+        return self._bytes_written / elapsed if elapsed > 0 else 0.0
 
     def render(self) -> None:
         """Redraw the live overlay."""
@@ -677,8 +1128,7 @@ class StatusDisplay:
             self._erase_live()
             return
 
-        self._cached_size = shutil.get_terminal_size((80, 24))
-        cols = self._cached_size.columns
+        cols = self._terminal_size().columns
         # Advance the spinner only when we're actually about to draw a frame,
         # so the animation doesn't skip while the overlay is hidden.
         self._spin_idx = (self._spin_idx + 1) % len(_SPIN_FRAMES)
@@ -691,6 +1141,20 @@ class StatusDisplay:
         line_cols = max(1, cols - (margin - 1))
         new_lines = self._build_overlay_lines(line_cols, _SPIN_FRAMES[self._spin_idx])
 
+        activity = (len(self._done),
+                    tuple((p, s.last_progress) for p, s in self._building.items()))
+        if activity != self._activity_sig:
+            self._activity_sig = activity
+            self._last_activity = time.monotonic()
+
+        # Same number of single-row lines at the same width as the frame on
+        # screen: rewrite only the rows that changed in place.
+        if (self._live_lines == len(new_lines)
+                and self._live_cols == cols
+                and not self._in_resize_burst()):
+            self._render_diff(new_lines)
+            return
+
         # Bracket the full redraw in a synchronized-output block so the
         # terminal applies erase + writes atomically.  Without this, a
         # SIGWINCH-induced reflow can land between our \033[NA and \033[J or
@@ -774,12 +1238,51 @@ class StatusDisplay:
                 buf.append(line)
 
         buf.append(_ESU)
-        sys.stdout.write(''.join(buf))
-        sys.stdout.flush()
+        self._write(''.join(buf))
         self._live_lines = len(new_lines)
         self._live_strs = new_lines
         self._live_cols = cols
 
+    def _render_diff(self, new_lines: List[str]) -> None:
+        """Rewrite only the overlay rows whose content changed.
+
+        Only valid when the overlay on screen has the same number of lines
+        at the same column width, so every line occupies exactly one row and
+        the cursor sits on the last one.  Within a changed row, the unchanged
+        leading part is skipped with a cursor-forward.
+        """
+        last = len(new_lines) - 1
+        row = last
+        buf: List[str] = []
+        for i, (old, new) in enumerate(zip(self._live_strs, new_lines)):
+            if old == new:
+                continue
+            if row > i:
+                buf.append(f'\033[{row - i}A')
+            elif row < i:
+                buf.append(f'\033[{i - row}B')
+            start = _common_prefix_cut(old, new)
+            col = _visible_width(new[:start])
+            buf.append(f'\r\033[{col}C' if col else '\r')
+            buf.append(f'{new[start:]}\033[K')
+            row = i
+        if not buf:
+            return
+        if row < last:
+            buf.append(f'\033[{last - row}B')
+        self._write(_BSU + ''.join(buf) + _ESU)
+        self._live_strs = new_lines
+
+    def package_records(self) -> List[dict]:
+        """Completed packages as `history.RunRecorder` records."""
+        wall_offset = time.time() - time.monotonic()
+        return [{'name': s.name, 'started': s.start + wall_offset,
+                 'duration': s.end - s.start, 'ok': s.ok, 'aborted': s.aborted,
+                 'has_stderr': s.has_stderr, 'phases': s.phases,
+                 'spans': [(phase, a + wall_offset, b + wall_offset) for phase, a, b in s.spans],
+                 'predicted': self._eta.predict(s.name) if self._eta else None}
+                for s in self._done if s.end is not None]
+
     def finalize(self) -> None:
         if self._prev_winch is not None:
             try:
@@ -811,12 +1314,17 @@ class StatusDisplay:
             self._commit_stderr_close()
         self._flush_pending()
         self._erase_live()
+        for state in self._building.values():
+            if state.tailer is not None:
+                state.tailer.close()
+                state.tailer = None
 
         # Any packages still in-progress at interrupt time become aborted.
         if self._interrupted:
             now = time.monotonic()
             for state in sorted(self._building.values(), key=lambda s: s.name):
                 state.end = now
+                state.enter_phase(None, now)
                 state.ok = False
                 state.aborted = True
                 self._done.append(state)
@@ -825,11 +1333,8 @@ class StatusDisplay:
         # Show stderr for any packages whose blocks weren't flushed inline.
         for state in self._done:
             if state.stderr:
-                color = _RED if not state.ok else _YELLOW
-                print(f"\n{clr(f'--- stderr: {state.name} ---', color)}")
-                for ln in highlight_stderr(state.stderr):
-                    print(f"  {ln}")
-                print(clr('---', color))
+                for ln in self._stderr_block_lines(state, _RED if not state.ok else _YELLOW):
+                    print(ln)
 
         if not self._show_build_summary:
             return
@@ -865,6 +1370,9 @@ class StatusDisplay:
                 print(f"  {clr('Aborted', _YELLOW)}: {', '.join(aborted_names)}")
         if warn_names:
             print(f"  {clr('Warnings', _YELLOW)}: {', '.join(warn_names)}")
+        if os.environ.get(_RENDER_STATS_ENV):
+            print(clr(f"  Overlay output: {self._bytes_written} bytes "
+                      f"({self.output_rate():.0f} B/s)", _DIM))
         print()
 
     def scroll_status(self, direction: int) -> None:
@@ -938,25 +1446,21 @@ class StatusDisplay:
                         '\033[u',           # restore cursor
                         _ESU,
                     ]
-                    sys.stdout.write(''.join(buf))
-                    sys.stdout.flush()
+                    self._write(''.join(buf))
                     self._gap_rows.pop(0)
                     continue
             # No gap (or not applicable) — standard erase + print flow,
             # which will let the next render redraw the overlay below.
             self._erase_live()
             if self._tty:
-                sys.stdout.write('\033[?7h')
-                sys.stdout.flush()
-            print(piece, flush=True)
-            if self._tty:
-                sys.stdout.write('\033[?7l')
-                sys.stdout.flush()
+                self._write('\033[?7h' + piece + '\n\033[?7l')
+            else:
+                print(piece, flush=True)
 
     def _erase_live(self) -> None:
         if not self._tty or self._live_lines == 0:
             return
-        current_cols = shutil.get_terminal_size((80, 24)).columns
+        current_cols = self._terminal_size().columns
         cols = min(self._live_cols, current_cols) if self._live_cols else current_cols
         n_phys = self._phys_lines(self._live_strs, cols)
         # Cursor sits inside the overlay's last physical row (we don't trail
@@ -966,10 +1470,9 @@ class StatusDisplay:
         # \r resets to col 0 so ESC[J erases the full row, not just the
         # tail past the cursor (see render() for the rationale).
         if n_phys > 1:
-            sys.stdout.write(f'{_BSU}\033[{n_phys - 1}A\r\033[J{_ESU}')
+            self._write(f'{_BSU}\033[{n_phys - 1}A\r\033[J{_ESU}')
         else:
-            sys.stdout.write(f'{_BSU}\r\033[J{_ESU}')
-        sys.stdout.flush()
+            self._write(f'{_BSU}\r\033[J{_ESU}')
         self._live_lines = 0
         self._live_strs = []
         self._live_cols = 0
@@ -979,7 +1482,7 @@ class _KeyWatcher:
     """Non-blocking key reader in cbreak mode. Returns 'LEFT', 'RIGHT', or a char."""
 
     def __enter__(self):
-        self._fd = None
+        self._fd: Optional[int] = None
         self._saved = None
         self._buf = b''
         if sys.stdin.isatty():
@@ -992,6 +1495,11 @@ class _KeyWatcher:
         if self._saved is not None:
             termios.tcsetattr(self._fd, termios.TCSADRAIN, self._saved)
 
+    @property
+    def fileno(self) -> Optional[int]:
+        """Terminal input fd being watched, or None when stdin isn't a tty."""
+        return self._fd
+
     def read(self) -> Optional[str]:
         if self._fd is None:
             return None
@@ -1045,24 +1553,94 @@ class _KeyWatcher:
         return None
 
 
-def _run_with_status(process, nice: int, display: StatusDisplay) -> int:
-    """Drive a colcon subprocess with the given live display.
+class _LineSplitter:
+    """Incrementally decodes raw pipe chunks and splits them into lines.
 
-    Returns the process exit code (1 on KeyboardInterrupt).
+    UTF-8 sequences and lines split across chunk boundaries are carried over
+    to the next ``feed``; ``final=True`` flushes whatever is left.
     """
-    q: queue.Queue = queue.Queue()
 
-    def _reader():
-        try:
-            for raw in iter(process.stdout.readline, b''):
-                q.put(raw.decode('utf-8', errors='replace').rstrip('\n'))
-        finally:
-            q.put(None)
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._partial = ''
+
+    def feed(self, data: bytes, final: bool = False) -> List[str]:
+        text = self._partial + self._decoder.decode(data, final)
+        lines = text.split('\n')
+        self._partial = lines.pop()
+        if final and self._partial:
+            lines.append(self._partial)
+            self._partial = ''
+        return lines
+
+
+class _EventSplitter:
+    """Splits raw chunks from the event pipe into decoded event dicts."""
+
+    def __init__(self):
+        self._partial = b''
 
-    threading.Thread(target=_reader, daemon=True).start()
+    def feed(self, data: bytes, final: bool = False) -> List[dict]:
+        raw = self._partial + data
+        lines = raw.split(b'\n')
+        self._partial = b'' if final else lines.pop()
+        return [e for e in map(decode_event, lines) if e is not None]
 
-    last_nice = 0.0
-    done = False
+
+def _run_with_status(process, priority: PriorityManager, display: StatusDisplay,
+                     events: Optional[EventChannel] = None) -> int:
+    """Drive a colcon subprocess with the given live display.
+
+    A single selector loop ingests colcon's console output (fed to
+    ``display.process_lines`` in per-read batches), structured events from
+    the hatchy colcon event handler when an ``events`` channel is given (fed
+    to ``display.process_event``), key presses and the display's SIGWINCH
+    wakeup fd, and renders the overlay every ``_RENDER_INTERVAL_S``.
+
+    Returns the process exit code (1 on KeyboardInterrupt).
+    """
+    sel = selectors.DefaultSelector()
+    streams = {}
+
+    def _ingest_lines(data: bytes, final: bool = False) -> None:
+        display.process_lines(line_splitter.feed(data, final))
+
+    def _ingest_events(data: bytes, final: bool = False) -> None:
+        for event in event_splitter.feed(data, final):
+            display.process_event(event)
+
+    line_splitter = _LineSplitter()
+    stdout_fd = process.stdout.fileno()
+    os.set_blocking(stdout_fd, False)
+    sel.register(stdout_fd, selectors.EVENT_READ, 'stream')
+    streams[stdout_fd] = _ingest_lines
+    if events is not None:
+        event_splitter = _EventSplitter()
+        os.set_blocking(events.read_fd, False)
+        sel.register(events.read_fd, selectors.EVENT_READ, 'stream')
+        streams[events.read_fd] = _ingest_events
+
+    def _read_stream(fd: int) -> bool:
+        """Read what is available on ``fd``; False once it hits EOF."""
+        try:
+            data = os.read(fd, _READ_CHUNK_BYTES)
+        except BlockingIOError:
+            return True
+        except OSError:
+            data = b''
+        if data:
+            streams[fd](data)
+            return True
+        streams.pop(fd)(b'', final=True)
+        sel.unregister(fd)
+        return False
+
+    wakeup_fd = display.wakeup_fd
+    if wakeup_fd != -1:
+        sel.register(wakeup_fd, selectors.EVENT_READ, 'wakeup')
+
+    last_enforce = 0.0
+    next_render = 0.0
     using_ansi = supports_ansi()
 
     if using_ansi:
@@ -1070,25 +1648,37 @@ def _run_with_status(process, nice: int, display: StatusDisplay) -> int:
         sys.stdout.flush()
 
     try:
-        with _KeyWatcher() as keys:
-            while not done:
-                while True:
-                    try:
-                        line = q.get_nowait()
-                    except queue.Empty:
-                        break
-                    if line is None:
-                        done = True
-                        break
-                    display.process_line(line)
+        with forward_termination(process), _KeyWatcher() as keys:
+            if keys.fileno is not None:
+                sel.register(keys.fileno, selectors.EVENT_READ, 'keys')
+            while streams:
+                # Block until output arrives, a key is pressed, a resize-mode
+                # SIGWINCH nudges the wakeup pipe, or the next frame is due.
+                timeout = max(0.0, next_render - time.monotonic())
+                try:
+                    ready = sel.select(timeout)
+                except InterruptedError:
+                    ready = []
+                for key, _ in ready:
+                    if key.data == 'stream':
+                        _read_stream(key.fd)
+                    elif key.data == 'wakeup':
+                        try:
+                            os.read(wakeup_fd, 4096)  # drain
+                        except OSError:
+                            pass
+                        next_render = 0.0
 
                 key = keys.read()
                 if key in ('RIGHT', 'd'):
                     display.scroll_status(1)
+                    next_render = 0.0
                 elif key in ('LEFT', 'a'):
                     display.scroll_status(-1)
+                    next_render = 0.0
 
-                if not done:
+                now = time.monotonic()
+                if streams and now >= next_render:
                     display.render()
                     # One-shot post-resize reposition.  If a resize burst
                     # just settled, query CPR to see where the overlay
@@ -1097,56 +1687,23 @@ def _run_with_status(process, nice: int, display: StatusDisplay) -> int:
                     if display.needs_settle_reposition():
                         row = keys.query_cursor_row()
                         display.settle_reposition(row)
+                    next_render = now + display.render_interval()
 
-                now = time.monotonic()
-                if now - last_nice >= _RENICE_INTERVAL_S and nice != 0:
-                    subprocess.run(
-                        f"renice -n {nice} -p "
-                        f"$(pgrep -g $(ps -o pgid= -p {process.pid}))",
-                        shell=True, executable='/bin/bash',
-                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                    last_nice = now
-
-                if not done:
-                    # Sleep on the wakeup pipe instead of time.sleep so a
-                    # resize-mode-entry SIGWINCH can interrupt the wait and
-                    # let the next render fire immediately with the wider
-                    # margin.  Falls back to plain sleep when no pipe is
-                    # available (non-tty / pipe-creation failed).
-                    wakeup_fd = display.wakeup_fd
-                    if wakeup_fd != -1:
-                        try:
-                            ready, _, _ = select.select(
-                                [wakeup_fd], [], [], _RENDER_INTERVAL_S)
-                        except (InterruptedError, OSError):
-                            ready = ()
-                        if ready:
-                            try:
-                                os.read(wakeup_fd, 4096)  # drain
-                            except OSError:
-                                pass
-                    else:
-                        time.sleep(_RENDER_INTERVAL_S)
+                if now - last_enforce >= ENFORCE_INTERVAL_S:
+                    priority.enforce(process.pid)
+                    last_enforce = now
     except KeyboardInterrupt:
-        process.terminate()
-        try:
-            process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            process.kill()
-            process.wait()
-        # Drain any final output the reader thread already queued.
-        while True:
-            try:
-                line = q.get_nowait()
-            except queue.Empty:
-                break
-            if line is None:
-                break
-            display.process_line(line)
+        interrupt_session(process)
+        # Drain any final output still sitting in the pipes.
+        for fd in list(streams):
+            while _read_stream(fd):
+                if not select.select([fd], [], [], 0)[0]:
+                    break
         display._interrupted = True
         display.finalize()
         return 1
     finally:
+        sel.close()
         if using_ansi:
             sys.stdout.write('\033[?7h\033[?25h')  # re-enable line wrap, show cursor
             sys.stdout.flush()
@@ -1156,15 +1713,30 @@ def _run_with_status(process, nice: int, display: StatusDisplay) -> int:
     return process.returncode
 
 
-def run_build_with_status(process, workspace: str, nice: int, total: Optional[int] = None,
-                          pkg_names: Optional[List[str]] = None) -> int:
+def run_build_with_status(process, workspace: str, priority: PriorityManager, total: Optional[int] = None,
+                          pkg_names: Optional[List[str]] = None,
+                          events: Optional[EventChannel] = None,
+                          stderr_memory_lines: Optional[int] = None,
+                          status_fns: Optional[List[Callable[[], Optional[str]]]] = None,
+                          history: Optional[RunRecorder] = None,
+                          eta: Optional[EtaModel] = None) -> int:
     """Drive a colcon build subprocess with a live per-package status display."""
-    display = StatusDisplay(workspace, total=total, pkg_names=pkg_names)
-    return _run_with_status(process, nice, display)
-
-
-def run_test_with_status(process, workspace: str, nice: int, total: Optional[int] = None,
-                         pkg_names: Optional[List[str]] = None) -> int:
+    display = StatusDisplay(workspace, total=total, pkg_names=pkg_names,
+                            stderr_memory_lines=stderr_memory_lines,
+                            status_fns=status_fns, eta=eta)
+    returncode = _run_with_status(process, priority, display, events)
+    if history is not None:
+        history.add_packages(display.package_records())
+    return returncode
+
+
+def run_test_with_status(process, workspace: str, priority: PriorityManager, total: Optional[int] = None,
+                         pkg_names: Optional[List[str]] = None,
+                         events: Optional[EventChannel] = None,
+                         stderr_memory_lines: Optional[int] = None,
+                         status_fns: Optional[List[Callable[[], Optional[str]]]] = None,
+                         history: Optional[RunRecorder] = None,
+                         eta: Optional[EtaModel] = None) -> int:
     """Drive a colcon test subprocess with a live per-package status display.
 
     Returns the process exit code.  The caller is responsible for running
@@ -1173,9 +1745,15 @@ def run_test_with_status(process, workspace: str, nice: int, total: Optional[int
     display = StatusDisplay(
         workspace, total=total,
         log_subdir='latest_test',
-        progress_fn=_parse_test_progress,
+        progress_cls=_TestProgress,
         show_build_summary=False,
         pkg_names=pkg_names,
         phase='test',
+        stderr_memory_lines=stderr_memory_lines,
+        status_fns=status_fns,
+        eta=eta,
     )
-    return _run_with_status(process, nice, display)
+    returncode = _run_with_status(process, priority, display, events)
+    if history is not None:
+        history.add_packages(display.package_records())
+    return returncode
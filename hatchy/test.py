@@ -5,10 +5,17 @@ import sys
 import time
 import xml.etree.ElementTree as ET
 
-from .common import (get_workspace_dir, get_package,
+from .common import (get_workspace_dir, get_package, get_stderr_memory_lines, remove_duplicates,
                      clr, supports_ansi, _fmt_duration, _strip_ansi,
                      _GREEN, _YELLOW, _RED, _BOLD_RED,
                      _BRIGHT_BLUE, _BRIGHT_MAGENTA, _DIM)
+from .cgroup import CgroupEnvelope
+from .changes import select_changed_packages
+from .eta import load_eta_model
+from .events import EventChannel, REPLACED_EVENT_HANDLERS, handler_available
+from .graph import resolve_packages
+from .history import RunRecorder
+from .priority import PriorityManager, wait_with_priority
 
 
 def register(subparsers):
@@ -25,6 +32,14 @@ def register(subparsers):
     packages_group.add_argument(
         "--no-deps", action="store_true",
         help="Only test specified packages, not their dependencies.")
+    packages_group.add_argument(
+        "--changed", action="store_true",
+        help="Test the packages changed in the git repositories under src, and the packages "
+             "depending on them. Dependencies of these are not tested.")
+    packages_group.add_argument(
+        "--since", metavar="REF",
+        help="Base ref for --changed, compared from where HEAD branched off it. "
+             "(default: each branch's upstream)")
     config_group = parser.add_argument_group('Config', "Parameters for the underlying build system.")
     config_group.add_argument(
         "--colcon-build-args", metavar='ARG', dest='colcon_build_args',
@@ -291,19 +306,6 @@ def print_test_results(workspace, build_space, verbose=False, packages=None, ela
     return 1 if any_failure else 0
 
 
-def _list_packages(workspace, packages, no_deps):
-    """Return the list of package names colcon will test, or None on failure."""
-    cmd = ["colcon", "list", "-n"]
-    if packages:
-        cmd += ["--packages-select" if no_deps else "--packages-up-to"] + packages
-    try:
-        result = subprocess.run(cmd, cwd=workspace, capture_output=True, text=True)
-        names = [l.strip() for l in result.stdout.splitlines() if l.strip()]
-        return names if names else None
-    except Exception:
-        return None
-
-
 def test_command(args):
     workspace = os.path.abspath(args.workspace)
 
@@ -342,9 +344,15 @@ def test_command(args):
             current_package = get_package(args.workspace)
             if current_package:
                 packages.append(current_package)
+        if args.changed or args.since:
+            packages = remove_duplicates(packages + select_changed_packages(workspace, args.since))
+            if not packages:
+                sys.exit(0)
         # Expand to the full dependency set colcon would have tested, so the
         # summary matches what a prior `hatchy test <pkg>` would have shown.
-        resolved_pkgs = _list_packages(workspace, packages, args.no_deps) if packages else None
+        no_deps = args.no_deps or args.changed or bool(args.since)
+        mode = 'select' if no_deps else 'up-to'
+        resolved_pkgs = resolve_packages(workspace, packages, mode) if packages else None
         result_code = print_test_results(
             workspace, build_space, verbose=args.verbose,
             packages=resolved_pkgs)
@@ -360,6 +368,7 @@ def test_command(args):
         colcon_cmd += args.colcon_build_args
 
     nice = config_content.get("nice", 0) or 0
+    priority = PriorityManager(nice, config_content.get("io_class", None))
 
     packages = args.pkgs
     if args.this:
@@ -367,68 +376,105 @@ def test_command(args):
         if current_package:
             packages.append(current_package)
 
+    # Dependencies of changed packages are unaffected, so only the selection is tested.
+    no_deps = args.no_deps
+    if args.changed or args.since:
+        packages = remove_duplicates(packages + select_changed_packages(workspace, args.since))
+        if not packages:
+            sys.exit(0)
+        no_deps = True
+
     if packages:
-        if args.no_deps:
+        if no_deps:
             colcon_cmd += ['--packages-select'] + packages
         else:
             colcon_cmd += ['--packages-up-to'] + packages
 
-    use_status_display = supports_ansi()
-
-    if use_status_display:
-        colcon_cmd += ['--event-handlers', 'status-', 'parallel_status-']
-
-    colcon_shell_cmd = ' '.join(colcon_cmd)
-
+    shell_prefix = ''
     extend_path = config_content.get("extend_path", None)
     if extend_path:
         extend_script = os.path.join(extend_path, "setup.bash")
         if not os.path.exists(extend_script):
             print(f"Error: '{extend_script}' does not exist.")
             sys.exit(1)
-        colcon_shell_cmd = f'source {extend_script} && ' + colcon_shell_cmd
+        shell_prefix = f'source {extend_script} && '
 
-    print(clr(f"Running: {colcon_shell_cmd}", _DIM))
-
-    # Resolve the full set of packages colcon will actually test (the explicit
-    # selection plus dependencies, unless --no-deps), so the post-run summary
-    # reflects this run rather than every package with stale test_results.
-    pkg_names = _list_packages(workspace, packages, args.no_deps)
-    total = len(pkg_names) if pkg_names else None
+    use_status_display = supports_ansi()
 
-    test_start = time.monotonic()
+    events = None
     if use_status_display:
-        from .status_display import run_test_with_status
-        env = {**os.environ, 'PYTHONUNBUFFERED': '1'}
-        process = subprocess.Popen(
-            colcon_shell_cmd,
-            cwd=workspace,
-            shell=True,
-            executable="/bin/bash",
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            env=env,
-        )
-        test_returncode = run_test_with_status(process, workspace, nice, total=total, pkg_names=pkg_names)
-    else:
-        process = subprocess.Popen(
-            colcon_shell_cmd,
-            cwd=workspace,
-            shell=True,
-            executable="/bin/bash",
-            stdout=sys.stdout,
-            stderr=sys.stderr,
-        )
-        while process.poll() is None:
-            subprocess.run(
-                f"renice -n {nice} -p $(pgrep -g $(ps -o pgid= -p {process.pid}))",
+        event_handlers = ['status-', 'parallel_status-']
+        if handler_available(workspace, shell_prefix):
+            events = EventChannel()
+            event_handlers += list(REPLACED_EVENT_HANDLERS) + ['hatchy+']
+        colcon_cmd += ['--event-handlers'] + event_handlers
+
+    colcon_shell_cmd = shell_prefix + ' '.join(colcon_cmd)
+
+
+    print(clr(f"Running: {colcon_shell_cmd}", _DIM))
+
+    envelope = CgroupEnvelope.from_config(config_content)
+    if envelope.limits and not envelope.prepare():
+        print(clr(f"Warning: {envelope.failure}; resource limits ignored.", _YELLOW))
+    elif envelope.active:
+        if envelope.dropped:
+            print(clr(f"Warning: resource limits dropped: {envelope.describe_dropped()}", _YELLOW))
+        print(clr(f"Resource limits: {envelope.describe()} ({envelope.method})", _DIM))
+    colcon_shell_cmd = envelope.wrap(colcon_shell_cmd)
+    try:
+        history = RunRecorder(workspace, 'test', config_content.get("colcon_build_args"))
+
+        # Resolve the full set of packages colcon will actually test (the explicit
+        # selection plus dependencies, unless --no-deps), so the post-run summary
+        # reflects this run rather than every package with stale test_results.
+        pkg_names = resolve_packages(workspace, packages, 'select' if no_deps else 'up-to')
+        total = len(pkg_names) if pkg_names else None
+
+        test_start = time.monotonic()
+        if use_status_display:
+            from .status_display import run_test_with_status
+            eta = load_eta_model(workspace, 'test', colcon_cmd)
+            if eta and pkg_names:
+                history.predicted = eta.remaining({}, pkg_names)
+            env = {**os.environ, 'PYTHONUNBUFFERED': '1'}
+            popen_kwargs = events.popen_kwargs(env) if events else {'env': env}
+            popen_kwargs.update(envelope.popen_kwargs(priority.popen_kwargs()))
+            process = subprocess.Popen(
+                colcon_shell_cmd,
+                cwd=workspace,
+                shell=True,
+                executable="/bin/bash",
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                **popen_kwargs,
+            )
+            envelope.attach(process.pid)
+            if events:
+                events.close_write_end()
+            test_returncode = run_test_with_status(process, workspace, priority, total=total, pkg_names=pkg_names,
+                                                   events=events,
+                                                   stderr_memory_lines=get_stderr_memory_lines(config_content),
+                                                   status_fns=[envelope.usage], history=history, eta=eta)
+        else:
+            process = subprocess.Popen(
+                colcon_shell_cmd,
+                cwd=workspace,
                 shell=True,
                 executable="/bin/bash",
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL)
-            time.sleep(1)
-        test_returncode = process.returncode
+                stdout=sys.stdout,
+                stderr=sys.stderr,
+                **envelope.popen_kwargs(priority.popen_kwargs()),
+            )
+            envelope.attach(process.pid)
+            test_returncode = wait_with_priority(process, priority)
+            history.add_from_event_log('latest_test')
+    finally:
+        if events:
+            events.close()
+        envelope.cleanup()
     test_elapsed = time.monotonic() - test_start
+    history.finish(test_returncode)
 
     result_code = print_test_results(
         workspace, build_space, verbose=args.verbose,
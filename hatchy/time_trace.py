@@ -0,0 +1,158 @@
+"""Workspace-wide summary of clang ``-ftime-trace`` profiles.
+
+With ``-ftime-trace`` clang writes a Chrome trace next to every object file
+(``CMakeFiles/foo.dir/src/foo.cpp.json`` for ``foo.cpp.o``).  Each one is
+reduced to the time spent parsing every included header, instantiating
+every template and generating code for every function, and stored in the
+workspace history so that only new or changed traces are parsed again.
+Traces are parsed in parallel, one process per CPU.
+"""
+
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .ninja_log import source_path
+
+# Kinds of time_trace_entries rows, with the trace events summed into each.
+_ENTRY_EVENTS = {
+    'header': ('Source',),
+    'template': ('InstantiateClass', 'InstantiateFunction'),
+    'codegen': ('CodeGen Function', 'OptFunction'),
+}
+_EVENT_KINDS = {event: kind for kind, events in _ENTRY_EVENTS.items() for event in events}
+# Mangled or templated function names can be very long.
+_MAX_NAME = 200
+# A trace older than its object by more than this is from an earlier compile.
+_STALE_S = 1.0
+
+
+def find_traces(build_dir: str) -> Dict[str, Tuple[float, str, str]]:
+    """Map each current time trace in a build space to (mtime, package, source)."""
+    traces = {}
+    for dirpath, dirnames, filenames in os.walk(build_dir):
+        rel = os.path.relpath(dirpath, build_dir)
+        if rel == '.' or '/CMakeFiles/' not in f'/{rel}/':
+            continue
+        for filename in filenames:
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                mtime = os.path.getmtime(path)
+                if os.path.getmtime(path[:-len('.json')] + '.o') > mtime + _STALE_S:
+                    continue
+            except OSError:
+                # No object next to it: not a compiler trace.
+                continue
+            package, _, output = os.path.relpath(path, build_dir).partition(os.sep)
+            traces[path] = (mtime, package, source_path(output[:-len('.json')] + '.o'))
+    return traces
+
+
+def summarize_trace(path: str) -> Optional[dict]:
+    """Frontend/backend time and per header, template and function totals of one trace."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    events = data.get('traceEvents') if isinstance(data, dict) else None
+    if not isinstance(events, list):
+        return None
+    summary = {'frontend': 0, 'backend': 0}
+    entries: Dict[Tuple[str, str], List[int]] = {}
+    for event in events:
+        if not isinstance(event, dict) or event.get('ph') != 'X':
+            continue
+        name = event.get('name')
+        dur = int(event.get('dur', 0))
+        if name == 'Frontend':
+            summary['frontend'] += dur
+        elif name == 'Backend':
+            summary['backend'] += dur
+        elif name in _EVENT_KINDS:
+            kind = _EVENT_KINDS[name]
+            detail = str((event.get('args') or {}).get('detail', ''))
+            if kind == 'template':
+                # Group instantiations of a template regardless of its arguments.
+                detail = detail.split('<', 1)[0]
+            entry = entries.setdefault((kind, detail[:_MAX_NAME]), [0, 0])
+            entry[0] += dur
+            entry[1] += 1
+    summary['entries'] = [(kind, name, dur, count) for (kind, name), (dur, count) in entries.items()]
+    return summary
+
+
+def _summarize_all(paths: List[str]) -> Iterable[Optional[dict]]:
+    if len(paths) < 2:
+        return map(summarize_trace, paths)
+    try:
+        with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as pool:
+            return list(pool.map(summarize_trace, paths, chunksize=16))
+    except (OSError, ImportError, NotImplementedError, BrokenProcessPool):
+        # No working multiprocessing (e.g. no /dev/shm for its semaphores).
+        return map(summarize_trace, paths)
+
+
+def refresh_time_traces(conn: sqlite3.Connection, build_dir: str) -> int:
+    """Bring the stored summaries in line with the traces on disk; returns how many were parsed.
+
+    Call inside a transaction.
+    """
+    found = find_traces(build_dir)
+    known = {path: (trace_id, mtime) for trace_id, path, mtime in
+             conn.execute("SELECT id, path, mtime FROM time_traces")}
+    outdated = [known[path][0] for path in known
+                if path not in found or found[path][0] != known[path][1]]
+    for trace_id in outdated:
+        conn.execute("DELETE FROM time_trace_entries WHERE trace_id = ?", (trace_id,))
+        conn.execute("DELETE FROM time_traces WHERE id = ?", (trace_id,))
+
+    todo = sorted(path for path, (mtime, _, _) in found.items()
+                  if path not in known or known[path][1] != mtime)
+    parsed = 0
+    for path, summary in zip(todo, _summarize_all(todo)):
+        if summary is None:
+            continue
+        mtime, package, source = found[path]
+        cur = conn.execute(
+            "INSERT INTO time_traces (path, package, source, mtime, frontend_us, backend_us) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (path, package, source, mtime, summary['frontend'], summary['backend']))
+        conn.executemany(
+            "INSERT INTO time_trace_entries (trace_id, kind, name, dur_us, count) VALUES (?, ?, ?, ?, ?)",
+            [(cur.lastrowid,) + entry for entry in summary['entries']])
+        parsed += 1
+    return parsed
+
+
+def _package_filter(packages: Iterable[str]) -> Tuple[str, list]:
+    packages = sorted(packages)
+    if not packages:
+        return '', []
+    return f" AND t.package IN ({', '.join('?' * len(packages))})", packages
+
+
+def trace_totals(conn: sqlite3.Connection, packages: Iterable[str] = ()) -> Tuple[int, float, float]:
+    """(translation units, frontend seconds, backend seconds) over the stored traces."""
+    where, params = _package_filter(packages)
+    tus, frontend, backend = conn.execute(
+        "SELECT COUNT(*), SUM(frontend_us), SUM(backend_us) FROM time_traces t WHERE 1" + where,
+        params).fetchone()
+    return tus, (frontend or 0) / 1e6, (backend or 0) / 1e6
+
+
+def top_entries(conn: sqlite3.Connection, kind: str, limit: int,
+                packages: Iterable[str] = ()) -> List[Tuple[str, float, int, int]]:
+    """Most expensive (name, seconds, translation units, occurrences) of an entry kind."""
+    where, params = _package_filter(packages)
+    rows = conn.execute(
+        "SELECT e.name, SUM(e.dur_us), COUNT(DISTINCT e.trace_id), SUM(e.count) "
+        "FROM time_trace_entries e JOIN time_traces t ON t.id = e.trace_id "
+        "WHERE e.kind = ?" + where + " GROUP BY e.name ORDER BY SUM(e.dur_us) DESC LIMIT ?",
+        [kind] + params + [limit]).fetchall()
+    return [(name, us / 1e6, tus, count) for name, us, tus, count in rows]
@@ -0,0 +1,111 @@
+"""Chrome Trace Event Format export of a build, for Perfetto and chrome://tracing.
+
+The trace has one process for colcon with a track per worker slot.  Each
+package is a span on the slot it ran in, with its phases (cmake, build,
+link, install) as nested spans.  Packages built with ninja get a process of
+their own whose tracks hold the compile and link steps read from their
+``.ninja_log``, placed at the start of the package's build phase.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional
+
+from .ninja_log import ninja_log_paths, read_ninja_log, step_kind
+
+_COLCON_PID = 1
+
+
+def _assign_lanes(intervals: List[tuple]) -> List[int]:
+    """Lane index per (start, end, ...) interval so overlapping ones don't share a lane."""
+    lane_ends: List[float] = []
+    lanes = []
+    for start, end, *_ in intervals:
+        for lane, lane_end in enumerate(lane_ends):
+            if lane_end <= start:
+                lane_ends[lane] = end
+                lanes.append(lane)
+                break
+        else:
+            lane_ends.append(end)
+            lanes.append(len(lane_ends) - 1)
+    return lanes
+
+
+def _us(seconds: float) -> int:
+    return int(round(seconds * 1e6))
+
+
+def _metadata(pid: int, tid: Optional[int], key: str, name: str) -> dict:
+    event = {'ph': 'M', 'pid': pid, 'name': key, 'args': {'name': name}}
+    if tid is not None:
+        event['tid'] = tid
+    return event
+
+
+def build_trace(records: List[dict], build_dir: Optional[str] = None,
+                ninja_offsets: Optional[Dict[str, int]] = None) -> dict:
+    """Trace events for the package ``records`` of a `history.RunRecorder`.
+
+    ``ninja_offsets`` are the ``.ninja_log`` sizes taken before the build
+    (`ninja_log.snapshot_offsets`), so only this build's steps are included.
+    """
+    records = sorted((r for r in records if r.get('duration') is not None),
+                     key=lambda r: r['started'])
+    if not records:
+        return {'traceEvents': [], 'displayTimeUnit': 'ms'}
+    origin = records[0]['started']
+    events = [_metadata(_COLCON_PID, None, 'process_name', 'colcon')]
+
+    intervals = [(r['started'], r['started'] + r['duration'], r) for r in records]
+    lanes = _assign_lanes(intervals)
+    for lane in sorted(set(lanes)):
+        events.append(_metadata(_COLCON_PID, lane + 1, 'thread_name', f'worker {lane + 1}'))
+        events.append({'ph': 'M', 'pid': _COLCON_PID, 'tid': lane + 1,
+                       'name': 'thread_sort_index', 'args': {'sort_index': lane}})
+
+    logs = ninja_log_paths(build_dir) if build_dir else {}
+    next_pid = _COLCON_PID + 1
+    for (start, end, rec), lane in zip(intervals, lanes):
+        status = 'aborted' if rec.get('aborted') else ('ok' if rec.get('ok') else 'failed')
+        events.append({'ph': 'X', 'pid': _COLCON_PID, 'tid': lane + 1, 'name': rec['name'],
+                       'cat': 'package', 'ts': _us(start - origin), 'dur': _us(end - start),
+                       'args': {'result': status}})
+        build_start = start
+        for phase, phase_start, phase_end in rec.get('spans', ()):
+            events.append({'ph': 'X', 'pid': _COLCON_PID, 'tid': lane + 1, 'name': phase,
+                           'cat': 'phase', 'ts': _us(phase_start - origin),
+                           'dur': _us(phase_end - phase_start)})
+            if phase == 'build' and build_start == start:
+                build_start = phase_start
+
+        log = logs.get(rec['name'])
+        if log is None:
+            continue
+        entries, _ = read_ninja_log(log, (ninja_offsets or {}).get(rec['name'], 0))
+        if not entries:
+            continue
+        pid = next_pid
+        next_pid += 1
+        events.append(_metadata(pid, None, 'process_name', f"ninja: {rec['name']}"))
+        steps = sorted((e.start_ms, e.end_ms, e) for e in entries)
+        step_lanes = _assign_lanes(steps)
+        for lane_idx in sorted(set(step_lanes)):
+            events.append(_metadata(pid, lane_idx + 1, 'thread_name', f'job {lane_idx + 1}'))
+        for (step_start, step_end, entry), lane_idx in zip(steps, step_lanes):
+            events.append({'ph': 'X', 'pid': pid, 'tid': lane_idx + 1,
+                           'name': os.path.basename(entry.output),
+                           'cat': step_kind(entry.output),
+                           'ts': _us(build_start - origin) + step_start * 1000,
+                           'dur': (step_end - step_start) * 1000,
+                           'args': {'output': entry.output}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def write_trace(path: str, records: List[dict], build_dir: Optional[str] = None,
+                ninja_offsets: Optional[Dict[str, int]] = None) -> int:
+    """Write a trace file; returns the number of events written."""
+    trace = build_trace(records, build_dir, ninja_offsets)
+    with open(path, 'w') as f:
+        json.dump(trace, f, separators=(',', ':'))
+    return len(trace['traceEvents'])
@@ -0,0 +1,160 @@
+"""Deleting build products in the background.
+
+`move_to_trash` renames directories into a new ``.hatch/trash/<timestamp>``
+batch, which is immediate and atomic: a build started afterwards either
+sees the whole tree or none of it, never a half-deleted one.  A detached
+worker (``python -m hatchy.trash``) then deletes the batches at idle I/O
+priority, removing independent subtrees in parallel.  The worker holds a
+lock on the trash directory, so at most one runs per workspace, and keeps
+going until the trash is empty; trash left by an interrupted worker is
+picked up by the next one.  A directory on another file system than the
+workspace can't be renamed into the trash and is deleted in the foreground.
+"""
+
+import errno
+import fcntl
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+_LOCK_FILE = '.lock'
+# Subtrees deleted at once; unlinking is bound by file system metadata
+# updates, which overlap across directories.
+_DELETE_WORKERS = 8
+
+
+def trash_dir(workspace: str) -> str:
+    return os.path.join(workspace, '.hatch', 'trash')
+
+
+def move_to_trash(workspace: str, paths: Iterable[str]) -> Tuple[int, List[str]]:
+    """Move ``paths`` into a new trash batch.
+
+    Paths that can't be renamed into the trash are deleted right away.
+    Returns how many were moved and an error message for every path that
+    could be neither moved nor deleted.
+    """
+    batch = os.path.join(trash_dir(workspace), time.strftime('%Y%m%d-%H%M%S') + f'-{os.getpid()}')
+    moved = 0
+    errors = []
+    for i, path in enumerate(paths):
+        try:
+            os.makedirs(batch, exist_ok=True)
+            os.rename(path, os.path.join(batch, f"{i}-{os.path.basename(path)}"))
+            moved += 1
+        except OSError as e:
+            error = e
+            if e.errno == errno.EXDEV:
+                try:
+                    shutil.rmtree(path)
+                    continue
+                except OSError as e:
+                    error = e
+            errors.append(f"Could not delete '{path}': {error.strerror or error}")
+    return moved, errors
+
+
+def _lock(trash: str) -> Optional[int]:
+    """File descriptor holding the trash lock, or None if another worker has it."""
+    try:
+        fd = os.open(os.path.join(trash, _LOCK_FILE), os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o644)
+    except OSError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _batches(trash: str) -> List[str]:
+    try:
+        return sorted(entry.path for entry in os.scandir(trash)
+                      if entry.name != _LOCK_FILE and entry.is_dir(follow_symlinks=False))
+    except OSError:
+        return []
+
+
+def _delete(batch: str, pool: ThreadPoolExecutor) -> None:
+    """Delete a batch, the subdirectories of its trees in parallel."""
+    subtrees = []
+    for tree in os.scandir(batch):
+        if not tree.is_dir(follow_symlinks=False):
+            continue
+        try:
+            subtrees.extend(entry.path for entry in os.scandir(tree.path)
+                            if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            pass
+    list(pool.map(lambda path: shutil.rmtree(path, ignore_errors=True), subtrees))
+    shutil.rmtree(batch, ignore_errors=True)
+
+
+def empty_trash(trash: str) -> None:
+    """Delete every batch in ``trash`` unless another worker is already doing so."""
+    from .priority import ioprio_set
+    fd = _lock(trash)
+    if fd is None:
+        return
+    ioprio_set(0, 'idle')
+    try:
+        os.nice(19)
+    except OSError:
+        pass
+    with ThreadPoolExecutor(max_workers=_DELETE_WORKERS) as pool:
+        while fd is not None:
+            for batch in _batches(trash):
+                _delete(batch, pool)
+            os.close(fd)
+            fd = None
+            # Trash moved in after the last scan, whose mover found the lock
+            # taken and left it to this worker.
+            if _batches(trash):
+                fd = _lock(trash)
+
+
+def pending(workspace: str) -> bool:
+    """Whether the workspace's trash holds anything."""
+    return bool(_batches(trash_dir(workspace)))
+
+
+def start_worker(workspace: str) -> None:
+    """Start a detached worker emptying the workspace's trash."""
+    subprocess.Popen(
+        [sys.executable, '-m', 'hatchy.trash', trash_dir(workspace)],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True)
+
+
+def trash_status(workspace: str) -> Tuple[int, int, bool]:
+    """(batches, bytes on disk, whether a worker is deleting them) of the workspace's trash."""
+    trash = trash_dir(workspace)
+    batches = _batches(trash)
+    size = 0
+    stack = list(batches)
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    size += entry.stat(follow_symlinks=False).st_blocks * 512
+                except OSError:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+    fd = _lock(trash) if os.path.isdir(trash) else None
+    if fd is not None:
+        os.close(fd)
+    return len(batches), size, bool(batches) and fd is None
+
+
+if __name__ == '__main__':
+    empty_trash(sys.argv[1])